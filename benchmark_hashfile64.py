@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+################################################################################
+#    Katal Copyright (C) 2012 Suizokukan
+#    Contact: suizokukan _A.T._ orange dot fr
+#
+#    This file is part of Katal.
+#    Katal is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Katal is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with Katal.  If not, see <http://www.gnu.org/licenses/>.
+################################################################################
+"""
+        Katal by suizokukan (suizokukan AT orange DOT fr)
+        ________________________________________________________________________
+
+        benchmark_hashfile64.py compares the speed (MB/s, one core) of the
+        former hashfile64() (a new 64 KiB bytes object for each read()) with
+        the current one (readinto() a preallocated buffer, mmap for the big
+        files).
+
+        $ python3 benchmark_hashfile64.py [size of the test file in MiB]
+
+        The test file is written in the temporary directory; since it is read
+        several times, the results are the ones of a file in the page cache :
+        the cost of the disk isn't measured, only the cost of Katal.
+"""
+from base64 import b64encode
+import hashlib
+import os
+import sys
+import tempfile
+import timeit
+
+from katal import katal
+
+#///////////////////////////////////////////////////////////////////////////////
+def former_hashfile64(filename, stop_after=None):
+    """
+        former_hashfile64()
+        ________________________________________________________________________
+
+        hashfile64() as it was written before the use of readinto()/mmap.
+        ________________________________________________________________________
+
+        PARAMETER
+                o filename : (str) file's name
+                o stop_after:(None/int) see katal.hashfile64()
+
+        RETURNED VALUE
+                the expected string
+    """
+    hasher = hashlib.sha256()
+
+    nbr_of_bytes_read = 0
+    with open(filename, "rb") as afile:
+        buf = afile.read(65536)
+        while len(buf) > 0:
+            nbr_of_bytes_read += 65536
+            if stop_after is not None and nbr_of_bytes_read >= stop_after:
+                break
+
+            hasher.update(buf)
+            buf = afile.read(65536)
+
+    return b64encode(hasher.digest()).decode()
+
+#///////////////////////////////////////////////////////////////////////////////
+def benchmark(label, function, size):
+    """
+        benchmark()
+        ________________________________________________________________________
+
+        Display the speed of function(), the best of 5 runs.
+        ________________________________________________________________________
+
+        PARAMETERS
+                o label         : (str) displayed name of the function
+                o function      : a callable without argument
+                o size          : (int) number of bytes read by function()
+
+        no RETURNED VALUE
+    """
+    duration = min(timeit.repeat(function, number=1, repeat=5))
+    print("    {0:<48} : {1:8.1f} MB/s".format(label, size/duration/1000000))
+
+#///////////////////////////////////////////////////////////////////////////////
+def main():
+    """
+        main()
+        ________________________________________________________________________
+
+        Entry point : see the module's docstring.
+        ________________________________________________________________________
+
+        no PARAMETER, no RETURNED VALUE
+    """
+    size = int(sys.argv[1])*1024*1024 if len(sys.argv) > 1 else 256*1024*1024
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = os.path.join(tmpdir, "benchmark")
+        with open(filename, "wb") as afile:
+            for _ in range(size//(1024*1024)):
+                afile.write(os.urandom(1024*1024))
+
+        assert former_hashfile64(filename) == katal.hashfile64(filename)
+
+        print("file of {0} MiB :".format(size//(1024*1024)))
+        benchmark("former hashfile64()",
+                  lambda: former_hashfile64(filename), size)
+        benchmark("hashfile64() (mmap)",
+                  lambda: katal.hashfile64(filename), size)
+
+        mmap_minsize = katal.CST__HASH_MMAP_MINSIZE
+        katal.CST__HASH_MMAP_MINSIZE = size+1
+        for buffer_size in (65536, katal.CST__HASH_BUFFER_SIZE, 1024*1024):
+            benchmark("hashfile64() (readinto, buffer={0})".format(buffer_size),
+                      lambda: katal.hashfile64(filename, buffer_size=buffer_size), size)
+        katal.CST__HASH_MMAP_MINSIZE = mmap_minsize
+
+        print("both hashids (partial hashid + hashid) :")
+        benchmark("former hashfile64() x 2",
+                  lambda: (former_hashfile64(filename,
+                                             stop_after=katal.CST__PARTIALHASHID_BYTESNBR),
+                           former_hashfile64(filename)), size)
+        benchmark("compute_hashids()",
+                  lambda: katal.compute_hashids(filename), size)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+################################################################################
+#    Katal Copyright (C) 2012 Suizokukan
+#    Contact: suizokukan _A.T._ orange dot fr
+#
+#    This file is part of Katal.
+#    Katal is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    Katal is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with Katal.  If not, see <http://www.gnu.org/licenses/>.
+################################################################################
+"""
+        Katal by suizokukan (suizokukan AT orange DOT fr)
+        ________________________________________________________________________
+
+        benchmark_select.py compares the memory used by an entry of SELECT
+        (the SELECTELEMENT object and its strings, the hashid used as a key
+        excluded) with the former namedtuple, which stored the full name, the
+        name without extension, the extension, the date as a string and the
+        rendered target name and tags of each file.
+
+        $ python3 benchmark_select.py [number of entries]
+
+        The entries mimic a source path of 100 files per directory; the
+        memory is measured by tracemalloc.
+"""
+from collections import namedtuple
+import os
+import sys
+import time
+import tracemalloc
+
+from katal import katal
+
+# SELECTELEMENT as it was defined before the SELECTELEMENT class :
+FORMER_SELECTELEMENT = namedtuple('FORMER_SELECTELEMENT', ["fullname",
+                                                           "partialhashid",
+                                                           "path",
+                                                           "filename_no_extens",
+                                                           "extension",
+                                                           "size",
+                                                           "date",
+                                                           "targetname",
+                                                           "targettags",])
+
+#///////////////////////////////////////////////////////////////////////////////
+def former_selectelement(dirpath, filename, partialhashid, size, epoch, hashid,
+                         database_index):
+    """
+        former_selectelement()
+        ________________________________________________________________________
+
+        Create a FORMER_SELECTELEMENT as fill_select__add() did it.
+        ________________________________________________________________________
+
+        PARAMETERS : see the SELECTELEMENT class
+
+        RETURNED VALUE
+                a FORMER_SELECTELEMENT object
+    """
+    fullname = os.path.join(dirpath, filename)
+    fname_no_extens, extension = katal.get_filename_and_extension(fullname)
+    date = time.strftime(katal.CST__DTIME_FORMAT, time.gmtime(epoch))
+    targetname, targettags = \
+        katal.create_target_name_and_tags(parameters=katal.CFG_PARAMETERS,
+                                          hashid=hashid,
+                                          filename_no_extens=fname_no_extens,
+                                          path=dirpath,
+                                          extension=extension,
+                                          _size=size,
+                                          date=date,
+                                          database_index=database_index)
+    return FORMER_SELECTELEMENT(fullname=fullname,
+                                partialhashid=partialhashid,
+                                path=dirpath,
+                                filename_no_extens=fname_no_extens,
+                                extension=extension,
+                                size=size,
+                                date=date,
+                                targetname=targetname,
+                                targettags=targettags)
+
+#///////////////////////////////////////////////////////////////////////////////
+def benchmark(label, function, number):
+    """
+        benchmark()
+        ________________________________________________________________________
+
+        Display the memory used by an entry created by function().
+        ________________________________________________________________________
+
+        PARAMETERS
+                o label         : (str) displayed name of the function
+                o function      : a callable taking the arguments of the
+                                  SELECTELEMENT class
+                o number        : (int) number of entries
+
+        no RETURNED VALUE
+    """
+    # the strings given by scan_source_path() and the hashids exist anyway :
+    # they are created before the measure.
+    arguments = []
+    for index in range(number):
+        dirpath = os.path.join("/home/user/photos", "directory{0}".format(index//100))
+        hashid = "{0:043}=".format(index)
+        arguments.append((dirpath, "IMG_{0:08}.jpg".format(index), hashid, 3000000+index,
+                          1442520060+index*60, hashid, index))
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    entries = [function(*args) for args in arguments]
+    duration = time.perf_counter()-start
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    print("    {0:<28} : {1:6.1f} bytes/entry, {2:6.2f} µs/entry".format(
+        label, size/len(entries), duration/len(entries)*1000000))
+
+#///////////////////////////////////////////////////////////////////////////////
+def main():
+    """
+        main()
+        ________________________________________________________________________
+
+        Entry point : see the module's docstring.
+        ________________________________________________________________________
+
+        no PARAMETER, no RETURNED VALUE
+    """
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    katal.CFG_PARAMETERS = katal.read_parameters_from_cfgfile(
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), "katal", "katal.ini"))
+
+    print("{0} entries :".format(number))
+    benchmark("former namedtuple", former_selectelement, number)
+    benchmark("SELECTELEMENT", katal.SELECTELEMENT, number)
+
+if __name__ == '__main__':
+    main()
@@ -38,16 +38,26 @@
 """
 import argparse
 from base64 import b64encode
+import calendar
+import collections
+import collections.abc
 from collections import namedtuple
+import concurrent.futures
 import configparser
 import ctypes
+import errno
 import hashlib
 from datetime import datetime
+import json
 import filecmp
 import fnmatch
-import itertools
+import fractions
 import logging
 from logging.handlers import RotatingFileHandler
+import math
+import mmap
+import multiprocessing
+import operator
 import os
 import platform
 import re
@@ -57,6 +67,12 @@ import urllib.request
 import sys
 import unicodedata
 
+# fcntl is only available on Unix systems; without it, no reflink (see copy_file()) :
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
 #===============================================================================
 # project's settings
 #
@@ -92,12 +108,29 @@ INFOS_ABOUT_SRC_PATH = (None, None, None)  # initialized by show_infos_about_sou
                                            # ((int)total_size, (int)files_number, (dict)extensions)
 
 TARGET_DB = dict()      # see documentation:database; initialized by read_target_db()
+TARGET_DB_INDEX = dict()  # (int)size : {(str)partialhashid : [(str)hashid, ...]}
+                          # see documentation:database; initialized by read_target_db()
+HASH_ALGORITHM = "sha256"  # name of the hasher used by the target database, a key of
+                           # CST__HASHERS; initialized by read_target_db()
 
 LOGFILE_SIZE = 0        # size of the current logfile.
 
-SELECT = {}               # see documentation:selection; initialized by action__select()
+SELECT = {}               # see documentation:selection; a SelectStore object initialized
+                          # by action__select()
 SELECT_SIZE_IN_BYTES = 0  # initialized by action__select()
 FILTERS = {}              # see documentation:selection; initialized by read_filters()
+FILTERS_EVAL = None       # the "[source]eval" expression compiled by compile_filters_eval();
+                          # initialized by read_filters()
+DIRFILTERS = {}           # see documentation:selection; initialized by read_filters()
+COPY_BACKENDS = {}        # (source st_dev, target st_dev) : the copy backend used with
+                          # these filesystems; see copy_file()
+TARGETSTR_TEMPLATES = {}  # (str)"name of the target files"/"tags" string : compiled template;
+                          # see compile_targetstr()
+
+HASHCACHE = None          # connection to the hash cache, see documentation:hash cache;
+                          # initialized by hashcache__open()
+HASHCACHE_SEEN = set()    # (dev, ino) of the files looked up in the hash cache during
+                          # this run; see hashcache__close()
 
 #===============================================================================
 # loggers
@@ -148,32 +181,95 @@ LOGFILE_SIZE = 0                         # size of the current logfile.
 # type(s)
 #===============================================================================
 
+# the "size" and "date" fields of the filters are read once by read_filters() and
+# stored as FILTERPREDICATE objects : a file matches the filter if
+# operator(file's size or date, value) is True.
+#
+#   o operator : one of the operator.eq/lt/le/gt/ge functions
+#   o value    : (int) a size in bytes or a date in seconds since the epoch (UTC)
+#   o string   : (str) the field as written in the configuration file
+FILTERPREDICATE = namedtuple('FILTERPREDICATE', ["operator",
+                                                 "value",
+                                                 "string",])
+
 # SELECT is made of SELECTELEMENT objects, where data about the original files
-# are stored.
+# are stored : see the SELECTELEMENT class below.
+
+# scan_source_path() yields SRCFILE objects : compact informations about a file
+# read in the source directory, all of them coming from a single call to stat().
+#
+#   o dirpath  : (str) normalized path of the directory
+#   o filename : (str) file's name, without the path
+#   o size     : (int) size, in bytes
+#   o mtime    : (float) epoch time of the last modification
+#   o dev, ino : (int) device and inode numbers
+#   o mtime_ns : (int) epoch time of the last modification, in nanoseconds
 #
-# Due to Pylint's requirements, we can't name this type SelectElement.
-SELECTELEMENT = namedtuple('SELECTELEMENT', ["fullname",
-                                             "partialhashid",
-                                             "path",
-                                             "filename_no_extens",
-                                             "extension",
-                                             "size",
-                                             "date",
-                                             "targetname",
-                                             "targettags",])
+# The files rejected by the <namefilter> given to scan_source_path() aren't
+# stat'ed : their SRCFILE objects only have a dirpath and a filename, the other
+# fields being None.
+SRCFILE = namedtuple('SRCFILE', ["dirpath",
+                                 "filename",
+                                 "size",
+                                 "mtime",
+                                 "dev",
+                                 "ino",
+                                 "mtime_ns",])
 
 #===============================================================================
 # global constants : CST__*
 #===============================================================================
 
 # this minimal subset of characters are the only characters to be used in the
-# eval() function. Other characters are forbidden to avoid malicious code execution.
+# "[source]eval" expression (see compile_filters_eval()). Other characters are forbidden.
 # keywords an symbols : filter, parentheses, "and", "or", "not", "xor", "True", "False"
 #                       space, &, |, ^, (, ), 0, 1, 2, 3, 4, 5, 6, 7, 8, 9
 CST__AUTHORIZED_EVALCHARS = " TFasdlfiteruxnot0123456789&|^()"
 
+# ways to copy a file, from the fastest to the slowest one; see copy_file() :
+#   o reflink         : the target shares the blocks of the source (btrfs, xfs, ...)
+#   o copy_file_range : the data are copied by the kernel (and maybe by the filesystem)
+#   o sendfile        : the data are copied by the kernel
+#   o buffered        : the data are read and written by Katal
+CST__COPY_BACKENDS = ("reflink", "copy_file_range", "sendfile", "buffered")
+
+# size of the buffer (in bytes) used by the "buffered" copy backend; see copy_file() :
+CST__COPY_BUFFER_SIZE = 1024*1024
+
+# errors meaning that a copy backend can't be used with a file : see copy_file__backend()
+CST__COPY_UNSUPPORTED_ERRNOS = (errno.EXDEV, errno.EOPNOTSUPP, errno.ENOSYS,
+                                errno.EINVAL, errno.ENOTTY, errno.EBADF)
+
+# number of files waiting to be copied, for each copy worker; see action__add() :
+CST__COPY_QUEUE = 4
+
+# approximate size in bytes of an entry of SELECT (SELECTELEMENT object and
+# dict slot), its file's name and its hashids excluded; see SelectStore :
+CST__SELECT_ENTRY_OVERHEAD = 200
+
+# default value of "[source] selection memory budget", in MiB :
+CST__SELECT_MEMORY_BUDGET = 1024
+
+# number of rows read at once in the temporary database of a SelectStore :
+CST__SELECT_PAGE_SIZE = 1000
+
+# values of "[target] mode" :
+CST__TARGET_MODES = ("copy", "move", "nocopy", "hardlink", "symlink")
+
+# ioctl used to clone a file (Linux; fcntl.FICLONE since Python 3.12) :
+CST__FICLONE = getattr(fcntl, "FICLONE", 0x40049409)
+
 CST__DATABASE_NAME = "katal.db"
 
+# number of rows written in the database by each transaction : see db_write_in_chunks()
+# and the "[target] database batch size" option :
+CST__DATABASE_BATCH_SIZE = 10000
+
+# first character of the key in SELECT of a file to be hashed while it's copied
+# (see "[target] hash while copying"), followed by the name of the source file; the
+# hashids being written in base64, no hashid begins with this character :
+CST__DEFERRED_HASHID_PREFIX = "*"
+
 CST__DEFAULT_CONFIGFILE_NAME = "katal.ini"
 
 CST__DEFAULTCFGFILE_URL = \
@@ -189,6 +285,47 @@ CST__DTIME_FORMAT_LENGTH = len(datetime.strftime(datetime.now(), CST__DTIME_FORM
 # the required amount of space by these coefficient
 CST__FREESPACE_MARGIN = 1.1
 
+# default hash algorithm, used by the databases created by the first versions of Katal :
+CST__HASH_ALGORITHM_DEFAULT = "sha256"
+
+# size of the buffer (in bytes) used to read the files to be hashed; see hashfile__read()
+# and the "[source] hash buffer size" option :
+CST__HASH_BUFFER_SIZE = 262144
+
+# the files bigger than CST__HASH_MMAP_MINSIZE bytes are memory-mapped instead of being
+# read; see hashfile__read() :
+CST__HASH_MMAP_MINSIZE = 16*1024*1024
+
+# number of files waiting to be hashed, for each hashing worker; see fill_select() :
+CST__HASH_QUEUE = 4
+
+# errors meaning that a hard link can't be created (e.g. the source and the target
+# directories aren't on the same filesystem) : see action__add__file()
+CST__HARDLINK_UNSUPPORTED_ERRNOS = (errno.EXDEV, errno.EPERM, errno.EMLINK,
+                                    errno.EOPNOTSUPP, errno.ENOSYS)
+
+# the files smaller than CST__HASH_TINYFILE_SIZE bytes are hashed by processes
+# if "[source] hash processes" is greater than 0; see fill_select() :
+CST__HASH_TINYFILE_SIZE = 65536
+
+# name of the task journal written by action__add() in the tasks subdirectory; see
+# action__add__recover() :
+CST__JOURNAL_NAME = "add.journal"
+
+# name of the hash cache stored in the CST__KATALSYS_SUBDIR directory :
+CST__HASHCACHE_NAME = "hashcache.db"
+
+# hashers that may be used to compute the hashids, see documentation:database;
+# each digest being 32 bytes long, the hashids are always 44 characters long.
+CST__HASHERS = {"blake2b": lambda: hashlib.blake2b(digest_size=32),
+                "blake2s": hashlib.blake2s,
+                "sha256": hashlib.sha256,
+                "sha3_256": hashlib.sha3_256}
+
+# the hash cache is committed each time CST__HASHCACHE_COMMIT files have been
+# looked up : see the hashcache__get() function.
+CST__HASHCACHE_COMMIT = 10000
+
 CST__KATALSYS_SUBDIR = ".katal"
 
 CST__LOG_SUBSUBDIR = "logs"
@@ -197,6 +334,18 @@ CST__LOGFILE_DTIMEFORMATSTR = "%Y_%m_%d__%H%M%S__%f"  # constant of the time for
                                                       # logfiles' filename .
                                                       # see the backup_logfile() function .
 
+# keywords used in the "name of the target files" and "tags" strings; see
+# compile_targetstr(). Beware ! the order matters (%ht before %h, %ff before %f, ...) :
+CST__TARGETSTR_KEYWORDS = re.compile("%(ht|h|ff|f|pp|p|ee|e|s|dd|t|i)")
+
+# symbols used in the "size" and "date" fields of the filters; see read_filters__size()
+# and read_filters__date(). Beware ! the order matters (<= before <, >= before >) :
+CST__FILTER_OPERATORS = ((">=", operator.ge),
+                         (">", operator.gt),
+                         ("<=", operator.le),
+                         ("<", operator.lt),
+                         ("=", operator.eq))
+
 # suffix, multiple :
 # about the multiples of bytes, see e.g. https://en.wikipedia.org/wiki/Megabyte
 CST__MULTIPLES = (("kB", 1000),
@@ -220,8 +369,17 @@ CST__MULTIPLES = (("kB", 1000),
 # How many bytes have to be read to compute the partial hashid ?
 # See the thefilehastobeadded__db() and the hashfile64() functions.
 CST__PARTIALHASHID_BYTESNBR = 1000000
+# hashfile64() reads blocks of 65536 bytes and ignores the block reaching
+# CST__PARTIALHASHID_BYTESNBR : the partial hashid is the hash of the
+# CST__PARTIALHASHID_CUTOFF first bytes (983040 bytes). See compute_hashids().
+CST__PARTIALHASHID_CUTOFF = (CST__PARTIALHASHID_BYTESNBR-1)//65536*65536
 
-# string used to create the database :
+# version of the format of the plans written by plan__write() :
+CST__PLAN_VERSION = 3
+
+# string used to create the database, i.e. its dbfiles table as it was written by
+# the former versions of Katal : update_db_schema() converts it (see
+# CST__SQL__CREATE_DIRECTORIES) and adds the missing elements :
 CST__SQL__CREATE_DB = ('CREATE TABLE dbfiles ('
                        'hashid varchar(44) PRIMARY KEY UNIQUE, '
                        'partialhashid varchar(44), '
@@ -229,6 +387,99 @@ CST__SQL__CREATE_DB = ('CREATE TABLE dbfiles ('
                        'name TEXT UNIQUE, '
                        'sourcename TEXT, sourcedate INTEGER, tagsstr TEXT)')
 
+# number of directories read in advance by each worker of scan_source_path() :
+CST__SCAN_PREFETCH = 4
+
+# strings used to create the indexes of the database; see update_db_schema() :
+CST__SQL__CREATE_DB_INDEXES = ('CREATE INDEX IF NOT EXISTS files__size_partialhashid '
+                               'ON files (size, partialhashid)',)
+
+# SQL expression giving the directory of a source name, i.e. everything up to the
+# last '/' or backslash included, "" if there's no separator : the source name is the
+# directory followed by the basename, substr(sourcename, length(directory)+1).
+CST__SQL__SOURCEDIR = "rtrim({0}, replace(replace({0}, '/', ''), '\\', ''))"
+
+# strings used to create the directories and files tables, where each file stores
+# the id of its source directory and its basename instead of its complete source
+# name, and the dbfiles view, giving the former dbfiles table (see
+# CST__SQL__CREATE_DB) to the readers and to the writers; see update_db_schema().
+# The conflict policy of an "INSERT OR IGNORE INTO dbfiles" applies to the
+# statements of its trigger : no directory is created for an ignored file.
+CST__SQL__CREATE_DIRECTORIES = (
+    'CREATE TABLE IF NOT EXISTS directories ('
+    'dirid INTEGER PRIMARY KEY, '
+    'path TEXT UNIQUE)',
+    'CREATE TABLE IF NOT EXISTS files ('
+    'hashid varchar(44) PRIMARY KEY UNIQUE, '
+    'partialhashid varchar(44), '
+    'size INTEGER, '
+    'name TEXT UNIQUE, '
+    'dirid INTEGER, basename TEXT, sourcedate INTEGER, tagsstr TEXT)',
+    'CREATE VIEW IF NOT EXISTS dbfiles AS '
+    'SELECT hashid, partialhashid, size, name, path || basename AS sourcename, '
+    'sourcedate, tagsstr FROM files LEFT JOIN directories USING (dirid)',
+    'CREATE TRIGGER IF NOT EXISTS dbfiles__insert '
+    'INSTEAD OF INSERT ON dbfiles BEGIN '
+    'INSERT INTO directories (path) SELECT sourcedir FROM (SELECT {0} AS sourcedir) '
+    'WHERE sourcedir NOT IN (SELECT path FROM directories) '
+    'AND NOT EXISTS (SELECT 1 FROM files WHERE hashid=new.hashid OR name=new.name); '
+    'INSERT INTO files SELECT new.hashid, new.partialhashid, new.size, new.name, dirid, '
+    'substr(new.sourcename, length(sourcedir)+1), new.sourcedate, new.tagsstr '
+    'FROM (SELECT {0} AS sourcedir) LEFT JOIN directories ON path=sourcedir; '
+    'END'.format(CST__SQL__SOURCEDIR.format("new.sourcename")),
+    'CREATE TRIGGER IF NOT EXISTS dbfiles__update '
+    'INSTEAD OF UPDATE ON dbfiles BEGIN '
+    'INSERT INTO directories (path) SELECT sourcedir FROM (SELECT {0} AS sourcedir) '
+    'WHERE new.sourcename IS NOT old.sourcename '
+    'AND sourcedir NOT IN (SELECT path FROM directories); '
+    'UPDATE files SET hashid=new.hashid, partialhashid=new.partialhashid, size=new.size, '
+    'name=new.name, sourcedate=new.sourcedate, tagsstr=new.tagsstr '
+    'WHERE hashid=old.hashid; '
+    'UPDATE files SET (dirid, basename)='
+    '(SELECT dirid, substr(new.sourcename, length(path)+1) FROM directories '
+    'WHERE path={0}) '
+    'WHERE hashid=new.hashid AND new.sourcename IS NOT old.sourcename; '
+    'END'.format(CST__SQL__SOURCEDIR.format("new.sourcename")),
+    'CREATE TRIGGER IF NOT EXISTS dbfiles__delete '
+    'INSTEAD OF DELETE ON dbfiles BEGIN '
+    'DELETE FROM files WHERE hashid=old.hashid; '
+    'END')
+
+# strings used to create the file_tags table, the tags of each file (see documentation:
+# database), and to keep it up-to-date when the dbfiles table is modified; see
+# update_db_schema() :
+CST__SQL__CREATE_FILE_TAGS = ('CREATE TABLE IF NOT EXISTS file_tags ('
+                              'hashid varchar(44), '
+                              'tag TEXT, '
+                              'PRIMARY KEY (hashid, tag))',
+                              'CREATE INDEX IF NOT EXISTS file_tags__tag ON file_tags (tag)',
+                              'CREATE TRIGGER IF NOT EXISTS files__delete_tags '
+                              'AFTER DELETE ON files BEGIN '
+                              'DELETE FROM file_tags WHERE hashid=old.hashid; END',
+                              'CREATE TRIGGER IF NOT EXISTS files__update_tags '
+                              'AFTER UPDATE OF hashid ON files BEGIN '
+                              'UPDATE file_tags SET hashid=new.hashid WHERE hashid=old.hashid; END')
+
+# string used to create the hash cache :
+CST__SQL__CREATE_HASHCACHE = ('CREATE TABLE IF NOT EXISTS hashcache ('
+                              'dev INTEGER, ino INTEGER, '
+                              'algorithm TEXT, '
+                              'size INTEGER, mtime_ns INTEGER, '
+                              'name TEXT, '
+                              'partialhashid varchar(44), '
+                              'hashid varchar(44), '
+                              'PRIMARY KEY (dev, ino, algorithm))')
+
+# strings used to create the indexes of the hash cache; see hashcache__open() :
+CST__SQL__CREATE_HASHCACHE_INDEXES = ('CREATE INDEX IF NOT EXISTS hashcache__name '
+                                      'ON hashcache (name)',)
+
+# string used to create the table of the database storing its metadata
+# (e.g. name="hash algorithm", value="sha256"); see update_db_schema() :
+CST__SQL__CREATE_METADATA = ('CREATE TABLE IF NOT EXISTS katalmetadata ('
+                             'name TEXT PRIMARY KEY, '
+                             'value TEXT)')
+
 CST__TAG_SEPARATOR = ";"  # symbol used in the database between two tags.
 
 CST__TASKS_SUBSUBDIR = "tasks"
@@ -253,6 +504,377 @@ class KatalError(BaseException):
     def __str__(self):
         return repr(self.value)
 
+#///////////////////////////////////////////////////////////////////////////////
+class SELECTELEMENT(object):
+    """
+        SELECTELEMENT class
+
+        An entry of SELECT : data about an original file to be added to the
+        target path. Due to Pylint's requirements, we can't name this type
+        SelectElement.
+
+        Since the selection may be made of millions of entries, each object
+        only stores what can't be computed again :
+          o path            : (str) the directory, interned (see sys.intern()) :
+                              the files of a directory share the same string.
+          o filename        : (str) file's name, without the path
+          o partialhashid   : (None/str)
+          o size            : (int) size, in bytes
+          o epoch           : (int) the file's date, in seconds since the epoch
+                              (UTC), rounded to the minute
+          o hashid          : (str) the key of the entry in SELECT
+          o database_index  : (int) the %i value, see create_target_name()
+          o dev, ino,       : (None/int) read by scan_source_path() : see the
+            mtime_ns          fingerprint property
+
+        fullname, filename_no_extens, extension and date are computed from
+        these attributes; targetname and targettags are rendered on demand
+        (see create_target_name() and create_target_tags()) unless they have
+        been given to the constructor or kept by pin().
+
+        An object is iterable, like the namedtuples of this module :
+        tuple(selectedfile) gives the values of _fields (the target name and
+        tags being rendered), and SELECTELEMENT(*values) the same object again;
+        this tuple is the form written in the temporary database of
+        SelectStore, in the journal and in the plans.
+    """
+    __slots__ = ("path", "filename", "partialhashid", "size", "epoch", "hashid",
+                 "database_index", "dev", "ino", "mtime_ns", "_targetname", "_targettags")
+
+    _fields = ("path", "filename", "partialhashid", "size", "epoch", "hashid",
+               "database_index", "dev", "ino", "mtime_ns", "targetname", "targettags")
+
+    #///////////////////////////////////////////////////////////////////////////
+    def __init__(self, path, filename, partialhashid, size, epoch, hashid,
+                 database_index, dev=None, ino=None, mtime_ns=None,
+                 targetname=None, targettags=None):
+        """
+                o targetname, targettags        : None (rendered on demand)
+                                                  or (str)
+        """
+        self.path = sys.intern(path)
+        self.filename = filename
+        self.partialhashid = partialhashid
+        self.size = size
+        self.epoch = epoch
+        self.hashid = hashid
+        self.database_index = database_index
+        self.dev = dev
+        self.ino = ino
+        self.mtime_ns = mtime_ns
+        self._targetname = targetname
+        self._targettags = targettags
+
+    #///////////////////////////////////////////////////////////////////////////
+    def __eq__(self, other):
+        return isinstance(other, SELECTELEMENT) and tuple(self) == tuple(other)
+
+    #///////////////////////////////////////////////////////////////////////////
+    def __iter__(self):
+        for field in self._fields:
+            yield getattr(self, field)
+
+    #///////////////////////////////////////////////////////////////////////////
+    def __repr__(self):
+        return "SELECTELEMENT({0})".format(
+            ", ".join("{0}={1!r}".format(field, value)
+                      for field, value in zip(self._fields, self)))
+
+    __hash__ = None
+
+    #///////////////////////////////////////////////////////////////////////////
+    @property
+    def date(self):
+        """
+                (str) see CST__DTIME_FORMAT
+        """
+        return datetime.utcfromtimestamp(self.epoch).strftime(CST__DTIME_FORMAT)
+
+    #///////////////////////////////////////////////////////////////////////////
+    @property
+    def extension(self):
+        """
+                (str) see get_filename_and_extension()
+        """
+        return get_filename_and_extension(self.fullname)[1]
+
+    #///////////////////////////////////////////////////////////////////////////
+    @property
+    def filename_no_extens(self):
+        """
+                (str) see get_filename_and_extension()
+        """
+        return get_filename_and_extension(self.fullname)[0]
+
+    #///////////////////////////////////////////////////////////////////////////
+    @property
+    def fingerprint(self):
+        """
+                (dev, ino, size, mtime_ns) of the source file, as read when the
+                file has been selected and hashed : see plan__write().
+        """
+        return (self.dev, self.ino, self.size, self.mtime_ns)
+
+    #///////////////////////////////////////////////////////////////////////////
+    @property
+    def fullname(self):
+        """
+                (str) path + filename
+        """
+        return os.path.join(self.path, self.filename)
+
+    #///////////////////////////////////////////////////////////////////////////
+    def pin(self):
+        """
+                Render the target name and tags and keep them : they aren't
+                rendered again, see fill_select__checks().
+        """
+        if self._targetname is None:
+            self._targetname = self.render(create_target_name)
+        if self._targettags is None:
+            self._targettags = self.render(create_target_tags)
+
+    #///////////////////////////////////////////////////////////////////////////
+    def render(self, function):
+        """
+                Return function(...), function being create_target_name() or
+                create_target_tags().
+        """
+        filename_no_extens, extension = get_filename_and_extension(self.fullname)
+        return function(parameters=CFG_PARAMETERS,
+                        hashid=self.hashid,
+                        filename_no_extens=filename_no_extens,
+                        path=self.path,
+                        extension=extension,
+                        _size=self.size,
+                        date=self.date,
+                        database_index=self.database_index)
+
+    #///////////////////////////////////////////////////////////////////////////
+    @property
+    def targetname(self):
+        """
+                (str) see create_target_name()
+        """
+        if self._targetname is not None:
+            return self._targetname
+        return self.render(create_target_name)
+
+    #///////////////////////////////////////////////////////////////////////////
+    @property
+    def targettags(self):
+        """
+                (str) see create_target_tags()
+        """
+        if self._targettags is not None:
+            return self._targettags
+        return self.render(create_target_tags)
+
+#///////////////////////////////////////////////////////////////////////////////
+class SelectStore(collections.abc.MutableMapping):
+    """
+        SelectStore class
+
+        The type of SELECT : a mapping (str)hashid : SELECTELEMENT, keeping
+        the order of insertion.
+
+        The entries are stored in a dict until their estimated size (see
+        CST__SELECT_ENTRY_OVERHEAD) exceeds the memory budget : they are then
+        moved ("spilled") into a temporary SQLite database, written on disk
+        outside the target path and deleted when the object is destroyed.
+        From then, every entry is read from this database and the checks of
+        fill_select__checks() are made by SQL queries (see
+        targetname_conflicts() and existing_targetnames()).
+    """
+    #///////////////////////////////////////////////////////////////////////////
+    def __init__(self, memory_budget=None):
+        """
+                o memory_budget : None (the "[source] selection memory budget"
+                                  value) or (int) the budget in bytes
+        """
+        if memory_budget is None:
+            memory_budget = CST__SELECT_MEMORY_BUDGET
+            if CFG_PARAMETERS is not None:
+                memory_budget = CFG_PARAMETERS.getint("source", "selection memory budget",
+                                                      fallback=CST__SELECT_MEMORY_BUDGET)
+            memory_budget *= 1024*1024
+
+        self.memory_budget = memory_budget
+        self.memory_size = 0        # estimated size of <entries>, in bytes
+        self.entries = {}           # hashid : SELECTELEMENT; None once spilled
+        self.db_connection = None   # the temporary database once spilled
+        self.length = 0             # number of entries once spilled
+        self.last_rank = 0          # rank of the last inserted entry once spilled
+
+    #///////////////////////////////////////////////////////////////////////////
+    def __contains__(self, hashid):
+        if self.entries is not None:
+            return hashid in self.entries
+        return self.db_connection.execute("SELECT 1 FROM selection WHERE key=?",
+                                          (hashid,)).fetchone() is not None
+
+    #///////////////////////////////////////////////////////////////////////////
+    def __delitem__(self, hashid):
+        if self.entries is not None:
+            del self.entries[hashid]
+            return
+        if self.db_connection.execute("DELETE FROM selection WHERE key=?",
+                                      (hashid,)).rowcount == 0:
+            raise KeyError(hashid)
+        self.length -= 1
+
+    #///////////////////////////////////////////////////////////////////////////
+    def __getitem__(self, hashid):
+        if self.entries is not None:
+            return self.entries[hashid]
+        row = self.db_connection.execute("SELECT * FROM selection WHERE key=?",
+                                         (hashid,)).fetchone()
+        if row is None:
+            raise KeyError(hashid)
+        return SELECTELEMENT(*row[2:])
+
+    #///////////////////////////////////////////////////////////////////////////
+    def __iter__(self):
+        for hashid, _ in self.items():
+            yield hashid
+
+    #///////////////////////////////////////////////////////////////////////////
+    def __len__(self):
+        if self.entries is not None:
+            return len(self.entries)
+        return self.length
+
+    #///////////////////////////////////////////////////////////////////////////
+    def __setitem__(self, hashid, selectedfile):
+        if self.entries is not None:
+            self.entries[hashid] = selectedfile
+            self.memory_size += CST__SELECT_ENTRY_OVERHEAD + len(hashid) + \
+                                len(selectedfile.filename) + len(selectedfile.partialhashid or "")
+            if self.memory_size > self.memory_budget:
+                self.spill()
+            return
+
+        try:
+            self.db_connection.execute("INSERT INTO selection VALUES (?,?{0})".format(
+                ",?"*len(SELECTELEMENT._fields)), (self.last_rank+1, hashid)+tuple(selectedfile))
+            self.last_rank += 1
+            self.length += 1
+        except sqlite3.IntegrityError:
+            # <hashid> is already stored : its rank is kept.
+            self.db_connection.execute("UPDATE selection SET ({0})=({1}) WHERE key=?".format(
+                ", ".join(SELECTELEMENT._fields), ", ".join("?"*len(SELECTELEMENT._fields))),
+                                       tuple(selectedfile)+(hashid,))
+
+    #///////////////////////////////////////////////////////////////////////////
+    def existing_targetnames(self, targetpath):
+        """
+                Yield (hashid, SELECTELEMENT) for each entry whose target name
+                exists in <targetpath> : the names of the target path are
+                written in the temporary database and joined with the target
+                names. A target name containing a directory is checked with
+                os.path.exists().
+
+                Only to be used once the entries have been spilled.
+        """
+        self.db_connection.execute("DROP TABLE IF EXISTS temp.targetpath")
+        self.db_connection.execute("CREATE TEMPORARY TABLE targetpath (name TEXT PRIMARY KEY)")
+        try:
+            with os.scandir(targetpath) as entries:
+                self.db_connection.executemany("INSERT OR IGNORE INTO targetpath VALUES (?)",
+                                               ((entry.name,) for entry in entries))
+        except OSError:
+            pass
+
+        for row in self.pages("SELECT * FROM selection "
+                              "WHERE targetname IN (SELECT name FROM targetpath) "
+                              "OR instr(targetname, ?)", (os.sep,)):
+            selectedfile = SELECTELEMENT(*row[2:])
+            if os.sep not in selectedfile.targetname or \
+               os.path.exists(os.path.join(targetpath, selectedfile.targetname)):
+                yield (row[1], selectedfile)
+
+        self.db_connection.execute("DROP TABLE targetpath")
+
+    #///////////////////////////////////////////////////////////////////////////
+    def is_spilled(self):
+        """
+                Return True if the entries are stored in the temporary database.
+        """
+        return self.entries is None
+
+    #///////////////////////////////////////////////////////////////////////////
+    def items(self):
+        if self.entries is not None:
+            yield from self.entries.items()
+            return
+        for row in self.pages("SELECT * FROM selection"):
+            yield (row[1], SELECTELEMENT(*row[2:]))
+
+    #///////////////////////////////////////////////////////////////////////////
+    def pages(self, sqlorder, parameters=()):
+        """
+                Yield the rows of the temporary database selected by <sqlorder>
+                (a SELECT order without ORDER BY, the first column being the
+                rank), in the order of insertion, reading CST__SELECT_PAGE_SIZE
+                rows at once : the entries may be deleted between two pages.
+        """
+        sqlorder = "SELECT * FROM ({0}) WHERE rank > ? ORDER BY rank LIMIT ?".format(sqlorder)
+        rank = 0
+        while True:
+            rows = self.db_connection.execute(sqlorder, tuple(parameters) +
+                                              (rank, CST__SELECT_PAGE_SIZE)).fetchall()
+            if not rows:
+                return
+            yield from rows
+            rank = rows[-1][0]
+
+    #///////////////////////////////////////////////////////////////////////////
+    def spill(self):
+        """
+                Move the entries into a temporary database.
+        """
+        LOGGER.info("    o the selection exceeds %s (see [source]selection memory budget) : "
+                    "it's now stored in a temporary database.",
+                    size_as_str(self.memory_budget))
+
+        # the empty name gives a temporary database, deleted once closed :
+        self.db_connection = sqlite3.connect("")
+        self.db_connection.execute("CREATE TABLE selection (rank INTEGER PRIMARY KEY, "
+                                   "key TEXT UNIQUE, {0})".format(
+                                       ", ".join(SELECTELEMENT._fields)))
+        self.db_connection.executemany("INSERT INTO selection VALUES (?,?{0})".format(
+            ",?"*len(SELECTELEMENT._fields)),
+                                       ((rank, hashid)+tuple(selectedfile)
+                                        for rank, (hashid, selectedfile)
+                                        in enumerate(self.entries.items(), 1)))
+        self.length = self.last_rank = len(self.entries)
+        self.entries = None
+        self.memory_size = 0
+
+    #///////////////////////////////////////////////////////////////////////////
+    def targetname_conflicts(self):
+        """
+                Yield (hashid, SELECTELEMENT, (str)fullname of the first file
+                using the same target name) for each entry whose target name
+                is used by a previous entry.
+
+                Only to be used once the entries have been spilled.
+        """
+        self.db_connection.execute("CREATE INDEX IF NOT EXISTS selection_targetname "
+                                   "ON selection (targetname, rank)")
+        for row in self.pages("SELECT selection.*, first.path, first.filename "
+                              "FROM selection JOIN selection AS first ON first.rank="
+                              "(SELECT other.rank FROM selection AS other "
+                              " WHERE other.targetname=selection.targetname "
+                              " ORDER BY other.rank LIMIT 1) "
+                              "WHERE first.rank < selection.rank"):
+            yield (row[1], SELECTELEMENT(*row[2:-2]), os.path.join(row[-2], row[-1]))
+
+    #///////////////////////////////////////////////////////////////////////////
+    def values(self):
+        for _, selectedfile in self.items():
+            yield selectedfile
+
 #///////////////////////////////////////////////////////////////////////////////
 class ColorFormatter(logging.Formatter):
     """
@@ -309,6 +931,32 @@ def action__add():
 
         Add the source files described in SELECT/SELECT_SIZE_IN_BYTES to the
         target path.
+
+        The files are copied (moved, linked) by "[target] copy workers"
+        threads, see action__add__file(). The database is updated as the files are
+        copied, in the order of SELECT, by chunks of "[target] database batch
+        size" rows (see db_write_in_chunks()) : an interrupted copy leaves a
+        database describing the files already copied.
+
+        Free space reservation : a file is given to a worker only if the free
+        space on the target disk, minus the size of the files being copied,
+        is big enough (see CST__FREESPACE_MARGIN); otherwise the copies in
+        progress have to be completed first. If there's still not enough space,
+        the remaining files aren't added. No space is reserved for the links
+        (see get_required_space()).
+
+        The files selected without their hashids (see "[target] hash while
+        copying" and fill_select()) are hashed while being copied into the
+        tasks subdirectory (see action__add__hashcopy()), then renamed as
+        target files, the rename being atomic. Such a file is discarded if
+        its hashid is already known.
+
+        Task journal : before the first copy, the selected files are written
+        in the journal (see get_journal_fullname()) as "planned", then each
+        file is written as "copied" and each chunk of rows written in the
+        database as "committed". The journal is deleted at the end of the
+        function : if it still exists, an add has been interrupted and
+        action__add__recover() has to be called.
         ________________________________________________________________________
 
         no PARAMETER
@@ -318,81 +966,540 @@ def action__add():
     """
     LOGGER.info("  = copying data =")
 
-    db_connection = sqlite3.connect(get_database_fullname())
-    db_cursor = db_connection.cursor()
+    mode = CFG_PARAMETERS["target"]["mode"]
+    docopy = mode != "nocopy" and not ARGS.off
+    target_dev = os.stat(normpath(ARGS.targetpath)).st_dev
 
-    if get_disk_free_space(ARGS.targetpath) < SELECT_SIZE_IN_BYTES*CST__FREESPACE_MARGIN:
+    if get_disk_free_space(ARGS.targetpath) < \
+       get_required_space(SELECT.values(), mode, target_dev)*CST__FREESPACE_MARGIN:
         LOGGER.info("    ! Not enough space on disk. Stopping the program.",
             color="red")
         # returned value : -1 = error
         return -1
 
-    files_to_be_added = []
+    copy_workers = CFG_PARAMETERS.getint("target", "copy workers", fallback=1)
+    hash_buffer_size = CFG_PARAMETERS.getint("source", "hash buffer size",
+                                             fallback=CST__HASH_BUFFER_SIZE)
+    tasks_path = os.path.join(normpath(ARGS.targetpath), CST__KATALSYS_SUBDIR,
+                              CST__TASKS_SUBSUBDIR)
+    executor = None
+    if docopy and copy_workers > 1:
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=copy_workers)
+
     len_select = len(SELECT)
-    for index, hashid in enumerate(SELECT):
+    reserved_space = 0      # space required by the files being copied, in bytes
+    copied_size = 0         # size of the files already copied, in bytes
+    nbr_of_errors = 0
+    hashed_while_copying = set()  # hashids computed by action__add__hashcopy()
+    nbr_of_duplicates = 0   # files discarded after action__add__hashcopy()
+    backends = collections.Counter()  # copy backend : number of files
+
+    # the task journal; the selected files are written as "planned" before any copy :
+    journal = None
+    if not ARGS.off:
+        journal = open(get_journal_fullname(), "w", encoding="utf-8")
+        journal__write(journal, ({"state": "started", "mode": mode},))
+        journal__write(journal,
+                       ({"state": "planned", "hashid": hashid, "file": list(selectedfile)}
+                        for hashid, selectedfile in SELECT.items()),
+                       sync=True)
+    nbr_of_committed_rows = 0
 
-        complete_source_filename = SELECT[hashid].fullname
-        target_name = os.path.join(normpath(ARGS.targetpath), SELECT[hashid].targetname)
+    #. . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . .
+    def enough_space(size):
+        """
+                Return True if a file of <size> bytes may be copied now.
+        """
+        return get_disk_free_space(ARGS.targetpath) - reserved_space >= \
+               size*CST__FREESPACE_MARGIN
 
-        sourcedate = datetime.utcfromtimestamp(os.path.getmtime(complete_source_filename))
-        sourcedate = sourcedate.replace(second=0, microsecond=0)
+    #. . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . .
+    def committed(nbr_of_rows):
+        """
+                Write in the journal that <nbr_of_rows> rows have been written
+                in the database.
+        """
+        nonlocal nbr_of_committed_rows
 
-        # converting the datetime object in epoch value (=the number of seconds from 1970-01-01 :
-        sourcedate -= datetime(1970, 1, 1)
-        sourcedate = sourcedate.total_seconds()
+        nbr_of_committed_rows += nbr_of_rows
+        journal__write(journal, ({"state": "committed", "rows": nbr_of_committed_rows},),
+                       sync=True)
 
-        if not ARGS.off:
-            if CFG_PARAMETERS["target"]["mode"] == "nocopy":
+    #. . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . .
+    def complete(index, hashid, targetname, targettags, target_name, sourcedate,
+                 required_space, copy_name, future):
+        """
+                Wait for the copy of a file (or make it if there's no worker)
+                and return the row to be written in the database, None if an
+                error occured or if the file has been discarded.
+
+                <targetname> and <targettags> are rendered once by
+                files_to_be_added(); <copy_name> is the temporary file used by
+                action__add__hashcopy(), None if the hashids of the file are
+                known.
+        """
+        nonlocal reserved_space, copied_size, nbr_of_errors, nbr_of_duplicates
+
+        selectedfile = SELECT[hashid]
+        partialhashid = selectedfile.partialhashid
+        try:
+            if copy_name is None:
+                if future is not None:
+                    backends[future.result()] += 1
+                elif docopy:
+                    backends[action__add__file(selectedfile.fullname, target_name,
+                                               mode, sourcedate)] += 1
+            else:
+                if future is not None:
+                    partialhashid, hashid = future.result()
+                else:
+                    partialhashid, hashid = action__add__hashcopy(selectedfile.fullname,
+                                                                  copy_name, sourcedate,
+                                                                  hash_buffer_size,
+                                                                  HASH_ALGORITHM)
+                if hashid in TARGET_DB or hashid in SELECT or hashid in hashed_while_copying:
+                    copied_size += selectedfile.size
+                    os.remove(copy_name)
+                    LOGGER.info("    ... (%s/%s) (similar hashid among the files to be "
+                                "copied) discarded \"%s\"",
+                                index+1, len_select, selectedfile.fullname)
+                    nbr_of_duplicates += 1
+                    return None
+
+                os.replace(copy_name, target_name)
+                hashed_while_copying.add(hashid)
+                backends["hashed copy"] += 1
+        except OSError as exception:
+            LOGGER.error("    ! (%s/%s) can't %s \"%s\" to \"%s\" : %s",
+                         index+1, len_select, mode, selectedfile.fullname, target_name,
+                         exception, color="red")
+            nbr_of_errors += 1
+            if copy_name is not None and os.path.exists(copy_name):
+                os.remove(copy_name)
+            return None
+        finally:
+            reserved_space -= required_space
+
+        copied_size += selectedfile.size
+        if docopy:
+            LOGGER.info("    ... (%s/%s) done : %s of %s (%.2f%%)",
+                        index+1, len_select, size_as_str(copied_size),
+                        size_as_str(SELECT_SIZE_IN_BYTES),
+                        copied_size/SELECT_SIZE_IN_BYTES*100.0 if SELECT_SIZE_IN_BYTES else 100.0)
+
+        if journal is not None:
+            journal__write(journal, ({"state": "copied", "index": index,
+                                      "hashids": [partialhashid, hashid]},))
+
+        return (hashid,
+                partialhashid,
+                selectedfile.size,
+                targetname,
+                selectedfile.fullname,
+                sourcedate,
+                targettags)
+
+    #. . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . .
+    def files_to_be_added():
+        """
+                Give the files to the workers and yield the rows to be inserted
+                in the database, in the order of SELECT.
+        """
+        nonlocal reserved_space, nbr_of_errors
+
+        # files being copied :
+        #   (index, hashid, targetname, targettags, target_name, sourcedate,
+        #    required space, temporary file or None, future or None)
+        pending = collections.deque()
+        max_pending = copy_workers*CST__COPY_QUEUE if executor is not None else 0
+
+        for index, hashid in enumerate(SELECT):
+            selectedfile = SELECT[hashid]
+            # the target name and tags are rendered only once :
+            targetname = selectedfile.targetname
+            targettags = selectedfile.targettags
+            target_name = os.path.join(normpath(ARGS.targetpath), targetname)
+
+            # the date of the source file, read by fill_select(), as an epoch value
+            # (=the number of seconds from 1970-01-01) :
+            sourcedate = selectedfile.epoch
+
+            required_space = 0
+            if docopy:
+                required_space = get_required_space((selectedfile,), mode, target_dev)
+
+            if required_space > 0:
+                while not enough_space(required_space) and len(pending) > 0:
+                    row = complete(*pending.popleft())
+                    if row is not None:
+                        yield row
+
+                if not enough_space(required_space):
+                    LOGGER.error("    ! (%s/%s) not enough space on disk to %s \"%s\" : "
+                                 "the remaining files won't be added.",
+                                 index+1, len_select, mode, selectedfile.fullname,
+                                 color="red")
+                    nbr_of_errors += 1
+                    break
+                reserved_space += required_space
+
+            if mode == "nocopy":
                 # nothing to do
                 LOGGER.info("    ... (%s/%s) due to the mode=nocopy' option, "
                     "\"%s\" will be simply added "
                     "in the target database.", index+1, len_select,
-                                                complete_source_filename)
-
-            elif CFG_PARAMETERS["target"]["mode"] == "copy":
-                # copying the file :
-                LOGGER.info("    ... (%s/%s) about to " "copy \"%s\" to \"%s\" .",
-                            index+1, len_select, complete_source_filename, target_name)
-                shutil.copyfile(complete_source_filename, target_name)
-                os.utime(target_name, (sourcedate, sourcedate))
-
-            elif CFG_PARAMETERS["target"]["mode"] == "move":
-                # moving the file :
-                LOGGER.info("    ... (%s/%s) about to " "move \"%s\" to \"%s\" .",
-                            index+1, len_select, complete_source_filename, target_name)
-                shutil.move(complete_source_filename, target_name)
-                os.utime(target_name, (sourcedate, sourcedate))
-
-        files_to_be_added.append((hashid,
-                                  SELECT[hashid].partialhashid,
-                                  SELECT[hashid].size,
-                                  SELECT[hashid].targetname,
-                                  complete_source_filename,
-                                  sourcedate,
-                                  SELECT[hashid].targettags))
-
-    LOGGER.info("    = all files have been copied, let's update the database... =")
-
+                                                selectedfile.fullname)
+            else:
+                LOGGER.info("    ... (%s/%s) about to " "%s \"%s\" to \"%s\" .",
+                            index+1, len_select, mode, selectedfile.fullname, target_name)
+
+            # the files selected without their hashids are copied into the tasks
+            # subdirectory and hashed at the same time :
+            copy_name = None
+            if docopy and hashid.startswith(CST__DEFERRED_HASHID_PREFIX):
+                copy_name = os.path.join(tasks_path, "add_{0}.tmp".format(index))
+
+            future = None
+            if executor is not None and copy_name is None:
+                future = executor.submit(action__add__file,
+                                         selectedfile.fullname, target_name, mode, sourcedate)
+            elif executor is not None:
+                future = executor.submit(action__add__hashcopy,
+                                         selectedfile.fullname, copy_name, sourcedate,
+                                         hash_buffer_size, HASH_ALGORITHM)
+            pending.append((index, hashid, targetname, targettags, target_name, sourcedate,
+                            required_space, copy_name, future))
+
+            # back-pressure : the oldest files have to be completed before going on.
+            while len(pending) > max_pending:
+                row = complete(*pending.popleft())
+                if row is not None:
+                    yield row
+
+        while len(pending) > 0:
+            row = complete(*pending.popleft())
+            if row is not None:
+                yield row
+
+    # the tags of each file are written in the transaction of its row :
+    db_connection = sqlite3.connect(get_database_fullname())
     try:
-        if not ARGS.off:
-            db_cursor.executemany('INSERT INTO dbfiles VALUES (?,?,?,?,?,?,?)', files_to_be_added)
+        nbr_of_added_files = db_write_in_chunks(
+            db_connection,
+            'INSERT INTO dbfiles VALUES (?,?,?,?,?,?,?)',
+            files_to_be_added(),
+            committed=committed if journal is not None else None,
+            related=('INSERT OR IGNORE INTO file_tags VALUES (?,?)', get_file_tags_rows))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        db_connection.close()
 
-    except sqlite3.IntegrityError as exception:
-        LOGGER.error("!!! An error occured while writing the database : %s\n"
-                     "!!! files to be added", str(exception), color="red")
-        for file_to_be_added in files_to_be_added:
-            LOGGER.error("     ! hashid=%s; partialhashid=%s; size=%s; name=%s; sourcename=%s; "
-                "sourcedate=%s; tagsstr=%s", *file_to_be_added, color="red")
-        raise KatalError("An error occured while writing the database : "+str(exception))
+        if journal is not None:
+            journal.close()
 
-    db_connection.commit()
-    db_connection.close()
+    # no interruption : the journal is useless.
+    if journal is not None:
+        os.remove(get_journal_fullname())
 
-    LOGGER.info("    = ... database updated =")
+    del backends[None]  # moved files
+    copy_file__report(backends)
+    if nbr_of_duplicates > 0:
+        LOGGER.info("    o %s file(s) discarded after having been hashed while copied.",
+                    nbr_of_duplicates)
+    LOGGER.info("    = ... database updated : %s file(s) added =", nbr_of_added_files)
+
+    if nbr_of_errors > 0:
+        LOGGER.warning("    ! %s error(s) : see details above.", nbr_of_errors, color="red")
+        # returned value : -1 = error
+        return -1
 
     # returned value : 0 = success
     return 0
 
+#///////////////////////////////////////////////////////////////////////////////
+def action__add__file(source_name, target_name, mode, sourcedate):
+    """
+        action__add__file()
+        ________________________________________________________________________
+
+        Function used by action__add() : copy (see copy_file()), move or link
+        a source file into the target path. This function may be called by a
+        worker thread : it doesn't write any message.
+
+        o "hardlink" mode : if the hard link can't be created (e.g. the source
+          and the target paths aren't on the same filesystem), the file is
+          copied.
+        o "symlink" mode : the symbolic link points to the absolute path of
+          the source file.
+
+        The links don't get the source date : the date of a hard link is the
+        date of the source file itself and the date of a symbolic link can't
+        be set everywhere.
+        ________________________________________________________________________
+
+        PARAMETERS
+                o source_name   : (str) full name of the source file
+                o target_name   : (str) full name of the target file
+                o mode          : (str) "copy", "move", "hardlink" or "symlink"
+                o sourcedate    : (int) date of the source file, the target
+                                  file getting this modification time.
+
+        RETURNED VALUE
+                (str) the copy backend used (see copy_file()), "hardlink",
+                "symlink" or None if the file has been moved; raise an OSError
+                if something went wrong.
+    """
+    if mode == "hardlink":
+        try:
+            os.link(source_name, target_name)
+            return "hardlink"
+        except OSError as exception:
+            if exception.errno not in CST__HARDLINK_UNSUPPORTED_ERRNOS:
+                raise
+
+    if mode == "symlink":
+        os.symlink(os.path.abspath(source_name), target_name)
+        return "symlink"
+
+    backend = None
+    if mode == "move":
+        shutil.move(source_name, target_name)
+    else:
+        backend = copy_file(source_name, target_name)
+
+    os.utime(target_name, (sourcedate, sourcedate))
+
+    return backend
+
+#///////////////////////////////////////////////////////////////////////////////
+def action__add__hashcopy(source_name, copy_name, sourcedate, buffer_size, algorithm):
+    """
+        action__add__hashcopy()
+        ________________________________________________________________________
+
+        Function used by action__add() : copy a source file whose hashids are
+        unknown (see "[target] hash while copying") into <copy_name>, a
+        temporary file in the tasks subdirectory, hashing the bytes as they are
+        copied : the source file is read only once. action__add() renames the
+        temporary file or deletes it if its hashid is already known.
+
+        This function may be called by a worker thread : it doesn't write
+        any message.
+        ________________________________________________________________________
+
+        PARAMETERS
+                o source_name   : (str) full name of the source file
+                o copy_name     : (str) full name of the temporary file
+                o sourcedate    : (int) date of the source file, the copy
+                                  getting this modification time.
+                o buffer_size   : (int) see hashfile__read()
+                o algorithm     : (str) a key of CST__HASHERS
+
+        RETURNED VALUE
+                ( (str)partial hashid, (str)hashid ); raise an OSError if
+                something went wrong, the temporary file being deleted.
+    """
+    try:
+        with open(copy_name, "wb") as output:
+            hashids = compute_hashids(source_name, buffer_size, algorithm, output=output)
+        os.utime(copy_name, (sourcedate, sourcedate))
+    except OSError:
+        if os.path.exists(copy_name):
+            os.remove(copy_name)
+        raise
+
+    return hashids
+
+#///////////////////////////////////////////////////////////////////////////////
+def action__add__recover():
+    """
+        action__add__recover()
+        ________________________________________________________________________
+
+        Recover an interrupted add from the task journal written by
+        action__add(), if any (see get_journal_fullname()) :
+
+        o the copied files which aren't in the database yet are added to the
+          database if their target file exists, without being hashed again
+          if their source file hasn't been modified since it has been selected
+          (see get_fingerprint()); otherwise, or if the file has been moved,
+          the hashids of the target file are computed again, the file being
+          discarded if these hashids are already known;
+        o the target files of the planned files which haven't been copied are
+          orphans (e.g. a partial copy) : they are deleted, as the temporary
+          files of action__add__hashcopy();
+        o the planned files which haven't been copied are added again by
+          action__add(), without being selected nor hashed again, provided
+          that their source file hasn't been modified since it has been
+          selected : the modified files are left to the next selection.
+
+        TARGET_DB and TARGET_DB_INDEX are read again if the database has
+        been modified.
+        ________________________________________________________________________
+
+        no PARAMETER
+
+        RETURNED VALUE
+                (int) 0 if success, -1 if an error occured.
+    """
+    global SELECT, SELECT_SIZE_IN_BYTES
+
+    journal_name = get_journal_fullname()
+    if not os.path.exists(journal_name):
+        # returned value : 0 = success
+        return 0
+
+    if ARGS.off:
+        LOGGER.warning("  ! an interrupted add has been found (\"%s\") but it can't be "
+                       "recovered with --off.", journal_name, color="red")
+        # returned value : 0 = success
+        return 0
+
+    LOGGER.warning("  = an interrupted add has been found : let's recover it "
+                   "(see \"%s\") =", journal_name)
+
+    mode, planned, copied, nbr_of_committed_rows = journal__read(journal_name)
+    targetpath = normpath(ARGS.targetpath)
+
+    rows = []                   # rows to be written in the database
+    resumed = SelectStore()     # planned files to be added again (see SELECT)
+    nbr_of_orphans = 0
+    planned_hashids = set(hashid for hashid, _ in planned)
+
+    #. . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . .
+    def add_row(planned_hashid, selectedfile, partialhashid, hashid, target_name):
+        """
+                Add to <rows> the row of <selectedfile>, whose content has been
+                copied (moved, linked) into <target_name> : the hashids of the
+                journal are kept if they have been computed from the copy (see
+                action__add__hashcopy()) or if the source file hasn't been
+                modified since it has been selected; otherwise, the hashids of
+                the target file (of the source file with mode=nocopy) are
+                computed again.
+        """
+        size = selectedfile.size
+        if not planned_hashid.startswith(CST__DEFERRED_HASHID_PREFIX) and \
+           (mode == "move" or get_fingerprint(selectedfile.fullname) != selectedfile.fingerprint):
+            recorded_name = selectedfile.fullname if mode == "nocopy" else target_name
+            try:
+                partialhashid, hashid = get_hashids(recorded_name)
+                size = os.path.getsize(recorded_name)
+            except OSError as exception:
+                LOGGER.error("    ! can't read \"%s\" : %s", recorded_name, exception,
+                             color="red")
+                return
+
+            if hashid != planned_hashid and \
+               (hashid in TARGET_DB or hashid in planned_hashids):
+                LOGGER.warning("    ! \"%s\" has been modified since it has been selected "
+                               "and its new content is already known : it isn't added to "
+                               "the database.", selectedfile.fullname, color="red")
+                if mode not in ("nocopy", "move"):
+                    os.remove(target_name)
+                return
+
+        rows.append((hashid,
+                     partialhashid,
+                     size,
+                     selectedfile.targetname,
+                     selectedfile.fullname,
+                     selectedfile.epoch,
+                     selectedfile.targettags))
+
+    # (1) the copied files : the first <nbr_of_committed_rows> files are in the database.
+    for index, (partialhashid, hashid) in list(copied.items())[nbr_of_committed_rows:]:
+        planned_hashid, selectedfile = planned[index]
+        target_name = os.path.join(targetpath, selectedfile.targetname)
+        if mode == "nocopy" or \
+           (os.path.exists(target_name) and
+            (mode == "move" or os.path.getsize(target_name) == selectedfile.size)):
+            add_row(planned_hashid, selectedfile, partialhashid, hashid, target_name)
+        elif os.path.exists(selectedfile.fullname):
+            # the target file has vanished or is incomplete : the file has to be
+            # added again.
+            if os.path.lexists(target_name):
+                LOGGER.info("    - orphan target file deleted : \"%s\"", target_name)
+                os.remove(target_name)
+                nbr_of_orphans += 1
+            if get_fingerprint(selectedfile.fullname) == selectedfile.fingerprint:
+                resumed[planned_hashid] = selectedfile
+
+    # (2) the planned files which haven't been copied :
+    for index, (hashid, selectedfile) in enumerate(planned):
+        if index in copied:
+            continue
+
+        target_name = os.path.join(targetpath, selectedfile.targetname)
+        if not os.path.exists(selectedfile.fullname):
+            if mode == "move" and os.path.exists(target_name):
+                # the file has been moved, the journal hasn't been written :
+                add_row(hashid, selectedfile, selectedfile.partialhashid, hashid, target_name)
+            continue
+
+        if mode != "nocopy" and os.path.lexists(target_name):
+            LOGGER.info("    - orphan target file deleted : \"%s\"", target_name)
+            os.remove(target_name)
+            nbr_of_orphans += 1
+
+        # a source file modified since it has been selected has to be selected
+        # (and hashed) again :
+        if get_fingerprint(selectedfile.fullname) == selectedfile.fingerprint:
+            resumed[hashid] = selectedfile
+        else:
+            LOGGER.info("    - \"%s\" has been modified since it has been selected : "
+                        "it isn't added again.", selectedfile.fullname)
+
+    # (3) temporary files written by action__add__hashcopy() :
+    tasks_path = os.path.join(targetpath, CST__KATALSYS_SUBDIR, CST__TASKS_SUBSUBDIR)
+    for filename in os.listdir(tasks_path):
+        if filename.endswith(".tmp"):
+            os.remove(os.path.join(tasks_path, filename))
+            nbr_of_orphans += 1
+
+    # (4) the files already in the database (the committed ones), whose tags
+    # may be missing in file_tags if they have been written by a former version
+    # of Katal : their tags are read again from the database.
+    db_connection = sqlite3.connect(get_database_fullname())
+    try:
+        committed_hashids = [(hashid,)
+                             for _, hashid in list(copied.values())[:nbr_of_committed_rows]]
+        db_write_in_chunks(db_connection,
+                           'INSERT OR IGNORE INTO file_tags VALUES (?,?)',
+                           (file_tags_row
+                            for hashid in committed_hashids
+                            for dbrow in db_connection.execute('SELECT * FROM dbfiles '
+                                                               'WHERE hashid=?',
+                                                               hashid).fetchall()
+                            for file_tags_row in get_file_tags_rows(dbrow)))
+        db_write_in_chunks(db_connection,
+                           'INSERT OR IGNORE INTO dbfiles VALUES (?,?,?,?,?,?,?)',
+                           rows,
+                           related=('INSERT OR IGNORE INTO file_tags VALUES (?,?)',
+                                    get_file_tags_rows))
+    finally:
+        db_connection.close()
+    os.remove(journal_name)
+
+    LOGGER.info("    o %s file(s) recovered in the database, %s orphan file(s) deleted, "
+                "%s file(s) to be added again.", len(rows), nbr_of_orphans, len(resumed))
+
+    res = 0
+    if resumed:
+        TARGET_DB.clear()
+        TARGET_DB_INDEX.clear()
+        read_target_db()
+
+        SELECT = resumed
+        SELECT_SIZE_IN_BYTES = sum(selectedfile.size for selectedfile in resumed.values())
+        res = action__add()
+
+    TARGET_DB.clear()
+    TARGET_DB_INDEX.clear()
+    read_target_db()
+
+    return res
+
 #///////////////////////////////////////////////////////////////////////////////
 def action__addtag(tag, dest):
     """
@@ -410,6 +1517,82 @@ def action__addtag(tag, dest):
     LOGGER.info("  = let's add the tag string \"%s\" to %s", tag, dest)
     modify_the_tag_of_some_files(tag=tag, dest=dest, _mode="append")
 
+#///////////////////////////////////////////////////////////////////////////////
+def action__apply(planname):
+    """
+        action__apply()
+        ________________________________________________________________________
+
+        Add to the target path the files of a plan written by --select --plan
+        (see plan__write()), without browsing the source path nor hashing the
+        files again.
+
+        The plan has to be written for the current target path, with the
+        current mode and the hasher of the database. A file of the plan is
+        discarded if its source file has been modified since it has been
+        selected (its fingerprint, i.e. (dev, ino, size, mtime_ns), isn't the
+        one read by the scan and stored in the plan), if a file with the same
+        hashid has been added to the database or if its target file exists.
+        The remaining files are added by action__add().
+        ________________________________________________________________________
+
+        PARAMETER
+                o planname      : (str) the plan's name
+
+        RETURNED VALUE
+                (int) 0 if success, -1 if an error occured.
+    """
+    global SELECT, SELECT_SIZE_IN_BYTES
+
+    LOGGER.info("  = applying the plan \"%s\" =", planname)
+
+    header, files = plan__read(planname)
+
+    for key, value in (("targetpath", normpath(ARGS.targetpath)),
+                       ("mode", CFG_PARAMETERS["target"]["mode"]),
+                       ("hash algorithm", HASH_ALGORITHM)):
+        if header[key] != value:
+            raise KatalError("The plan \"{0}\" can't be applied : it has been written "
+                             "with {1}=\"{2}\", not with {1}=\"{3}\".".format(planname, key,
+                                                                              header[key],
+                                                                              value))
+
+    LOGGER.info("    o plan written on %s : %s file(s)", header["date"], len(files))
+
+    SELECT = SelectStore()
+    SELECT_SIZE_IN_BYTES = 0
+    number_of_discarded_files = 0
+
+    targetpath = normpath(ARGS.targetpath)
+    targetnames = set(os.listdir(targetpath))
+
+    for hashid, selectedfile in files:
+        if get_fingerprint(selectedfile.fullname) != selectedfile.fingerprint:
+            reason = "the source file has been modified or deleted"
+        elif hashid in TARGET_DB:
+            reason = "similar hashid in the database"
+        elif selectedfile.targetname in targetnames or \
+             (os.sep in selectedfile.targetname and
+              os.path.exists(os.path.join(targetpath, selectedfile.targetname))):
+            reason = "the target file already exists"
+        else:
+            SELECT[hashid] = selectedfile
+            SELECT_SIZE_IN_BYTES += selectedfile.size
+            continue
+
+        number_of_discarded_files += 1
+        LOGGER.warning("    - discarded \"%s\" : %s.", selectedfile.fullname, reason,
+                       color="red")
+
+    LOGGER.info("    o %s file(s) to be added (%s), %s file(s) discarded.",
+                len(SELECT), size_as_str(SELECT_SIZE_IN_BYTES), number_of_discarded_files)
+
+    if len(SELECT) == 0:
+        # returned value : 0 = success
+        return 0
+
+    return action__add()
+
 #///////////////////////////////////////////////////////////////////////////////
 def action__cleandbrm():
     """
@@ -444,12 +1627,18 @@ def action__cleandbrm():
         LOGGER.info("    * no file to be removed : the database is ok.",
             color="red")
     else:
-        for hashid in files_to_be_rmved_from_the_db:
-            if not ARGS.off:
-                LOGGER.info("    o removing \"%s\" record "
-                    "from the database", hashid)
-                db_cursor.execute("DELETE FROM dbfiles WHERE hashid=?", (hashid,))
-                db_connection.commit()
+        if not ARGS.off:
+            LOGGER.info("    o removing %s record(s) from the database",
+                        len(files_to_be_rmved_from_the_db))
+        db_write_in_chunks(db_connection,
+                           "DELETE FROM dbfiles WHERE hashid=?",
+                           ((hashid,) for hashid in files_to_be_rmved_from_the_db))
+
+        # the source directories of the removed files may be useless :
+        if not ARGS.off and db_has_table(db_connection, "directories"):
+            db_connection.execute("DELETE FROM directories "
+                                  "WHERE dirid NOT IN (SELECT dirid FROM files)")
+            db_connection.commit()
 
     db_connection.close()
     if not ARGS.off:
@@ -510,7 +1699,8 @@ def action__findtag(tag):
         ________________________________________________________________________
 
         Display the files tagged with a tag. "tag" is a simple string, not a
-        regex. The function searches a substring "tag" in the tags' string.
+        regex : the function searches the files having exactly this tag (the
+        "tree" tag doesn't match "streets"), using the file_tags table.
 
         With --copyto, copy the selected files into the directory whose name
         is given by ARGS.copyto .
@@ -532,13 +1722,22 @@ def action__findtag(tag):
     db_connection.row_factory = sqlite3.Row
     db_cursor = db_connection.cursor()
 
-    res = []
-    for db_record in db_cursor.execute('SELECT * FROM dbfiles'):
-        if tag in db_record["tagsstr"]:
+    if not ARGS.off:
+        update_db_schema(db_connection)
+    elif not db_has_table(db_connection, "file_tags"):
+        LOGGER.warning("    ! the database has to be updated : please use this option "
+                       "without --off .", color="red")
+        db_connection.close()
+        return
 
-            res.append(db_record["name"])
-            LOGGER.info("    o \"%s\" : \"%s\"",
-                        db_record["name"], tagsstr_repr(db_record["tagsstr"]))
+    res = []
+    for db_record in db_cursor.execute('SELECT dbfiles.name, dbfiles.tagsstr '
+                                       'FROM file_tags JOIN dbfiles USING (hashid) '
+                                       'WHERE file_tags.tag=? ORDER BY dbfiles.name',
+                                       (tag,)):
+        res.append(db_record["name"])
+        LOGGER.info("    o \"%s\" : \"%s\"",
+                    db_record["name"], tagsstr_repr(db_record["tagsstr"]))
 
     len_res = len(res)
     if len_res == 0:
@@ -562,13 +1761,16 @@ def action__findtag(tag):
             if not ARGS.off:
                 os.mkdir(normpath(ARGS.copyto))
 
+        backends = collections.Counter()  # copy backend : number of files
         for i, filename in enumerate(res):
             src = os.path.join(normpath(ARGS.targetpath), filename)
             dest = os.path.join(normpath(ARGS.copyto), filename)
             LOGGER.info("    o (%s/%s) copying \"%s\" as \"%s\"...",
                         i+1, len_res, src, dest)
             if not ARGS.off:
-                shutil.copy(src, dest)
+                backends[copy_file(src, dest)] += 1
+                shutil.copymode(src, dest)
+        copy_file__report(backends)
 
 #///////////////////////////////////////////////////////////////////////////////
 def action__infos():
@@ -687,6 +1889,7 @@ def action__rebase(newtargetpath):
     olddb_cursor = olddb_connection.cursor()
 
     files, anomalies_nbr = action__rebase__files(olddb_cursor, dest_params, newtargetpath)
+    hash_algorithm = get_db_hash_algorithm(olddb_connection)
 
     go_on = True
     if anomalies_nbr != 0:
@@ -702,7 +1905,7 @@ def action__rebase(newtargetpath):
         olddb_connection.close()
         return
     else:
-        action__rebase__write(new_db, files)
+        action__rebase__write(new_db, files, hash_algorithm)
         olddb_connection.close()
 
 #///////////////////////////////////////////////////////////////////////////////
@@ -774,13 +1977,14 @@ def action__rebase__files(olddb_cursor, dest_params, newtargetpath):
                            new_name, fullname, color="red")
             anomalies_nbr += 1
         else:
-            files[olddb_record["hashid"]] = (fullname, new_name, date, tagsstr)
+            files[olddb_record["hashid"]] = (fullname, new_name, date, tagsstr,
+                                             size, olddb_record["partialhashid"])
             filenames.add(new_name)
 
     return files, anomalies_nbr
 
 #///////////////////////////////////////////////////////////////////////////////
-def action__rebase__write(new_db, _files):
+def action__rebase__write(new_db, _files, hash_algorithm=CST__HASH_ALGORITHM_DEFAULT):
     """
         action__rebase__write()
         ________________________________________________________________________
@@ -791,6 +1995,8 @@ def action__rebase__write(new_db, _files):
         PARAMETER :
                 o new_db                : (str) new database's name
                 o _files                : (dict) see action__rebase__files()
+                o hash_algorithm        : (str) hash algorithm of the current
+                                          database, the hashids being copied
 
         About the underscore before "_files" :
         confer https://www.python.org/dev/peps/pep-0008/#function-and-method-arguments
@@ -805,19 +2011,13 @@ def action__rebase__write(new_db, _files):
     newdb_connection.row_factory = sqlite3.Row
     newdb_cursor = newdb_connection.cursor()
 
-    try:
-        if not ARGS.off:
-            newdb_cursor.execute(CST__SQL__CREATE_DB)
-
+    #. . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . .
+    def files_to_be_added():
+        """
+                Yield the rows to be inserted in the new database.
+        """
         for index, futurefile_hashid in enumerate(_files):
             futurefile = _files[futurefile_hashid]
-            file_to_be_added = (futurefile_hashid,      # hashid
-                                futurefile[5],          # partial hashid
-                                futurefile[4],          # size
-                                futurefile[1],          # new name
-                                futurefile[0],          # sourcename
-                                futurefile[2],          # sourcedate
-                                futurefile[3])          # tags
 
             strdate = datetime.utcfromtimestamp(futurefile[2]).strftime(CST__DTIME_FORMAT)
             LOGGER.info("    o (%s/%s) adding a file in the new database", index+1, len(_files))
@@ -828,27 +2028,119 @@ def action__rebase__write(new_db, _files):
             LOGGER.info("      o size        : %s", futurefile[4])
             LOGGER.info("      o tags        : \"%s\"", futurefile[3])
 
-            if not ARGS.off:
-                newdb_cursor.execute('INSERT INTO dbfiles VALUES (?,?,?,?,?,?,?)', file_to_be_added)
-                newdb_connection.commit()
+            yield (futurefile_hashid,      # hashid
+                   futurefile[5],          # partial hashid
+                   futurefile[4],          # size
+                   futurefile[1],          # new name
+                   futurefile[0],          # sourcename
+                   futurefile[2],          # sourcedate
+                   futurefile[3])          # tags
+
+    if not ARGS.off:
+        newdb_cursor.execute(CST__SQL__CREATE_DB)
+        update_db_schema(newdb_connection)
+        set_db_hash_algorithm(newdb_connection, hash_algorithm)
 
-    except sqlite3.IntegrityError as exception:
-        LOGGER.exception("!!! An error occured while writing the new database : ")
-        raise KatalError("An error occured while writing the new database : "+str(exception))
+    db_write_in_chunks(newdb_connection,
+                       'INSERT INTO dbfiles VALUES (?,?,?,?,?,?,?)',
+                       files_to_be_added(),
+                       related=('INSERT OR IGNORE INTO file_tags VALUES (?,?)',
+                                get_file_tags_rows))
 
     newdb_connection.close()
 
     # let's copy the files :
+    backends = collections.Counter()  # copy backend : number of files
     for index, futurefile_hashid in enumerate(_files):
         futurefile = _files[futurefile_hashid]
         old_name, new_name = futurefile[0], futurefile[1]
 
-        LOGGER.info("    o (%s/%s) copying \"%s\" as \"%s\"",
-                    index+1, len(_files), old_name, new_name)
-        if not ARGS.off:
-            shutil.copyfile(old_name, new_name)
+        LOGGER.info("    o (%s/%s) copying \"%s\" as \"%s\"",
+                    index+1, len(_files), old_name, new_name)
+        if not ARGS.off:
+            backends[copy_file(old_name, new_name)] += 1
+
+    copy_file__report(backends)
+    LOGGER.info("    ... done")
+
+#///////////////////////////////////////////////////////////////////////////////
+def action__rehash(algorithm):
+    """
+        action__rehash()
+        ________________________________________________________________________
+
+        Compute again the partial hashid and the hashid of each file stored in
+        the target directory (the source files in 'nocopy' mode) with the
+        <algorithm> hasher, then update the database. The target directory may
+        be offline : the source directory isn't read in 'copy'/'move' mode.
+
+        Nothing is modified if a file is missing or if two files get the same
+        hashid. The files' names aren't modified, even if they were built with
+        the %h keyword : see the --rebase option.
+        ________________________________________________________________________
+
+        PARAMETER
+                o algorithm     : (str) a key of CST__HASHERS
+
+        RETURNED VALUE
+                (bool) True if the database has been converted (or would have
+                been converted with --off)
+    """
+    LOGGER.info("  = computing again the hashids of the target files with %s =", algorithm)
+
+    if not os.path.exists(normpath(get_database_fullname())):
+        LOGGER.warning("    ! no database found.", color="red")
+        return False
+
+    db_connection = sqlite3.connect(get_database_fullname())
+    db_connection.row_factory = sqlite3.Row
+    db_cursor = db_connection.cursor()
+
+    if not ARGS.off:
+        update_db_schema(db_connection)
+
+    buffer_size = CFG_PARAMETERS.getint("source", "hash buffer size",
+                                        fallback=CST__HASH_BUFFER_SIZE)
+
+    new_hashids = []  # a list of (new partial hashid, new hashid, old hashid)
+    for index, db_record in enumerate(db_cursor.execute('SELECT * FROM dbfiles')):
+        if CFG_PARAMETERS["target"]["mode"] == "nocopy":
+            fullname = db_record["sourcename"]
+        else:
+            fullname = os.path.join(normpath(ARGS.targetpath), db_record["name"])
+
+        if not os.path.exists(fullname):
+            LOGGER.warning("    ! can't find \"%s\" : the database hasn't been modified.",
+                           fullname, color="red")
+            db_connection.close()
+            return False
+
+        partialhashid, hashid = compute_hashids(fullname, buffer_size, algorithm)
+        LOGGER.info("    o (%s) %s -> %s (\"%s\")",
+                    index+1, db_record["hashid"], hashid, fullname)
+        new_hashids.append((partialhashid, hashid, db_record["hashid"]))
+
+    if len(set(hashid for _, hashid, _ in new_hashids)) != len(new_hashids):
+        LOGGER.warning("    ! at least two files have the same %s hashid : "
+                       "the database hasn't been modified.", algorithm, color="red")
+        db_connection.close()
+        return False
+
+    if not ARGS.off:
+        # the old hashids are first replaced by temporary values to avoid any
+        # collision between an old hashid and a new one.
+        db_cursor.executemany('UPDATE dbfiles SET hashid=? WHERE hashid=?',
+                              [("~"+oldhashid, oldhashid) for _, _, oldhashid in new_hashids])
+        db_cursor.executemany('UPDATE dbfiles SET partialhashid=?, hashid=? WHERE hashid=?',
+                              [(partialhashid, hashid, "~"+oldhashid)
+                               for partialhashid, hashid, oldhashid in new_hashids])
+        set_db_hash_algorithm(db_connection, algorithm)
 
-    LOGGER.info("    ... done")
+    db_connection.close()
+
+    LOGGER.info("    = ... done : %s file(s), the hash algorithm of the database is %s.",
+                len(new_hashids), algorithm)
+    return True
 
 #///////////////////////////////////////////////////////////////////////////////
 def action__reset():
@@ -883,17 +2175,10 @@ def action__reset():
     for db_record in db_cursor.execute('SELECT * FROM dbfiles'):
         files_to_be_removed.append((db_record["hashid"], db_record["name"]))
 
-    for hashid, name in files_to_be_removed:
-        LOGGER.info("   o removing %s from the database and from the target path", name)
-        if not ARGS.off:
-            # let's remove the file from the target directory :
-            shutil.move(os.path.join(normpath(ARGS.targetpath), name),
-                        os.path.join(normpath(ARGS.targetpath),
-                                     CST__KATALSYS_SUBDIR, CST__TRASH_SUBSUBDIR, name))
-            # let's remove the file from the database :
-            db_cursor.execute("DELETE FROM dbfiles WHERE hashid=?", (hashid,))
-
-            db_connection.commit()
+    # let's remove the files from the target directory and from the database :
+    db_write_in_chunks(db_connection,
+                       "DELETE FROM dbfiles WHERE hashid=?",
+                       move_to_the_trash(files_to_be_removed))
 
     db_connection.close()
 
@@ -921,25 +2206,31 @@ def action__rmnotags():
         db_connection.row_factory = sqlite3.Row
         db_cursor = db_connection.cursor()
 
+        if not ARGS.off:
+            update_db_schema(db_connection)
+        elif not db_has_table(db_connection, "file_tags"):
+            LOGGER.warning("    ! the database has to be updated : please use this option "
+                           "without --off .", color="red")
+            db_connection.close()
+            return
+
+        # the file_tags rows of a file are written in the transaction of its
+        # dbfiles row (see get_file_tags_rows()) : each file is looked up in the
+        # index of file_tags.
         files_to_be_removed = []    # list of (hashid, name)
-        for db_record in db_cursor.execute('SELECT * FROM dbfiles'):
-            if db_record["tagsstr"] == "":
-                files_to_be_removed.append((db_record["hashid"], db_record["name"]))
+        for db_record in db_cursor.execute("SELECT hashid, name FROM dbfiles "
+                                           "WHERE NOT EXISTS (SELECT 1 FROM file_tags "
+                                           "WHERE file_tags.hashid=dbfiles.hashid)"):
+            files_to_be_removed.append((db_record["hashid"], db_record["name"]))
 
         if len(files_to_be_removed) == 0:
-            logger.warning("   ! no files to be removed.", color="red")
+            LOGGER.warning("   ! no files to be removed.", color="red")
         else:
-            for hashid, name in files_to_be_removed:
-                LOGGER.info("   o removing %s from the database and from the target path", name)
-                if not ARGS.off:
-                    # let's remove the file from the target directory :
-                    shutil.move(os.path.join(normpath(ARGS.targetpath), name),
-                                os.path.join(normpath(ARGS.targetpath),
-                                             CST__KATALSYS_SUBDIR, CST__TRASH_SUBSUBDIR, name))
-                    # let's remove the file from the database :
-                    db_cursor.execute("DELETE FROM dbfiles WHERE hashid=?", (hashid,))
+            # let's remove the files from the target directory and from the database :
+            db_write_in_chunks(db_connection,
+                               "DELETE FROM dbfiles WHERE hashid=?",
+                               move_to_the_trash(files_to_be_removed))
 
-        db_connection.commit()
         db_connection.close()
 
 #///////////////////////////////////////////////////////////////////////////////
@@ -984,8 +2275,10 @@ def action__select():
                     filter_index, FILTERS[filter_index])
     LOGGER.info("  o file list :")
 
-    # let's initialize SELECT and SELECT_SIZE_IN_BYTES :
-    number_of_discarded_files = fill_select()
+    # let's initialize SELECT and SELECT_SIZE_IN_BYTES; with --add, the files will
+    # be copied just after having been selected and some of them may be hashed
+    # while being copied :
+    number_of_discarded_files = fill_select(defer_hashing=ARGS.add)
 
     LOGGER.info("    o size of the selected file(s) : %s", size_as_str(SELECT_SIZE_IN_BYTES))
 
@@ -1002,8 +2295,9 @@ def action__select():
 
     # let's check that the target path has sufficient free space :
     if CFG_PARAMETERS["target"]["mode"] != "nocopy":
+        required_space = get_required_space(SELECT.values(), CFG_PARAMETERS["target"]["mode"])
         available_space = get_disk_free_space(ARGS.targetpath)
-        if available_space > SELECT_SIZE_IN_BYTES*CST__FREESPACE_MARGIN:
+        if available_space > required_space*CST__FREESPACE_MARGIN:
             size_ok = "ok"
             colorconsole = "white"
         else:
@@ -1012,7 +2306,7 @@ def action__select():
 
         LOGGER.info("    o required space : %s; "
                     "available space on disk : %s (%s)",
-                    size_as_str(SELECT_SIZE_IN_BYTES), size_as_str(available_space),
+                    size_as_str(required_space), size_as_str(available_space),
                     size_ok, color=colorconsole)
 
     # if there's no --add option, let's give some examples of the target names :
@@ -1127,31 +2421,29 @@ def action__whatabout(src):
         RETURNED VALUE : (bool)is everything ok (=no error) ?
     """
     #. . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . .
-    def show_infos_about_a_srcfile(srcfile_name):
+    def show_infos_about_a_srcfile(srcfile):
         """
-                Display the expected informations about a file named srcfile_name .
+                Display the expected informations about a file described by
+                srcfile, a SRCFILE object.
         """
+        srcfile_name = os.path.join(srcfile.dirpath, srcfile.filename)
         LOGGER.info("  = what about the \"%s\" file ? (path : \"%s\")", src, srcfile_name)
-        size = os.stat(srcfile_name).st_size
-        LOGGER.info("    = size : %s", size_as_str(size))
+        LOGGER.info("    = size : %s", size_as_str(srcfile.size))
 
-        sourcedate = datetime.utcfromtimestamp(os.path.getmtime(srcfile_name))
+        sourcedate = datetime.utcfromtimestamp(srcfile.mtime)
         sourcedate = sourcedate.replace(second=0, microsecond=0)
         sourcedate2 = sourcedate
         sourcedate2 -= datetime(1970, 1, 1)
         sourcedate2 = sourcedate2.total_seconds()
         LOGGER.info("    = mtime : %s (epoch value : %s)", sourcedate, sourcedate2)
 
-        srchash = hashfile64(srcfile_name)
+        srcpartialhash, srchash = get_hashids(srcfile_name,
+                                              fingerprint=(srcfile.dev, srcfile.ino,
+                                                           srcfile.size, srcfile.mtime_ns))
         LOGGER.info("    = hash : %s", srchash)
 
         # is the hash in the database ?
-        already_present_in_db = False
-        for hashid in TARGET_DB:
-            if hashid == srchash:
-                already_present_in_db = True
-                break
-        if already_present_in_db:
+        if srchash in TARGET_DB_INDEX.get(srcfile.size, {}).get(srcpartialhash, []):
             LOGGER.info("    = the file's content is equal to a file ALREADY present in the database.")
         else:
             LOGGER.info("    = the file isn't present in the database.")
@@ -1171,10 +2463,12 @@ def action__whatabout(src):
                 color="red")
             return False
 
-        for dirpath, _, filenames in os.walk(normpath(src)):
-            for filename in filenames:
-                fullname = os.path.join(normpath(dirpath), filename)
-                show_infos_about_a_srcfile(fullname)
+        hashcache__open()
+        for srcfile in scan_source_path(src,
+                                        workers=CFG_PARAMETERS.getint("source", "scan workers",
+                                                                      fallback=1)):
+            show_infos_about_a_srcfile(srcfile)
+        hashcache__close()
 
     else:
         # informations about the source file :
@@ -1182,7 +2476,7 @@ def action__whatabout(src):
             # special case : the file is inside the target directory :
             LOGGER.info("  = what about the \"%s\" file ? (path : \"%s\")", src, normsrc)
             LOGGER.info("    This file is inside the target directory.")
-            srchash = hashfile64(normsrc)
+            srchash = hashfile64(normsrc, algorithm=HASH_ALGORITHM)
             LOGGER.info("    = hash : %s", srchash)
             LOGGER.info("    Informations extracted from the database :")
             # informations from the database :
@@ -1200,7 +2494,16 @@ def action__whatabout(src):
 
         else:
             # normal case : the file is outside the target directory :
-            show_infos_about_a_srcfile(normpath(src))
+            stat = os.stat(normsrc)
+            hashcache__open()
+            show_infos_about_a_srcfile(SRCFILE(dirpath=os.path.dirname(normsrc),
+                                               filename=os.path.basename(normsrc),
+                                               size=stat.st_size,
+                                               mtime=stat.st_mtime,
+                                               dev=stat.st_dev,
+                                               ino=stat.st_ino,
+                                               mtime_ns=stat.st_mtime_ns))
+            hashcache__close()
 
     return True
 
@@ -1248,36 +2551,89 @@ def add_keywords_in_targetstr(srcstring,
         RETURNED VALUE
                 (str)the expected string
     """
-    res = srcstring
-
-    # beware : order matters !
-    res = res.replace("%ht",
-                      hex(int(datetime.strptime(date,
-                                                CST__DTIME_FORMAT).timestamp()))[2:])
-
-    res = res.replace("%h", hashid)
+    return add_keywords_in_targetstrs((srcstring,),
+                                      hashid,
+                                      filename_no_extens,
+                                      path,
+                                      extension,
+                                      _size,
+                                      date,
+                                      database_index)[0]
 
-    res = res.replace("%ff", remove_illegal_characters(filename_no_extens))
-    res = res.replace("%f", filename_no_extens)
-
-    res = res.replace("%pp", remove_illegal_characters(path))
-    res = res.replace("%p", path)
-
-    res = res.replace("%ee", remove_illegal_characters(extension))
-    res = res.replace("%e", extension)
-
-    res = res.replace("%s", str(_size))
+#///////////////////////////////////////////////////////////////////////////////
+def add_keywords_in_targetstrs(srcstrings,
+                               hashid,
+                               filename_no_extens,
+                               path,
+                               extension,
+                               _size,
+                               date,
+                               database_index):
+    """
+        add_keywords_in_targetstrs()
+        ________________________________________________________________________
 
-    res = res.replace("%dd", remove_illegal_characters(date))
+        Same as add_keywords_in_targetstr() but for several strings (e.g. the
+        name and the tags of a file) : each string is compiled once (see
+        compile_targetstr()) and the value of each keyword used by the strings
+        is computed once, e.g. the date is read only once for %t and %ht.
 
-    res = res.replace("%t",
-                      str(int(datetime.strptime(date,
-                                                CST__DTIME_FORMAT).timestamp())))
+        A value is never read again as a keyword : a file named "a%s" gives
+        "a%s", not "a" followed by its size.
+        ________________________________________________________________________
 
-    res = res.replace("%i",
-                      remove_illegal_characters(str(database_index)))
+        PARAMETERS
+                o srcstrings                   : a list of (str)
+                o hashid                       : (str)
+                o filename_no_extens           : (str)
+                o path                         : (str
+                o extension                    : (str)
+                o _size                        : (int)
+                o date                         : (str) see CST__DTIME_FORMAT
+                o database_index               : (int)
 
-    return res
+        RETURNED VALUE
+                a list of (str), one for each string in srcstrings
+    """
+    templates = [compile_targetstr(srcstring) for srcstring in srcstrings]
+
+    values = dict()
+    for template in templates:
+        for keyword in template[1::2]:
+            if keyword in values:
+                continue
+
+            if keyword in ("ht", "t"):
+                # nb : the date is read as a local date, as with the former versions.
+                timestamp = int(datetime.strptime(date, CST__DTIME_FORMAT).timestamp())
+                values["ht"] = hex(timestamp)[2:]
+                values["t"] = str(timestamp)
+            elif keyword == "h":
+                values[keyword] = hashid
+            elif keyword == "ff":
+                values[keyword] = remove_illegal_characters(filename_no_extens)
+            elif keyword == "f":
+                values[keyword] = filename_no_extens
+            elif keyword == "pp":
+                values[keyword] = remove_illegal_characters(path)
+            elif keyword == "p":
+                values[keyword] = path
+            elif keyword == "ee":
+                values[keyword] = remove_illegal_characters(extension)
+            elif keyword == "e":
+                values[keyword] = extension
+            elif keyword == "s":
+                values[keyword] = str(_size)
+            elif keyword == "dd":
+                values[keyword] = remove_illegal_characters(date)
+            elif keyword == "i":
+                values[keyword] = remove_illegal_characters(str(database_index))
+
+    # the even indexes of a template are the strings to be copied, the odd ones
+    # the keywords :
+    return ["".join(values[token] if index % 2 else token
+                    for index, token in enumerate(template))
+            for template in templates]
 
 #///////////////////////////////////////////////////////////////////////////////
 def backup_logfile(_logfile_fullname):
@@ -1332,12 +2688,431 @@ def check_args():
     if ARGS.strictcmp and not (ARGS.add or ARGS.select):
         raise KatalError("--strictcmp can only be used in combination with --select or with --add")
 
+    # --plan can only be used with --select :
+    if ARGS.plan and not ARGS.select:
+        raise KatalError("--plan can only be used in combination with --select .")
+
+    # --apply can't be used with --select or with --add :
+    if ARGS.apply and (ARGS.add or ARGS.select):
+        raise KatalError("--apply can't be used in combination with --select or with --add .")
+
     # --copyto can only be used with --findtag :
     if ARGS.copyto and not ARGS.findtag:
         raise KatalError("--copyto can only be used in combination with --findtag .")
 
 #///////////////////////////////////////////////////////////////////////////////
-def create_empty_db(_db_name):
+def compile_filters_eval(evalstr, filter_indexes):
+    """
+        compile_filters_eval()
+        ________________________________________________________________________
+
+        Compile the "[source]eval" expression (e.g. "filter1 & not(filter2)")
+        into a tree of closures : the expression is checked and parsed only
+        once, the files being then evaluated without any call to eval().
+
+        Known symbols : filterN, True, False, parentheses and, from the lowest
+        to the highest priority, "or", "and", "not", "|", "^", "&" (the same
+        priorities as in Python); "not" may also be used as an operand of
+        "|", "^" and "&", e.g. "filter1 & not(filter2)". The operands of
+        "and", "or", "&" and "|" are evaluated from left to right and the
+        evaluation stops as soon as the result is known.
+
+        The logic is a three-valued one : a filter may be evaluated as None
+        (=unknown, e.g. a "size" filter before the file has been stat'ed; see
+        thefilehastobeadded__filters()). "not None" is None, "False and None"
+        is False, "True or None" is True, "True and None" is None, and so on.
+        ________________________________________________________________________
+
+        PARAMETERS
+                o evalstr        : (str) the expression to be compiled
+                o filter_indexes : the (int) indexes of the known filters
+
+        RETURNED VALUE
+                a function f(evaluate) returning True, False or None, evaluate
+                being a function returning the value (True/False/None) of a
+                filter from its (int) index.
+    """
+    # the characters are checked once, see the note about CST__AUTHORIZED_EVALCHARS.
+    for char in evalstr:
+        if char not in CST__AUTHORIZED_EVALCHARS:
+            raise KatalError("Error in configuration file : "
+                             "trying to compute the \"{0}\" string; "
+                             "wrong character '{1}'({2}) "
+                             "used in the string to be evaluated. "
+                             "Authorized " "characters are "
+                             "{3}".format(evalstr,
+                                          char,
+                                          unicodedata.name(char),
+                                          "|"+"|".join(CST__AUTHORIZED_EVALCHARS)))
+
+    tokens = re.findall(r"filter\d+|\w+|\S", evalstr)
+    position = [0]  # index of the next token in <tokens>
+
+    #. . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . .
+    def error(message):
+        """
+                Return the exception to be raised if <evalstr> is ill-formed.
+        """
+        return KatalError("The eval formula in the config file (\"{0}\") "
+                          "contains an error : {1}".format(evalstr, message))
+
+    #. . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . .
+    def next_token(*expected):
+        """
+                Return the next token and skip it if it's one of <expected>, or
+                return None.
+        """
+        if position[0] < len(tokens) and tokens[position[0]] in expected:
+            position[0] += 1
+            return tokens[position[0]-1]
+        return None
+
+    #. . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . .
+    def parse_binary(operators, parse_operand, combine):
+        """
+                Parse <operand> (<operator> <operand>)* and return the closure
+                made by combine(list of closures) or the only operand.
+        """
+        operands = [parse_operand()]
+        while next_token(*operators):
+            operands.append(parse_operand())
+        if len(operands) == 1:
+            return operands[0]
+        return combine(operands)
+
+    #. . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . .
+    def combine_and(operands):
+        """
+                closure : all the operands are True.
+        """
+        def closure(evaluate):
+            """
+                False if an operand is False, None if an operand is unknown.
+            """
+            res = True
+            for operand in operands:
+                value = operand(evaluate)
+                if value is None:
+                    res = None
+                elif not value:
+                    return False
+            return res
+        return closure
+
+    def combine_or(operands):
+        """
+                closure : at least one operand is True.
+        """
+        def closure(evaluate):
+            """
+                True if an operand is True, None if an operand is unknown.
+            """
+            res = False
+            for operand in operands:
+                value = operand(evaluate)
+                if value is None:
+                    res = None
+                elif value:
+                    return True
+            return res
+        return closure
+
+    def combine_xor(operands):
+        """
+                closure : an odd number of operands are True.
+        """
+        def closure(evaluate):
+            """
+                None if an operand is unknown.
+            """
+            values = [operand(evaluate) for operand in operands]
+            if None in values:
+                return None
+            return sum(bool(value) for value in values) % 2 == 1
+        return closure
+
+    def negate(operand):
+        """
+                closure : not operand; not None is None.
+        """
+        def closure(evaluate):
+            """
+                None if the operand is unknown.
+            """
+            value = operand(evaluate)
+            return None if value is None else not value
+        return closure
+
+    #. . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . .
+    def parse_or():
+        """
+                or_test := and_test ("or" and_test)*
+        """
+        return parse_binary(("or",), parse_and, combine_or)
+
+    def parse_and():
+        """
+                and_test := not_test ("and" not_test)*
+        """
+        return parse_binary(("and",), parse_not, combine_and)
+
+    def parse_not():
+        """
+                not_test := "not" not_test | bitor
+        """
+        if next_token("not"):
+            return negate(parse_not())
+        return parse_binary(("|",), parse_bitxor, combine_or)
+
+    def parse_bitxor():
+        """
+                bitxor := bitand ("^" bitand)*
+        """
+        return parse_binary(("^",), parse_bitand, combine_xor)
+
+    def parse_bitand():
+        """
+                bitand := atom ("&" atom)*
+        """
+        return parse_binary(("&",), parse_atom, combine_and)
+
+    def parse_atom():
+        """
+                atom := "(" or_test ")" | "not" atom | filterN | True | False
+        """
+        if next_token("("):
+            res = parse_or()
+            if not next_token(")"):
+                raise error("a closing parenthesis is missing.")
+            return res
+
+        if next_token("not"):
+            return negate(parse_atom())
+
+        if next_token("True"):
+            return lambda evaluate: True
+        if next_token("False"):
+            return lambda evaluate: False
+
+        if position[0] < len(tokens) and re.match(r"filter\d+$", tokens[position[0]]):
+            filter_index = int(tokens[position[0]][len("filter"):])
+            if filter_index not in filter_indexes:
+                raise error("there's no [source.filter{0}] section.".format(filter_index))
+            position[0] += 1
+            return lambda evaluate: evaluate(filter_index)
+
+        if position[0] < len(tokens):
+            raise error("unexpected \"{0}\".".format(tokens[position[0]]))
+        raise error("the formula is incomplete.")
+
+    res = parse_or()
+    if position[0] < len(tokens):
+        raise error("unexpected \"{0}\".".format(tokens[position[0]]))
+
+    return res
+
+#///////////////////////////////////////////////////////////////////////////////
+def compile_targetstr(srcstring):
+    """
+        compile_targetstr()
+        ________________________________________________________________________
+
+        Compile a string using the keywords of the "name of the target files"
+        and "tags" values (see add_keywords_in_targetstr()) into a tuple of
+        strings : ("text", keyword, "text", keyword, ..., "text"), e.g.
+        "%%dd__%%i.%%e" (in the .ini file) gives ("", "dd", "__", "i", ".",
+        "e", "").
+
+        Each string is compiled once, the result being stored in
+        TARGETSTR_TEMPLATES.
+        ________________________________________________________________________
+
+        PARAMETER
+                o srcstring     : (str) the string to be compiled
+
+        RETURNED VALUE
+                the expected tuple
+    """
+    template = TARGETSTR_TEMPLATES.get(srcstring)
+    if template is None:
+        template = tuple(CST__TARGETSTR_KEYWORDS.split(srcstring))
+        TARGETSTR_TEMPLATES[srcstring] = template
+    return template
+
+#///////////////////////////////////////////////////////////////////////////////
+def compute_hashids(filename, buffer_size=CST__HASH_BUFFER_SIZE,
+                    algorithm=CST__HASH_ALGORITHM_DEFAULT, output=None):
+    """
+        compute_hashids()
+        ________________________________________________________________________
+
+        Compute the partial hashid and the hashid of a file by reading it only
+        once (see hashfile__read()) : a copy of the hasher is taken when
+        CST__PARTIALHASHID_CUTOFF bytes have been read, giving the partial
+        hashid. If the file is smaller than the cutoff, the partial hashid is
+        the hashid.
+
+        The results are the same as
+                hashfile64(filename, stop_after=CST__PARTIALHASHID_BYTESNBR)
+                hashfile64(filename)
+
+        This function may be called by a worker thread or by a worker process
+        (see fill_select()) : it doesn't use any global variable.
+        ________________________________________________________________________
+
+        PARAMETERS
+                o filename      : (str) file's name
+                o buffer_size   : (int) see hashfile__read()
+                o algorithm     : (str) a key of CST__HASHERS
+                o output        : None or a binary file object, see
+                                  hashfile__read()
+
+        RETURNED VALUE
+                ( (str)partial hashid, (str)hashid )
+    """
+    partialhasher, hasher = hashfile__read(filename,
+                                           cutoff=CST__PARTIALHASHID_CUTOFF,
+                                           buffer_size=buffer_size,
+                                           algorithm=algorithm,
+                                           output=output)
+
+    hashid = b64encode(hasher.digest()).decode()
+    if partialhasher is None:
+        return (hashid, hashid)
+    return (b64encode(partialhasher.digest()).decode(), hashid)
+
+#///////////////////////////////////////////////////////////////////////////////
+def copy_file(source_name, target_name):
+    """
+        copy_file()
+        ________________________________________________________________________
+
+        Copy the content of a file, using the fastest available backend (see
+        CST__COPY_BACKENDS) : a reflink (FICLONE), then os.copy_file_range(),
+        then os.sendfile() and, if none of them works, a buffered copy.
+
+        The backend working with a (source filesystem, target filesystem) pair
+        is stored in COPY_BACKENDS : the backends which failed aren't tried
+        again with the next files.
+
+        This function may be called by a worker thread : it doesn't write
+        any message.
+        ________________________________________________________________________
+
+        PARAMETERS
+                o source_name   : (str) the file to be copied
+                o target_name   : (str) the new file
+
+        RETURNED VALUE
+                (str) the backend used, a value of CST__COPY_BACKENDS
+    """
+    with open(source_name, "rb") as source, open(target_name, "wb") as target:
+        source_stat = os.fstat(source.fileno())
+        key = (source_stat.st_dev, os.fstat(target.fileno()).st_dev)
+
+        backends = CST__COPY_BACKENDS
+        if key in COPY_BACKENDS:
+            backends = backends[backends.index(COPY_BACKENDS[key]):]
+
+        for backend in backends:
+            if copy_file__backend(backend, source, target, source_stat.st_size):
+                COPY_BACKENDS[key] = backend
+                return backend
+
+            # let's start again with the next backend :
+            source.seek(0)
+            target.seek(0)
+            target.truncate()
+
+    raise OSError(errno.EIO, "can't copy the file", source_name)
+
+#///////////////////////////////////////////////////////////////////////////////
+def copy_file__backend(backend, source, target, size):
+    """
+        copy_file__backend()
+        ________________________________________________________________________
+
+        Function used by copy_file() : copy <source> into <target> with a
+        given backend.
+        ________________________________________________________________________
+
+        PARAMETERS
+                o backend       : (str) a value of CST__COPY_BACKENDS
+                o source        : the source file, opened in "rb" mode
+                o target        : the target file, opened in "wb" mode
+                o size          : (int) size of the source file
+
+        RETURNED VALUE
+                (bool) False if the backend can't be used; raise an OSError
+                if the copy failed for another reason.
+    """
+    try:
+        if backend == "reflink":
+            if fcntl is None or CST__PLATFORM != "Linux":
+                return False
+            fcntl.ioctl(target.fileno(), CST__FICLONE, source.fileno())
+            return True
+
+        if backend == "copy_file_range":
+            if not hasattr(os, "copy_file_range"):
+                return False
+            copied = 0
+            while copied < size:
+                nbr_of_bytes = os.copy_file_range(source.fileno(), target.fileno(),
+                                                  size-copied)
+                if nbr_of_bytes == 0:
+                    # e.g. a file of /proc whose size is 0 : let's try another backend.
+                    return False
+                copied += nbr_of_bytes
+            return True
+
+        if backend == "sendfile":
+            if not hasattr(os, "sendfile") or CST__PLATFORM != "Linux":
+                return False
+            copied = 0
+            while copied < size:
+                nbr_of_bytes = os.sendfile(target.fileno(), source.fileno(),
+                                           copied, size-copied)
+                if nbr_of_bytes == 0:
+                    return False
+                copied += nbr_of_bytes
+            return True
+
+        shutil.copyfileobj(source, target, CST__COPY_BUFFER_SIZE)
+        return True
+
+    except OSError as exception:
+        if backend != "buffered" and exception.errno in CST__COPY_UNSUPPORTED_ERRNOS:
+            return False
+        raise
+
+#///////////////////////////////////////////////////////////////////////////////
+def copy_file__report(backends):
+    """
+        copy_file__report()
+        ________________________________________________________________________
+
+        Display how the files have been copied.
+        ________________________________________________________________________
+
+        PARAMETER
+                o backends      : a collections.Counter, backend:number of files;
+                                  the backends are the values of
+                                  CST__COPY_BACKENDS, "hashed copy" (see
+                                  action__add__hashcopy()), "hardlink" and
+                                  "symlink".
+
+        no RETURNED VALUE
+    """
+    if backends:
+        LOGGER.info("    o copy backend(s) used : %s",
+                    ", ".join("{0} ({1} file(s))".format(backend, backends[backend])
+                              for backend in CST__COPY_BACKENDS+("hashed copy",
+                                                                 "hardlink", "symlink")
+                              if backend in backends))
+
+#///////////////////////////////////////////////////////////////////////////////
+def create_empty_db(_db_name, hash_algorithm=CST__HASH_ALGORITHM_DEFAULT):
     """
         create_empty_db()
         ________________________________________________________________________
@@ -1349,6 +3124,8 @@ def create_empty_db(_db_name):
             o _db_name : name of the file to be created .
                          Please use a normpath'd parameter : the normpath function
                          will not be called by create_empty_db() !
+            o hash_algorithm : (str) a key of CST__HASHERS, the hasher used by
+                               the database.
 
         no RETURNED VALUE
     """
@@ -1360,8 +3137,9 @@ def create_empty_db(_db_name):
         db_cursor = db_connection.cursor()
 
         db_cursor.execute(CST__SQL__CREATE_DB)
+        update_db_schema(db_connection)
+        set_db_hash_algorithm(db_connection, hash_algorithm)
 
-        db_connection.commit()
         db_connection.close()
 
     LOGGER.info("   ... database created")
@@ -1458,11 +3236,12 @@ def create_target_name_and_tags(parameters,
         create_target_name_and_tags()
         ________________________________________________________________________
 
-        Create the name of a file (a target file) from various informations
-        given by the parameters. The function reads the string stored in
-        parameters["target"]["name of the target files"] and in
+        Create the name and the tags of a file (a target file) from various
+        informations given by the parameters. The function reads the strings
+        stored in parameters["target"]["name of the target files"] and in
         parameters["target"]["tags"] and replaces some
-        keywords in the string by the parameters given to this function.
+        keywords in the strings by the parameters given to this function, the
+        value of each keyword being computed only once.
 
         see the available keywords in the documentation.
             (see documentation:configuration file)
@@ -1487,23 +3266,15 @@ def create_target_name_and_tags(parameters,
         RETURNED VALUE
                 ( (str)name, (str)tags )
     """
-    name = create_target_name(parameters,
-                              hashid,
-                              filename_no_extens,
-                              path,
-                              extension,
-                              _size,
-                              date,
-                              database_index)
-
-    tags = create_target_name(parameters,
-                              hashid,
-                              filename_no_extens,
-                              path,
-                              extension,
-                              _size,
-                              date,
-                              database_index)
+    name, tags = add_keywords_in_targetstrs((parameters["target"]["name of the target files"],
+                                             parameters["target"]["tags"]),
+                                            hashid=hashid,
+                                            filename_no_extens=filename_no_extens,
+                                            path=path,
+                                            extension=extension,
+                                            _size=_size,
+                                            date=date,
+                                            database_index=database_index)
     return (name, tags)
 
 #/////////////////////////////////////////////////////////////////////////////////////////
@@ -1544,17 +3315,198 @@ def create_target_tags(parameters,
                 o date                         : (str) see CST__DTIME_FORMAT
                 o database_index               : (int)
 
-        RETURNED VALUE
-                (str)name
-    """
-    return(add_keywords_in_targetstr(srcstring=parameters["target"]["tags"],
-                                     hashid=hashid,
-                                     filename_no_extens=filename_no_extens,
-                                     path=path,
-                                     extension=extension,
-                                     _size=_size,
-                                     date=date,
-                                     database_index=database_index))
+        RETURNED VALUE
+                (str)name
+    """
+    return(add_keywords_in_targetstr(srcstring=parameters["target"]["tags"],
+                                     hashid=hashid,
+                                     filename_no_extens=filename_no_extens,
+                                     path=path,
+                                     extension=extension,
+                                     _size=_size,
+                                     date=date,
+                                     database_index=database_index))
+
+#///////////////////////////////////////////////////////////////////////////////
+def db_fill_directories(db_connection):
+    """
+        db_fill_directories()
+        ________________________________________________________________________
+
+        Convert the dbfiles table written by the former versions of Katal
+        (complete source name for each file) into the directories and files
+        tables (id of the source directory + basename) and the dbfiles view :
+        see CST__SQL__CREATE_DIRECTORIES. The source names read through the
+        view are exactly the former ones.
+
+        The database being smaller, it is rebuilt by VACUUM if some files
+        have been converted.
+        ________________________________________________________________________
+
+        PARAMETER
+                o db_connection : connection to the database
+
+        no RETURNED VALUE
+    """
+    # one transaction : the database is either converted or left as it was.
+    db_connection.commit()
+    db_connection.execute('BEGIN')
+    db_connection.execute('ALTER TABLE dbfiles RENAME TO dbfiles__former')
+    for sqlorder in CST__SQL__CREATE_DIRECTORIES:
+        db_connection.execute(sqlorder)
+
+    sourcedir = CST__SQL__SOURCEDIR.format("sourcename")
+    db_connection.execute('INSERT INTO directories (path) '
+                          'SELECT DISTINCT {0} FROM dbfiles__former '
+                          'WHERE sourcename IS NOT NULL'.format(sourcedir))
+    nbr_of_files = db_connection.execute(
+        'INSERT INTO files SELECT hashid, partialhashid, size, name, dirid, '
+        'substr(sourcename, length(sourcedir)+1), sourcedate, tagsstr '
+        'FROM (SELECT *, {0} AS sourcedir FROM dbfiles__former) '
+        'LEFT JOIN directories ON path=sourcedir'.format(sourcedir)).rowcount
+
+    # the former table is deleted with its triggers and its indexes :
+    db_connection.execute('DROP TABLE dbfiles__former')
+    db_connection.commit()
+
+    if nbr_of_files > 0:
+        LOGGER.info("    o the source names of %s file(s) have been moved into "
+                    "the directories table of the database", nbr_of_files)
+        db_connection.execute('VACUUM')
+
+#///////////////////////////////////////////////////////////////////////////////
+def db_fill_file_tags(db_connection):
+    """
+        db_fill_file_tags()
+        ________________________________________________________________________
+
+        Fill the file_tags table of a database from the tags' strings stored
+        in its dbfiles table; the former content of file_tags is deleted.
+        ________________________________________________________________________
+
+        PARAMETER
+                o db_connection : connection to the database
+
+        no RETURNED VALUE
+    """
+    db_connection.execute('DELETE FROM file_tags')
+    db_write_in_chunks(db_connection,
+                       'INSERT OR IGNORE INTO file_tags VALUES (?,?)',
+                       ((db_record[0], tag) for db_record in
+                        db_connection.execute("SELECT hashid, tagsstr FROM dbfiles "
+                                              "WHERE tagsstr != ''").fetchall()
+                        for tag in tagsstr_to_tags(db_record[1])))
+    db_connection.commit()
+
+#///////////////////////////////////////////////////////////////////////////////
+def db_has_table(db_connection, table):
+    """
+        db_has_table()
+        ________________________________________________________________________
+
+        Return True if a database has a table named <table>.
+
+        With --off, the schema of an ancient database isn't updated (see
+        update_db_schema()) : the functions requiring a recent table have to
+        check its existence.
+        ________________________________________________________________________
+
+        PARAMETERS
+                o db_connection : connection to the database
+                o table         : (str) name of the table
+
+        RETURNED VALUE
+                (bool)
+    """
+    return db_connection.execute("SELECT COUNT(*) FROM sqlite_master "
+                                 "WHERE type='table' AND name=?", (table,)).fetchone()[0] > 0
+
+#///////////////////////////////////////////////////////////////////////////////
+def db_write_in_chunks(db_connection, sqlorder, rows, chunk_size=None, committed=None,
+                       related=None):
+    """
+        db_write_in_chunks()
+        ________________________________________________________________________
+
+        Execute <sqlorder> for each row of <rows> with executemany(), committing
+        the rows by chunks of <chunk_size> rows : one transaction per chunk
+        instead of one transaction per row.
+
+        <rows> may be a generator doing something for each row (e.g. moving a
+        file to the trash directory) : if it raises an exception, the rows
+        already yielded are written before the exception is propagated, so that
+        the database matches what has been done on disk. If the database raises
+        an error, the current chunk is rolled back and a KatalError is raised.
+
+        With --off, <rows> is consumed but nothing is written.
+        ________________________________________________________________________
+
+        PARAMETERS
+                o db_connection : connection to the database
+                o sqlorder      : (str) SQL order with placeholders
+                o rows          : an iterable of tuples, the parameters of sqlorder
+                o chunk_size    : None (the "[target] database batch size" value)
+                                  or (int) number of rows by transaction
+                o committed     : None or a function called with the number
+                                  of rows of each chunk once it has been written
+                o related       : None or ((str)SQL order, function) : the SQL
+                                  order is executed, in the transaction of each
+                                  chunk, for each tuple of parameters yielded by
+                                  function(row), e.g. to write the file_tags rows
+                                  of the dbfiles rows (see get_file_tags_rows()).
+
+        RETURNED VALUE
+                (int) the number of rows written in the database
+    """
+    if chunk_size is None:
+        chunk_size = CST__DATABASE_BATCH_SIZE
+        if CFG_PARAMETERS is not None:
+            chunk_size = CFG_PARAMETERS.getint("target", "database batch size",
+                                               fallback=CST__DATABASE_BATCH_SIZE)
+
+    chunk = []
+    nbr_of_written_rows = 0
+
+    #. . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . .
+    def write_chunk():
+        """
+                Write <chunk> in one transaction and empty it, even if the
+                database raises an error : a failed chunk isn't written again.
+                Return the number of written rows.
+        """
+        try:
+            if not ARGS.off:
+                try:
+                    with db_connection:
+                        db_connection.executemany(sqlorder, chunk)
+                        if related is not None:
+                            db_connection.executemany(related[0],
+                                                      (parameters
+                                                       for row in chunk
+                                                       for parameters in related[1](row)))
+                except sqlite3.Error as exception:
+                    LOGGER.exception("!!! An error occured while writing the database : ")
+                    raise KatalError("An error occured while writing the database : " +
+                                     str(exception))
+
+                if committed is not None:
+                    committed(len(chunk))
+
+            return len(chunk)
+        finally:
+            del chunk[:]
+
+    try:
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                nbr_of_written_rows += write_chunk()
+    finally:
+        # after an error raised by the database, <chunk> is empty.
+        if len(chunk) > 0:
+            nbr_of_written_rows += write_chunk()
+
+    return nbr_of_written_rows
 
 #///////////////////////////////////////////////////////////////////////////////
 def draw_table(_rows, _data):
@@ -1620,13 +3572,19 @@ def eval_filter_for_a_file(_filter, _filename, _size, date):
 
         Eval a file according to a filter and answers the following question :
         does the file matches what is described in the filter ?
+
+        The cheapest tests are done first : the name (known without any
+        system call), then the size and the date. If _size and date are None
+        (=the file hasn't been stat'ed yet), the answer is None if only the
+        size or the date could decide.
         ________________________________________________________________________
 
         PARAMETERS
                 o _filter        : a dict, see documentation:select
                 o _filename     : (str) file's name
-                o _size         : (int) file's size, in bytes.
-                o date         : (str)file's date
+                o _size         : (int) file's size, in bytes, or None if unknown
+                o date         : (int) file's date, in seconds since the epoch,
+                                 or None if unknown
 
         About the underscore before "_filter" and "_size" :
         confer https://www.python.org/dev/peps/pep-0008/#function-and-method-arguments
@@ -1635,32 +3593,58 @@ def eval_filter_for_a_file(_filter, _filename, _size, date):
           " or spelling corruption.
 
         RETURNED VALUE
-                a boolean, giving the expected answer
+                True, False or None (=unknown)
     """
-    res = True
+    if "name" in _filter and not thefilehastobeadded__filt_name(_filter, _filename):
+        return False
 
-    if res and "name" in _filter:
-        res = thefilehastobeadded__filt_name(_filter, _filename)
-    if res and "size" in _filter:
-        res = thefilehastobeadded__filt_size(_filter, _size)
-    if res and "date" in _filter:
-        res = thefilehastobeadded__filt_date(_filter, date)
+    if "size" in _filter:
+        if _size is None:
+            return None
+        if not thefilehastobeadded__filt_size(_filter, _size):
+            return False
 
-    return res
+    if "date" in _filter:
+        if date is None:
+            return None
+        if not thefilehastobeadded__filt_date(_filter, date):
+            return False
+
+    return True
 
 #///////////////////////////////////////////////////////////////////////////////
-def fill_select(_debug_datatime=None):
+def fill_select(_debug_datatime=None, defer_hashing=False):
     """
         fill_select()
         ________________________________________________________________________
 
         Fill SELECT and SELECT_SIZE_IN_BYTES from the files stored in
         the source path. This function is used by action__select() .
+
+        The files compatible with the filters are hashed (see compute_hashids())
+        by "[source] hash workers" threads and by "[source] hash processes"
+        processes, the latter being used for the files smaller than
+        CST__HASH_TINYFILE_SIZE. Since no more than
+        (workers+processes)*CST__HASH_QUEUE files may wait for their hashids,
+        the browsing of the source path waits for the hashing. The files are
+        added to SELECT in the order of the source path, whatever the number
+        of workers.
+
+        If <defer_hashing> is True and if "[target] hash while copying" is
+        True, the files absent from the hash cache and whose size isn't the
+        size of a file in the database (hence which can't be a file of the
+        database) aren't hashed : they will be hashed while being copied by
+        action__add(), being read only once. Their key in SELECT is
+        CST__DEFERRED_HASHID_PREFIX + their name, their partial hashid being
+        None. This is only possible in "copy" mode, if the %h keyword isn't
+        used by the name of the target files or by their tags.
         ________________________________________________________________________
 
         PARAMETERS
                 o  _debug_datatime : None (normal value) or a dict of CST__DTIME_FORMAT
                                      strings if in debug/test mode.
+                o  defer_hashing   : (bool) True if action__add() is to be called
+                                     just after this function, see above.
 
         RETURNED VALUE
                 (int) the number of discarded files
@@ -1669,130 +3653,233 @@ def fill_select(_debug_datatime=None):
 
     source_path = CFG_PARAMETERS["source"]["path"]
 
-    SELECT = {}  # see the SELECT format in the documentation:selection
+    SELECT = SelectStore()  # see the SELECT format in the documentation:selection
     SELECT_SIZE_IN_BYTES = 0
     number_of_discarded_files = 0
 
-    # these variables will be used by fill_select__checks() too.
-    prefix = ""
-    fullname = ""
-
-    file_index = 0  # number of the current file in the source directory.
-    for dirpath, _, filenames in os.walk(normpath(source_path)):
-        for filename in filenames:
-
-            # ..................................................................
+    hash_workers = CFG_PARAMETERS.getint("source", "hash workers", fallback=1)
+    hash_processes = CFG_PARAMETERS.getint("source", "hash processes", fallback=0)
+    hash_buffer_size = CFG_PARAMETERS.getint("source", "hash buffer size",
+                                             fallback=CST__HASH_BUFFER_SIZE)
+
+    # may some files be hashed by action__add() while being copied ?
+    keywords = compile_targetstr(CFG_PARAMETERS["target"]["name of the target files"])[1::2] + \
+               compile_targetstr(CFG_PARAMETERS["target"]["tags"])[1::2]
+    defer_hashing = defer_hashing and not ARGS.off and \
+                    CFG_PARAMETERS["target"]["mode"] == "copy" and \
+                    CFG_PARAMETERS.getboolean("target", "hash while copying", fallback=True) and \
+                    "h" not in keywords
+    number_of_deferred_files = 0
+
+    # the hashing workers : since the threads of scan_source_path() are running
+    # when the first file is given to a process, the processes aren't forked
+    # from this process but started by a fork server (or spawned).
+    thread_executor = None
+    process_executor = None
+    if hash_workers > 1 or hash_processes > 0:
+        thread_executor = concurrent.futures.ThreadPoolExecutor(max_workers=hash_workers)
+    if hash_processes > 0:
+        start_method = "forkserver" \
+                       if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        process_executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=hash_processes,
+            mp_context=multiprocessing.get_context(start_method))
+
+    # files waiting to be added to SELECT, in the order of the source path :
+    # (srcfile, time, prefix, hashids or a future returning the hashids or None if
+    #  the file will be hashed while being copied)
+    pending = collections.deque()
+    max_pending = (hash_workers+hash_processes)*CST__HASH_QUEUE
+
+    # the subdirectories excluded by DIRFILTERS aren't browsed at all :
+    dirfilter = None
+    if DIRFILTERS:
+        normsource_path = normpath(source_path)
+        dirfilter = lambda dirpath: thedirhastobebrowsed(dirpath, normsource_path)
+    pruned = []
+
+    # the workers are stopped and the hash cache is closed even if an exception
+    # (e.g. an OSError raised by a worker or a KeyboardInterrupt) is propagated;
+    # the files waiting to be hashed are then forgotten, the hashids already
+    # computed being kept in the cache. Nothing is evicted from the cache if the
+    # source path hasn't been entirely browsed.
+    hashcache__open()
+    interrupted = True
+    try:
+        file_index = 0  # number of the current file in the source directory.
+        for srcfile in scan_source_path(source_path,
+                                        workers=CFG_PARAMETERS.getint("source", "scan workers",
+                                                                      fallback=1),
+                                        namefilter=thefilehastobeadded__filters,
+                                        dirfilter=dirfilter,
+                                        pruned=pruned):
+
+            # ......................................................................
             # gathering informations about filename :
-            # ..................................................................
+            # ......................................................................
             file_index += 1
-            fullname = os.path.join(normpath(dirpath), filename)
-
-            # ..................................................................
-            # protection against the FileNotFoundError exception.
-            # This exception would be raised on broken symbolic link on the
-            #   "size = os.stat(normpath(fullname)).st_size" line (see below).
-            # ..................................................................
-            if os.path.exists(fullname):
-                size = os.stat(normpath(fullname)).st_size
+            filename, size = srcfile.filename, srcfile.size
+            fullname = os.path.join(srcfile.dirpath, filename)
+
+            # if we know the total amount of files to be selected (see the --infos option),
+            # we can add the percentage done :
+            prefix = ""
+            if INFOS_ABOUT_SRC_PATH[1] is not None and INFOS_ABOUT_SRC_PATH[1] != 0:
+                prefix = "[{0:.4f}%]".format(file_index/INFOS_ABOUT_SRC_PATH[1]*100.0)
+
+            # ......................................................................
+            # what should we do with 'filename' ?
+            # ......................................................................
+            # the filters are evaluated from the cheapest test to the most expensive
+            # one : the name (the files rejected by their name haven't been stat'ed
+            # by scan_source_path() and have no size), the size and the date (to the
+            # minute, see read_filters__date()); the hashids are computed last.
+            if size is not None:
                 if _debug_datatime is None:
-                    time = datetime.utcfromtimestamp(os.path.getmtime(normpath(fullname)))
-                    time = time.replace(second=0, microsecond=0)
+                    epoch = int(srcfile.mtime//60)*60
                 else:
-                    time = datetime.strptime(_debug_datatime[fullname], CST__DTIME_FORMAT)
-
-                fname_no_extens, extension = get_filename_and_extension(normpath(filename))
-
-                # if we know the total amount of files to be selected (see the --infos option),
-                # we can add the percentage done :
-                prefix = ""
-                if INFOS_ABOUT_SRC_PATH[1] is not None and INFOS_ABOUT_SRC_PATH[1] != 0:
-                    prefix = "[{0:.4f}%]".format(file_index/INFOS_ABOUT_SRC_PATH[1]*100.0)
-
-                # ..................................................................
-                # what should we do with 'filename' ?
-                # ..................................................................
-                if not thefilehastobeadded__filters(filename, size, time):
-                    # ... nothing : incompatibility with at least one filter :
-                    number_of_discarded_files += 1
-
-                    if ARGS.verbosity == 'high':
-                        LOGGER.info("    - %s discarded \"%s\" "
-                                    ": incompatibility with the filter(s)",
-                                    prefix, fullname)
+                    epoch = calendar.timegm(datetime.strptime(_debug_datatime[fullname],
+                                                              CST__DTIME_FORMAT).timetuple())
+
+            if size is None or not thefilehastobeadded__filters(filename, size, epoch):
+                # ... nothing : incompatibility with at least one filter :
+                number_of_discarded_files += 1
+
+                if ARGS.verbosity == 'high':
+                    LOGGER.info("    - %s discarded \"%s\" "
+                                ": incompatibility with the filter(s)",
+                                prefix, fullname)
+                continue
+
+            # 'filename' being compatible with the filters, its hashids are
+            # required : either from the hash cache, either computed by a worker.
+            fingerprint = (srcfile.dev, srcfile.ino, size, srcfile.mtime_ns)
+            hashids = hashcache__get(fingerprint)
+            if hashids is None:
+                if defer_hashing and size not in TARGET_DB_INDEX:
+                    number_of_deferred_files += 1
+                elif process_executor is not None and size < CST__HASH_TINYFILE_SIZE:
+                    hashids = process_executor.submit(compute_hashids, fullname,
+                                                      hash_buffer_size, HASH_ALGORITHM)
+                elif thread_executor is not None:
+                    hashids = thread_executor.submit(compute_hashids, fullname,
+                                                     hash_buffer_size, HASH_ALGORITHM)
                 else:
-                    # 'filename' being compatible with the filters, let's try
-                    # to add it in the datase :
-                    tobeadded, partialhashid, hashid = thefilehastobeadded__db(fullname, size)
-
-                    if tobeadded and hashid in SELECT:
-                        # . . . . . . . . . . . . . . . . . . . . . . . . . . . . .
-                        # tobeadded is True but hashid is already in SELECT; let's discard
-                        # <filename> :
-                        number_of_discarded_files += 1
-
-                        if ARGS.verbosity == 'high':
-                            LOGGER.info("    - %s (similar hashid among the files to be copied, "
-                                        "in the source directory) discarded \"%s\"",
-                                        prefix, fullname)
-
-                    elif tobeadded:
-                        # . . . . . . . . . . . . . . . . . . . . . . . . . . . . .
-                        # ok, let's add <filename> to SELECT...
-                        SELECT[hashid] = \
-                         SELECTELEMENT(fullname=fullname,
-                                       partialhashid=partialhashid,
-                                       path=dirpath,
-                                       filename_no_extens=fname_no_extens,
-                                       extension=extension,
-                                       size=size,
-                                       date=time.strftime(CST__DTIME_FORMAT),
-                                       targetname= \
-                                          create_target_name(parameters=CFG_PARAMETERS,
-                                                             hashid=hashid,
-                                                             filename_no_extens=fname_no_extens,
-                                                             path=dirpath,
-                                                             extension=extension,
-                                                             _size=size,
-                                                             date=time.strftime(CST__DTIME_FORMAT),
-                                                             database_index=len(TARGET_DB) + \
-                                                                             len(SELECT)),
-                                       targettags= \
-                                          create_target_tags(parameters=CFG_PARAMETERS,
-                                                             hashid=hashid,
-                                                             filename_no_extens=fname_no_extens,
-                                                             path=dirpath,
-                                                             extension=extension,
-                                                             _size=size,
-                                                             date=time.strftime(CST__DTIME_FORMAT),
-                                                             database_index=len(TARGET_DB) + \
-                                                                             len(SELECT)))
-
-                        LOGGER.info("    + %s selected \"%s\" (file selected #%s)",
-                                    prefix, fullname, len(SELECT))
-                        LOGGER.info("       size=%s; date=%s",
-                                    size, time.strftime(CST__DTIME_FORMAT))
-
-                        SELECT_SIZE_IN_BYTES += size
+                    hashids = compute_hashids(fullname, hash_buffer_size, HASH_ALGORITHM)
+                    hashcache__set(fingerprint, fullname, hashids)
+            pending.append((srcfile, epoch, prefix, hashids))
+
+            # back-pressure : the oldest files have to be added before going on.
+            while len(pending) > max_pending:
+                number_of_discarded_files += fill_select__add(*pending.popleft())
+
+        while pending:
+            number_of_discarded_files += fill_select__add(*pending.popleft())
+        interrupted = False
+    finally:
+        for executor in (thread_executor, process_executor):
+            if executor is not None:
+                executor.shutdown(cancel_futures=interrupted)
+        hashcache__close(evicted_path=None if interrupted else source_path)
+
+    if number_of_deferred_files > 0:
+        LOGGER.info("    o number of files to be hashed while being copied "
+                    "(see [target]hash while copying) : %s", number_of_deferred_files)
+
+    if pruned:
+        LOGGER.info("    o number of pruned subdirectories (see [source]exclude dir, "
+                    "exclude path and max depth) : %s", len(pruned))
+        if ARGS.verbosity == 'high':
+            for dirpath in pruned:
+                LOGGER.info("      - pruned \"%s\"", dirpath)
+
+    return fill_select__checks(_number_of_discarded_files=number_of_discarded_files)
 
-                    else:
-                        # . . . . . . . . . . . . . . . . . . . . . . . . . . . . .
-                        # tobeadded is False : let's discard <filename> :
-                        number_of_discarded_files += 1
+#///////////////////////////////////////////////////////////////////////////////
+def fill_select__add(srcfile, epoch, prefix, hashids):
+    """
+        fill_select__add()
+        ________________________________________________________________________
 
-                        if ARGS.verbosity == 'high':
-                            LOGGER.info("    - %s (similar hashid in the database) "
-                                        " discarded \"%s\"", prefix, fullname)
+        Function used by fill_select() : add a file compatible with the filters
+        to SELECT unless a similar file is already stored in the database or
+        in SELECT. Update SELECT_SIZE_IN_BYTES.
+        ________________________________________________________________________
 
-            else:
-                LOGGER.warning("    ! browsing %s, an error occured : "
-                    "can't read the file \"%s\"", source_path, fullname, color='red')
+        PARAMETERS
+                o  srcfile      : a SRCFILE object
+                o  epoch        : (int) the file's date, in seconds since the
+                                  epoch (UTC), rounded to the minute
+                o  prefix       : (str) see fill_select()
+                o  hashids      : ((str)partial hashid, (str)hashid), a
+                                  concurrent.futures.Future returning them or
+                                  None if the file will be hashed while being
+                                  copied (see fill_select()).
 
-    return fill_select__checks(_number_of_discarded_files=number_of_discarded_files,
-                               _prefix=prefix,
-                               _fullname=fullname)
+        RETURNED VALUE
+                (int) the number of discarded files (0 or 1)
+    """
+    global SELECT_SIZE_IN_BYTES
+
+    dirpath, size = srcfile.dirpath, srcfile.size
+    fullname = os.path.join(dirpath, srcfile.filename)
+
+    if isinstance(hashids, concurrent.futures.Future):
+        hashids = hashids.result()
+        hashcache__set((srcfile.dev, srcfile.ino, size, srcfile.mtime_ns), fullname, hashids)
+
+    if hashids is None:
+        # no file of this size in the database : the file will be hashed (and
+        # compared with the other selected files) while being copied.
+        tobeadded, partialhashid, hashid = (True, None,
+                                            CST__DEFERRED_HASHID_PREFIX + fullname)
+    else:
+        tobeadded, partialhashid, hashid = thefilehastobeadded__db(fullname, size,
+                                                                   hashids=hashids)
+
+    if tobeadded and hashid in SELECT:
+        # . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . .
+        # tobeadded is True but hashid is already in SELECT; let's discard
+        # <filename> :
+        if ARGS.verbosity == 'high':
+            LOGGER.info("    - %s (similar hashid among the files to be copied, "
+                        "in the source directory) discarded \"%s\"",
+                        prefix, fullname)
+        return 1
+
+    if not tobeadded:
+        # . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . .
+        # tobeadded is False : let's discard <filename> :
+        if ARGS.verbosity == 'high':
+            LOGGER.info("    - %s (similar hashid in the database) "
+                        " discarded \"%s\"", prefix, fullname)
+        return 1
+
+    # . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . .
+    # ok, let's add <filename> to SELECT; its target name and tags will be
+    # rendered when required (see the SELECTELEMENT class).
+    SELECT[hashid] = SELECTELEMENT(path=dirpath,
+                                   filename=srcfile.filename,
+                                   partialhashid=partialhashid,
+                                   size=size,
+                                   epoch=epoch,
+                                   hashid=hashid,
+                                   database_index=len(TARGET_DB) + len(SELECT),
+                                   dev=srcfile.dev,
+                                   ino=srcfile.ino,
+                                   mtime_ns=srcfile.mtime_ns)
+
+    LOGGER.info("    + %s selected \"%s\" (file selected #%s)",
+                prefix, fullname, len(SELECT))
+    LOGGER.info("       size=%s; date=%s", size,
+                datetime.utcfromtimestamp(epoch).strftime(CST__DTIME_FORMAT))
+
+    SELECT_SIZE_IN_BYTES += size
+
+    return 0
 
 #///////////////////////////////////////////////////////////////////////////////
-def fill_select__checks(_number_of_discarded_files, _prefix, _fullname):
+def fill_select__checks(_number_of_discarded_files):
     """
         fill_select__checks()
         ________________________________________________________________________
@@ -1802,31 +3889,59 @@ def fill_select__checks(_number_of_discarded_files, _prefix, _fullname):
                 (1) future filename's can't be in conflict with another file in SELECT
                 (2) future filename's can't be in conflict with another file already
                     stored in the target path.
+
+        Both checks are linear : (1) uses a dict targetname:hashid (the first
+        file using a target name keeps it), (2) reads the target path only
+        once. If SELECT has been spilled into a temporary database (see
+        SelectStore), both checks are SQL queries.
+
+        The target name and tags of each file are rendered only once, before
+        the checks (see SELECTELEMENT.pin()) : the checks, the journal and the
+        rows written by action__add() read them again. The entries of a
+        spilled SELECT store them already.
+
+        SELECT_SIZE_IN_BYTES is updated.
         ________________________________________________________________________
 
-        PARAMETERS :
+        PARAMETER :
                 o _number_of_discarded_files    : (int) see fill_select()
-                o _prefix                       : (str) see fill_select()
-                o _fullname                     : (str) see fill_select()
 
         RETURNED VALUE
                 (int) the number of discarded files
     """
+    global SELECT_SIZE_IN_BYTES
+
     LOGGER.info("    o checking that there's no anomaly with the selected files...")
 
     # (1) future filename's can't be in conflict with another file in SELECT
     LOGGER.info("       ... let's check that future filenames aren't in conflict "
         "with another file in SELECT...")
     to_be_discarded = []        # a list of hash.
-    for (selectedfile_hash1, selectedfile_hash2) in itertools.combinations(SELECT, 2):
 
-        if SELECT[selectedfile_hash1].targetname == SELECT[selectedfile_hash2].targetname:
-            LOGGER.warning("    ! %s discarded \"%s\" : target filename \"%s\" would be used "
-                           "two times for two different files !",
-                           _prefix, _fullname, SELECT[selectedfile_hash2].targetname,
-                           color="red")
+    #. . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . .
+    def targetname_conflicts():
+        """
+                Yield (hashid, SELECTELEMENT, fullname of the first file using
+                the same target name), see SelectStore.targetname_conflicts().
+        """
+        targetnames = dict()    # targetname : fullname of the first file using it
+        for selectedfile_hash, selectedfile in SELECT.items():
+            selectedfile.pin()
+            targetname = selectedfile.targetname
+            if targetname not in targetnames:
+                targetnames[targetname] = selectedfile.fullname
+            else:
+                yield (selectedfile_hash, selectedfile, targetnames[targetname])
+
+    spilled = isinstance(SELECT, SelectStore) and SELECT.is_spilled()
+    for selectedfile_hash, selectedfile, first_fullname in \
+        (SELECT.targetname_conflicts() if spilled else targetname_conflicts()):
+        LOGGER.warning("    ! discarded \"%s\" : target filename \"%s\" would be used "
+                       "two times for two different files ! (see \"%s\")",
+                       selectedfile.fullname, selectedfile.targetname, first_fullname,
+                       color="red")
 
-            to_be_discarded.append(selectedfile_hash2)
+        to_be_discarded.append(selectedfile_hash)
 
     # (2) future filename's can't be in conflict with another file already
     # stored in the target path :
@@ -1834,15 +3949,38 @@ def fill_select__checks(_number_of_discarded_files, _prefix, _fullname):
         LOGGER.info("       ... let's check that future filenames aren't in conflict "
             "with another file already")
         LOGGER.info("           stored in the target path...")
-        for selectedfile_hash in SELECT:
-            if os.path.exists(os.path.join(normpath(ARGS.targetpath),
-                                           SELECT[selectedfile_hash].targetname)):
-                LOGGER.warning("    ! %s discarded \"%s\" : target filename \"%s\" already "
-                               "exists in the target path !",
-                               _prefix, _fullname, SELECT[selectedfile_hash].targetname,
-                               color="red")
 
-                to_be_discarded.append(selectedfile_hash)
+        # the target path is read only once; a target name containing a
+        # directory (e.g. "%%p/%%f") is checked with os.path.exists() :
+        targetpath = normpath(ARGS.targetpath)
+
+        #. . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . .
+        def existing_targetnames():
+            """
+                    Yield (hashid, SELECTELEMENT) for the files whose target
+                    name exists, see SelectStore.existing_targetnames().
+            """
+            try:
+                existing_names = set(os.listdir(targetpath))
+            except OSError:
+                existing_names = set()
+
+            for selectedfile_hash, selectedfile in SELECT.items():
+                targetname = selectedfile.targetname
+                if os.path.basename(targetname) == targetname:
+                    if targetname in existing_names:
+                        yield (selectedfile_hash, selectedfile)
+                elif os.path.exists(os.path.join(targetpath, targetname)):
+                    yield (selectedfile_hash, selectedfile)
+
+        for selectedfile_hash, selectedfile in \
+            (SELECT.existing_targetnames(targetpath) if spilled else existing_targetnames()):
+            LOGGER.warning("    ! discarded \"%s\" : target filename \"%s\" already "
+                           "exists in the target path !",
+                           selectedfile.fullname, selectedfile.targetname,
+                           color="red")
+
+            to_be_discarded.append(selectedfile_hash)
 
     # final message and deletion :
     if len(to_be_discarded) == 0:
@@ -1859,6 +3997,7 @@ def fill_select__checks(_number_of_discarded_files, _prefix, _fullname):
             # e.g. , _hash may have discarded two times (same target name + file
             # already present on disk), hence the following condition :
             if _hash in SELECT:
+                SELECT_SIZE_IN_BYTES -= SELECT[_hash].size
                 del SELECT[_hash]
                 _number_of_discarded_files += 1
 
@@ -1881,6 +4020,32 @@ def get_database_fullname():
     """
     return os.path.join(normpath(ARGS.targetpath), CST__KATALSYS_SUBDIR, CST__DATABASE_NAME)
 
+#///////////////////////////////////////////////////////////////////////////////
+def get_db_hash_algorithm(db_connection):
+    """
+        get_db_hash_algorithm()
+        ________________________________________________________________________
+
+        Return the hash algorithm used by a database, read in its metadata.
+        ________________________________________________________________________
+
+        PARAMETER
+                o db_connection : connection to the database
+
+        RETURNED VALUE
+                (str) a key of CST__HASHERS; CST__HASH_ALGORITHM_DEFAULT if the
+                database has no metadata (see update_db_schema()).
+    """
+    try:
+        for db_record in db_connection.execute('SELECT value FROM katalmetadata '
+                                               'WHERE name=?', ("hash algorithm",)):
+            return db_record[0]
+    except sqlite3.OperationalError:
+        # no katalmetadata table, e.g. with --off on an ancient database.
+        pass
+
+    return CST__HASH_ALGORITHM_DEFAULT
+
 #///////////////////////////////////////////////////////////////////////////////
 def get_disk_free_space(path):
     """
@@ -1907,6 +4072,46 @@ def get_disk_free_space(path):
         stat = os.statvfs(normpath(path))
         return stat.f_bavail * stat.f_frsize
 
+#///////////////////////////////////////////////////////////////////////////////
+def get_required_space(selectedfiles, mode, target_dev=None):
+    """
+        get_required_space()
+        ________________________________________________________________________
+
+        Return the space required on the target disk to add some selected
+        files, without CST__FREESPACE_MARGIN :
+                o "copy", "move" : the size of the files
+                o "hardlink"     : the size of the files stored on another
+                                   filesystem (they will be copied)
+                o "symlink", "nocopy" : 0
+        ________________________________________________________________________
+
+        PARAMETERS
+                o selectedfiles : an iterable of SELECTELEMENT objects
+                o mode          : (str) a value of CST__TARGET_MODES
+                o target_dev    : None or (int) st_dev of the target path
+
+        RETURNED VALUE
+                (int) a number of bytes
+    """
+    if mode in ("nocopy", "symlink"):
+        return 0
+
+    if mode != "hardlink":
+        return sum(selectedfile.size for selectedfile in selectedfiles)
+
+    if target_dev is None:
+        target_dev = os.stat(normpath(ARGS.targetpath)).st_dev
+
+    res = 0
+    for selectedfile in selectedfiles:
+        try:
+            if os.stat(selectedfile.fullname).st_dev != target_dev:
+                res += selectedfile.size
+        except OSError:
+            res += selectedfile.size
+    return res
+
 #///////////////////////////////////////////////////////////////////////////////
 def get_filename_and_extension(path):
     """
@@ -1931,6 +4136,107 @@ def get_filename_and_extension(path):
 
     return fname_no_extens, extension
 
+#///////////////////////////////////////////////////////////////////////////////
+def get_file_tags_rows(dbrow):
+    """
+        get_file_tags_rows()
+        ________________________________________________________________________
+
+        Return the rows of the file_tags table matching a row of the dbfiles
+        table; see db_write_in_chunks(), whose <related> argument writes them
+        in the same transaction as the dbfiles rows.
+        ________________________________________________________________________
+
+        PARAMETER
+                o dbrow : (hashid, partialhashid, size, name, sourcename,
+                           sourcedate, tagsstr)
+
+        RETURNED VALUE
+                a list of ((str)hashid, (str)tag)
+    """
+    return [(dbrow[0], tag) for tag in tagsstr_to_tags(dbrow[6])]
+
+#///////////////////////////////////////////////////////////////////////////////
+def get_fingerprint(filename):
+    """
+        get_fingerprint()
+        ________________________________________________________________________
+
+        Return the fingerprint of a file, to be compared with the one read by
+        scan_source_path() (see SELECTELEMENT.fingerprint) : if they differ,
+        the file has been modified (or replaced) since it has been selected.
+        ________________________________________________________________________
+
+        PARAMETER
+                o filename      : (str) file's name
+
+        RETURNED VALUE
+                (dev, ino, size, mtime_ns), None if the file can't be read.
+    """
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return None
+
+    return (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+#///////////////////////////////////////////////////////////////////////////////
+def get_hashids(filename, fingerprint=None):
+    """
+        get_hashids()
+        ________________________________________________________________________
+
+        Return the partial hashid and the hashid of a file. If the file's
+        fingerprint is known and if the hash cache is opened (see
+        hashcache__open()), the hash cache is consulted before reading the
+        file; otherwise, or if the file isn't in the cache, the hashids are
+        computed by compute_hashids() and stored in the cache.
+
+        The hashids are computed with the hasher used by the target database
+        (see HASH_ALGORITHM).
+        ________________________________________________________________________
+
+        PARAMETERS
+                o filename      : (str) file's name
+                o fingerprint   : None or (dev, ino, size, mtime_ns), see SRCFILE
+
+        RETURNED VALUE
+                ( (str)partial hashid, (str)hashid )
+    """
+    if fingerprint is not None:
+        hashids = hashcache__get(fingerprint)
+        if hashids is not None:
+            return hashids
+
+    buffer_size = CST__HASH_BUFFER_SIZE
+    if CFG_PARAMETERS is not None:
+        buffer_size = CFG_PARAMETERS.getint("source", "hash buffer size",
+                                            fallback=CST__HASH_BUFFER_SIZE)
+    hashids = compute_hashids(filename, buffer_size, HASH_ALGORITHM)
+
+    if fingerprint is not None:
+        hashcache__set(fingerprint, filename, hashids)
+
+    return hashids
+
+#///////////////////////////////////////////////////////////////////////////////
+def get_journal_fullname():
+    """
+        get_journal_fullname()
+        ________________________________________________________________________
+
+        Return the full name (=full path + name) of the task journal in
+        ARGS.targetpath .
+        ________________________________________________________________________
+
+        no PARAMETER
+
+        RETURNED VALUE
+                the expected string
+    """
+    return os.path.join(normpath(ARGS.targetpath), CST__KATALSYS_SUBDIR,
+                        CST__TASKS_SUBSUBDIR, CST__JOURNAL_NAME)
+
 #///////////////////////////////////////////////////////////////////////////////
 def get_logfile_fullname():
     """
@@ -1967,7 +4273,173 @@ def goodbye(timestamp_start):
                 datetime.now().strftime(CST__DTIME_FORMAT), datetime.now() - timestamp_start)
 
 #///////////////////////////////////////////////////////////////////////////////
-def hashfile64(filename, stop_after=None):
+def hashcache__close(evicted_path=None):
+    """
+        hashcache__close()
+        ________________________________________________________________________
+
+        Close the hash cache opened by hashcache__open().
+
+        If evicted_path is not None, the entries stored in the cache for a file
+        in this path but not looked up since hashcache__open() are removed from
+        the cache if these files have vanished (or have been replaced by
+        another file) : the files discarded by the filters (e.g. by their name
+        or in a pruned subdirectory, hence never looked up) are kept.
+        ________________________________________________________________________
+
+        PARAMETER
+                o evicted_path  : None or (str) a path that has been entirely
+                                  browsed since the call to hashcache__open()
+
+        no RETURNED VALUE
+    """
+    global HASHCACHE
+
+    if HASHCACHE is None:
+        return
+
+    #. . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . .
+    def has_vanished(dev, ino, name):
+        """
+                Return True if <name> isn't anymore the file (dev, ino).
+        """
+        try:
+            stat = os.stat(name)
+        except OSError:
+            return True
+        return (stat.st_dev, stat.st_ino) != (dev, ino)
+
+    if evicted_path is not None and not ARGS.off:
+        # the names beginning with <prefix> are read through the index on name :
+        # they are greater than or equal to <prefix> and less than <prefix> whose
+        # last character (a separator) is replaced by the following one.
+        prefix = os.path.join(normpath(evicted_path), "")
+        vanished = [(dev, ino) for dev, ino, name in
+                    HASHCACHE.execute('SELECT DISTINCT dev, ino, name FROM hashcache '
+                                      'WHERE name >= ? AND name < ?',
+                                      (prefix, prefix[:-1]+chr(ord(prefix[-1])+1))).fetchall()
+                    if (dev, ino) not in HASHCACHE_SEEN and has_vanished(dev, ino, name)]
+
+        if len(vanished) > 0:
+            LOGGER.info("    o removing %s vanished file(s) from the hash cache", len(vanished))
+            HASHCACHE.executemany('DELETE FROM hashcache WHERE dev=? AND ino=?', vanished)
+
+    HASHCACHE.commit()
+    HASHCACHE.close()
+    HASHCACHE = None
+    HASHCACHE_SEEN.clear()
+
+#///////////////////////////////////////////////////////////////////////////////
+def hashcache__get(fingerprint):
+    """
+        hashcache__get()
+        ________________________________________________________________________
+
+        Search the hashids of a file in the hash cache, computed with the
+        hasher used by the target database (see HASH_ALGORITHM).
+        ________________________________________________________________________
+
+        PARAMETER
+                o fingerprint   : (dev, ino, size, mtime_ns), see SRCFILE
+
+        RETURNED VALUE
+                None if the cache isn't opened or if the file is unknown or if
+                the file has been modified since its hashids were computed,
+                ( (str)partial hashid, (str)hashid ) otherwise.
+    """
+    if HASHCACHE is None:
+        return None
+
+    dev, ino, size, mtime_ns = fingerprint
+
+    HASHCACHE_SEEN.add((dev, ino))
+    if len(HASHCACHE_SEEN) % CST__HASHCACHE_COMMIT == 0 and not ARGS.off:
+        HASHCACHE.commit()
+
+    for db_record in HASHCACHE.execute('SELECT size, mtime_ns, partialhashid, hashid '
+                                       'FROM hashcache WHERE dev=? AND ino=? AND algorithm=?',
+                                       (dev, ino, HASH_ALGORITHM)):
+        if db_record[0] == size and db_record[1] == mtime_ns:
+            return (db_record[2], db_record[3])
+
+    return None
+
+#///////////////////////////////////////////////////////////////////////////////
+def hashcache__open():
+    """
+        hashcache__open()
+        ________________________________________________________________________
+
+        Open (and create if required) the hash cache stored in the
+        CST__KATALSYS_SUBDIR directory of the target path, and initialize
+        HASHCACHE.
+
+        Nothing is done if the --nohashcache option has been used or if the
+        target path has no CST__KATALSYS_SUBDIR directory; with --off, an
+        existing cache is read but never modified.
+
+        A cache created by a previous version of Katal (without the 'algorithm'
+        column) is emptied.
+        ________________________________________________________________________
+
+        no PARAMETER, no RETURNED VALUE
+    """
+    global HASHCACHE
+
+    HASHCACHE_SEEN.clear()
+
+    if ARGS.nohashcache:
+        return
+
+    hashcache_name = os.path.join(normpath(ARGS.targetpath),
+                                  CST__KATALSYS_SUBDIR, CST__HASHCACHE_NAME)
+
+    if not os.path.exists(os.path.dirname(hashcache_name)):
+        return
+    if ARGS.off and not os.path.exists(hashcache_name):
+        return
+
+    HASHCACHE = sqlite3.connect(hashcache_name)
+
+    columns = [db_record[1] for db_record in HASHCACHE.execute('PRAGMA table_info(hashcache)')]
+    if columns and "algorithm" not in columns:
+        if ARGS.off:
+            HASHCACHE.close()
+            HASHCACHE = None
+            return
+        HASHCACHE.execute('DROP TABLE hashcache')
+
+    if not ARGS.off:
+        HASHCACHE.execute(CST__SQL__CREATE_HASHCACHE)
+        for sqlorder in CST__SQL__CREATE_HASHCACHE_INDEXES:
+            HASHCACHE.execute(sqlorder)
+
+#///////////////////////////////////////////////////////////////////////////////
+def hashcache__set(fingerprint, filename, hashids):
+    """
+        hashcache__set()
+        ________________________________________________________________________
+
+        Store the hashids of a file in the hash cache.
+        ________________________________________________________________________
+
+        PARAMETERS
+                o fingerprint   : (dev, ino, size, mtime_ns), see SRCFILE
+                o filename      : (str) file's name
+                o hashids       : ( (str)partial hashid, (str)hashid )
+
+        no RETURNED VALUE
+    """
+    if HASHCACHE is None or ARGS.off:
+        return
+
+    dev, ino, size, mtime_ns = fingerprint
+    HASHCACHE.execute('INSERT OR REPLACE INTO hashcache VALUES (?,?,?,?,?,?,?,?)',
+                      (dev, ino, HASH_ALGORITHM, size, mtime_ns, filename) + tuple(hashids))
+
+#///////////////////////////////////////////////////////////////////////////////
+def hashfile64(filename, stop_after=None, buffer_size=CST__HASH_BUFFER_SIZE,
+               algorithm=CST__HASH_ALGORITHM_DEFAULT):
     """
         hashfile64()
         ________________________________________________________________________
@@ -1975,6 +4447,10 @@ def hashfile64(filename, stop_after=None):
         return the footprint of a file, encoded with the base 64. If stop_after
         is set to an integer, only the beginning of the file will be used to
         compute the hash (see CST__PARTIALHASHID_BYTESNBR constant).
+
+        For historical reasons, the file was read by blocks of 65536 bytes and
+        the block reaching stop_after was ignored : only the first
+        (stop_after-1)//65536*65536 bytes are hashed, whatever buffer_size.
         ________________________________________________________________________
 
         PARAMETER
@@ -1982,27 +4458,134 @@ def hashfile64(filename, stop_after=None):
                 o stop_after:(None/int) if None, the file will be entirely read,
                               otherwise, only the first stop_after bytes will
                               be read.
+                o buffer_size : (int) see hashfile__read()
+                o algorithm : (str) a key of CST__HASHERS
+
         RETURNED VALUE
-                the expected string. If you use sha256 as a hasher, the
-                resulting string will be 44 bytes long. E.g. :
+                the expected string. Since every hasher in CST__HASHERS gives a
+                32 bytes digest, the resulting string will be 44 bytes long. E.g. :
                         "YLkkC5KqwYvb3F54kU7eEeX1i1Tj8TY1JNvqXy1A91A"
     """
-    # hasher used by the hashfile64() function.
-    hasher = hashlib.sha256()
+    if stop_after is None:
+        hasher = hashfile__read(filename, buffer_size=buffer_size, algorithm=algorithm)[1]
+    else:
+        partialhasher, hasher = hashfile__read(filename,
+                                               cutoff=max(0, stop_after-1)//65536*65536,
+                                               stop_at_cutoff=True,
+                                               buffer_size=buffer_size,
+                                               algorithm=algorithm)
+        if partialhasher is not None:
+            hasher = partialhasher
 
-    nbr_of_bytes_read = 0
-    with open(filename, "rb") as afile:
-        # a buffer of 65536 bytes is an optimized buffer.
-        buf = afile.read(65536)
-        while len(buf) > 0:
-            nbr_of_bytes_read += 65536
-            if stop_after is not None and nbr_of_bytes_read >= stop_after:
-                break
+    return b64encode(hasher.digest()).decode()
 
-            hasher.update(buf)
-            buf = afile.read(65536)
+#///////////////////////////////////////////////////////////////////////////////
+def hashfile__read(filename, cutoff=None, stop_at_cutoff=False,
+                   buffer_size=CST__HASH_BUFFER_SIZE, algorithm=CST__HASH_ALGORITHM_DEFAULT,
+                   output=None):
+    """
+        hashfile__read()
+        ________________________________________________________________________
 
-    return b64encode(hasher.digest()).decode()
+        Feed a hasher with the content of a file, without allocating
+        any buffer while reading :
+
+        o the files bigger than CST__HASH_MMAP_MINSIZE bytes are memory-mapped
+          and the hasher reads directly the mapped memory;
+        o the other files are read with readinto() into one preallocated
+          buffer of <buffer_size> bytes, the hasher reading slices of
+          this buffer through a memoryview.
+
+        If <cutoff> is an integer, a copy of the hasher is taken after
+        <cutoff> bytes have been hashed.
+
+        If <output> is a file object, the bytes given to the hasher are
+        written into it : the file is copied while being hashed.
+
+        This function may be called by a worker thread or by a worker process
+        (see fill_select()) : it doesn't use any global variable.
+        ________________________________________________________________________
+
+        PARAMETERS
+                o filename       : (str) file's name
+                o cutoff         : (None/int) see above
+                o stop_at_cutoff : (bool) if True, the file is read only up to
+                                   <cutoff> bytes.
+                o buffer_size    : (int) size of the reading buffer, in bytes
+                o algorithm      : (str) a key of CST__HASHERS
+                o output         : None or a binary file object opened for
+                                   writing.
+
+        RETURNED VALUE
+                (partialhasher, hasher) : partialhasher is the copy of the
+                hasher taken after <cutoff> bytes, None if <cutoff> is None or
+                if the file is smaller than <cutoff> bytes (in this case, the
+                whole file has been hashed by hasher); hasher is the hasher fed
+                with the whole file, None if partialhasher has been computed
+                and if stop_at_cutoff is True.
+    """
+    hasher = CST__HASHERS[algorithm]()
+    partialhasher = None
+
+    update = hasher.update
+    if output is not None:
+        #. . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . . .
+        def update(data):
+            """
+                    Hash <data> and write it into <output>.
+            """
+            hasher.update(data)
+            output.write(data)
+
+    with open(filename, "rb", buffering=0) as afile:
+        size = os.fstat(afile.fileno()).st_size
+
+        # ......................................................................
+        # big files : the hasher reads the mapped memory.
+        # ......................................................................
+        mapped = None
+        if size >= CST__HASH_MMAP_MINSIZE:
+            try:
+                mapped = mmap.mmap(afile.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError, OverflowError):
+                # e.g. a file on a filesystem which doesn't support mmap, or
+                # a file too big for the address space : let's read it.
+                mapped = None
+
+        if mapped is not None:
+            with mapped, memoryview(mapped) as view:
+                if cutoff is not None and cutoff <= len(view):
+                    update(view[:cutoff])
+                    partialhasher = hasher.copy()
+                    if stop_at_cutoff:
+                        return (partialhasher, None)
+                    update(view[cutoff:])
+                else:
+                    update(view)
+            return (partialhasher, hasher)
+
+        # ......................................................................
+        # other files : readinto() a preallocated buffer.
+        # ......................................................................
+        buf = memoryview(bytearray(buffer_size))
+        nbr_of_bytes_read = 0
+        nbr_of_bytes_in_buf = afile.readinto(buf)
+        while nbr_of_bytes_in_buf:
+            if partialhasher is None and cutoff is not None and \
+               nbr_of_bytes_read + nbr_of_bytes_in_buf >= cutoff:
+                index = cutoff - nbr_of_bytes_read
+                update(buf[:index])
+                partialhasher = hasher.copy()
+                if stop_at_cutoff:
+                    return (partialhasher, None)
+                update(buf[index:nbr_of_bytes_in_buf])
+            else:
+                update(buf[:nbr_of_bytes_in_buf])
+
+            nbr_of_bytes_read += nbr_of_bytes_in_buf
+            nbr_of_bytes_in_buf = afile.readinto(buf)
+
+    return (partialhasher, hasher)
 
 #///////////////////////////////////////////////////////////////////////////////
 def is_ntfs_prefix_mandatory(path):
@@ -2038,6 +4621,81 @@ def is_ntfs_prefix_mandatory(path):
 
     return res
 
+#///////////////////////////////////////////////////////////////////////////////
+def journal__read(journal_name):
+    """
+        journal__read()
+        ________________________________________________________________________
+
+        Read the task journal written by action__add(), one JSON object by
+        line; the reading stops at the first incomplete line, i.e. the line
+        being written when the add has been interrupted.
+        ________________________________________________________________________
+
+        PARAMETER
+                o journal_name  : (str) see get_journal_fullname()
+
+        RETURNED VALUE
+                (mode, planned, copied, nbr_of_committed_rows) :
+                o mode          : (str) the "[target] mode" of the add
+                o planned       : a list of (hashid, SELECTELEMENT), in the
+                                  order of SELECT
+                o copied        : an OrderedDict, (int)index in <planned> :
+                                  ((str)partial hashid, (str)hashid), in the
+                                  order of the rows written in the database
+                o nbr_of_committed_rows : (int) number of rows written in the
+                                  database, i.e. of the first files of
+                                  <copied>
+    """
+    mode = None
+    planned = []
+    copied = collections.OrderedDict()
+    nbr_of_committed_rows = 0
+
+    with open(journal_name, encoding="utf-8") as journal:
+        for line in journal:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+
+            if record["state"] == "started":
+                mode = record["mode"]
+            elif record["state"] == "planned":
+                planned.append((record["hashid"], SELECTELEMENT(*record["file"])))
+            elif record["state"] == "copied":
+                copied[record["index"]] = tuple(record["hashids"])
+            elif record["state"] == "committed":
+                nbr_of_committed_rows = record["rows"]
+
+    return (mode, planned, copied, nbr_of_committed_rows)
+
+#///////////////////////////////////////////////////////////////////////////////
+def journal__write(journal, records, sync=False):
+    """
+        journal__write()
+        ________________________________________________________________________
+
+        Write some records in the task journal (see action__add()), one JSON
+        object by line, and flush the journal.
+        ________________________________________________________________________
+
+        PARAMETERS
+                o journal       : the journal, a text file opened for writing
+                o records       : an iterable of dicts, each of them having a
+                                  "state" key ("started", "planned", "copied"
+                                  or "committed")
+                o sync          : (bool) if True, the journal is written on
+                                  disk (os.fsync()) before returning
+
+        no RETURNED VALUE
+    """
+    for record in records:
+        journal.write(json.dumps(record)+"\n")
+    journal.flush()
+    if sync:
+        os.fsync(journal.fileno())
+
 #///////////////////////////////////////////////////////////////////////////////
 def logfile_opening():
     """
@@ -2129,16 +4787,29 @@ def main_actions():
     if ARGS.targetkill:
         action__target_kill(ARGS.targetkill)
 
+    if ARGS.rehash:
+        action__rehash(ARGS.rehash)
+
     if ARGS.whatabout:
         read_target_db()
         action__whatabout(ARGS.whatabout)
 
     if ARGS.select:
         read_target_db()
+        # --select doesn't modify the target directory : an interrupted add is
+        # recovered by --add or --apply.
+        interrupted_add = os.path.exists(get_journal_fullname())
+        if interrupted_add:
+            LOGGER.warning("  ! an interrupted add has been found (\"%s\") : it will be "
+                           "recovered by --add or --apply.", get_journal_fullname(),
+                           color="red")
         read_filters()
         action__select()
 
-        if ARGS.verbosity != 'none' and len(SELECT) > 0:
+        if ARGS.plan:
+            plan__write(ARGS.plan)
+
+        if ARGS.verbosity != 'none' and len(SELECT) > 0 and not interrupted_add:
             answer = \
                 input("\nDo you want to update the target database and to {0} the selected "
                       "files into the target directory "
@@ -2151,11 +4822,18 @@ def main_actions():
 
     if ARGS.add:
         read_target_db()
+        action__add__recover()
         read_filters()
         action__select()
         action__add()
         show_infos_about_target_path()
 
+    if ARGS.apply:
+        read_target_db()
+        action__add__recover()
+        action__apply(ARGS.apply)
+        show_infos_about_target_path()
+
     if ARGS.new:
         action__new(ARGS.new)
 
@@ -2310,6 +4988,18 @@ def main_warmup(timestamp_start):
         LOGGER.info("  =     the files will NOT be copied or moved in the target directory     =",
                     color="cyan")
 
+    if CFG_PARAMETERS["target"]["mode"] == 'hardlink':
+        LOGGER.info("  = mode=hardlink                                                         =",
+                    color="cyan")
+        LOGGER.info("  =     the files will be hard linked (copied if on another filesystem)   =",
+                    color="cyan")
+
+    if CFG_PARAMETERS["target"]["mode"] == 'symlink':
+        LOGGER.info("  = mode=symlink                                                          =",
+                    color="cyan")
+        LOGGER.info("  =     symbolic links to the files will be created in the target dir.    =",
+                    color="cyan")
+
     source_path = CFG_PARAMETERS["source"]["path"]
 
     #...........................................................................
@@ -2355,7 +5045,8 @@ def modify_the_tag_of_some_files(tag, dest, _mode):
         modify_the_tag_of_some_files()
         ________________________________________________________________________
 
-        Modify the tag(s) of some files.
+        Modify the tag(s) of some files, updating both the file_tags table and
+        the tags' strings (dbfiles.tagsstr) with set-based SQL orders.
         ________________________________________________________________________
 
         PARAMETERS
@@ -2365,45 +5056,84 @@ def modify_the_tag_of_some_files(tag, dest, _mode):
                 o _mode         : (str) "append" to add "tag" to the other tags
                                         "set" to replace old tag(s) by a new one
     """
+    if _mode not in ("append", "set"):
+        raise KatalError("_mode argument \"{0}\" isn't known".format(_mode))
+
     if not os.path.exists(normpath(get_database_fullname())):
         LOGGER.warning("    ! no database found.",
                     color="red")
-    else:
-        db_connection = sqlite3.connect(get_database_fullname())
-        db_connection.row_factory = sqlite3.Row
-        db_cursor = db_connection.cursor()
-
-        files_to_be_modified = []       # a list of (hashids, name)
-        for db_record in db_cursor.execute('SELECT * FROM dbfiles'):
-            if fnmatch.fnmatch(db_record["name"], dest):
-                files_to_be_modified.append((db_record["hashid"], db_record["name"]))
+        return
 
-        if len(files_to_be_modified) == 0:
-            LOGGER.info("    * no files match the given name(s) given as a parameter.")
-        else:
-            # let's apply the tag(s) to the <files_to_be_modified> :
-            for hashid, filename in files_to_be_modified:
+    db_connection = sqlite3.connect(get_database_fullname())
+    db_connection.row_factory = sqlite3.Row
 
-                LOGGER.info("    o applying the tag string \"%s\" to %s.", tag, filename)
+    if not ARGS.off:
+        update_db_schema(db_connection)
 
-                if ARGS.off:
-                    pass
+    # fnmatch-like wildcards -> GLOB wildcards :
+    dest = dest.replace("[!", "[^")
+    tags = tagsstr_to_tags(tag)
 
-                elif _mode == "set":
-                    sqlorder = 'UPDATE dbfiles SET tagsstr=? WHERE hashid=?'
-                    db_connection.execute(sqlorder, (tag, hashid))
+    files_to_be_modified = [db_record["name"] for db_record in
+                            db_connection.execute('SELECT name FROM dbfiles WHERE name GLOB ?',
+                                                  (dest,))]
 
-                elif _mode == "append":
-                    sqlorder = ('UPDATE dbfiles SET tagsstr = tagsstr || \"{0}{1}\" '
-                                'WHERE hashid=\"{2}\"').format(CST__TAG_SEPARATOR, tag, hashid)
-                    db_connection.executescript(sqlorder)
+    if len(files_to_be_modified) == 0:
+        LOGGER.info("    * no files match the given name(s) given as a parameter.")
+    else:
+        for filename in files_to_be_modified:
+            LOGGER.info("    o applying the tag string \"%s\" to %s.", tag, filename)
 
+        if not ARGS.off:
+            with db_connection:
+                if _mode == "set":
+                    db_connection.execute('DELETE FROM file_tags WHERE hashid IN '
+                                          '(SELECT hashid FROM dbfiles WHERE name GLOB ?)',
+                                          (dest,))
+                    db_connection.execute('UPDATE dbfiles SET tagsstr=? WHERE name GLOB ?',
+                                          (CST__TAG_SEPARATOR.join(tags), dest))
                 else:
-                    raise KatalError("_mode argument \"{0}\" isn't known".format(_mode))
+                    for _tag in tags:
+                        # the tag is added to the tags' strings which don't contain it yet :
+                        db_connection.execute('UPDATE dbfiles SET tagsstr = CASE tagsstr '
+                                              'WHEN \'\' THEN ?1 ELSE tagsstr || ?2 || ?1 END '
+                                              'WHERE name GLOB ?3 AND NOT EXISTS '
+                                              '(SELECT 1 FROM file_tags WHERE '
+                                              'file_tags.hashid=dbfiles.hashid AND tag=?1)',
+                                              (_tag, CST__TAG_SEPARATOR, dest))
+
+                for _tag in tags:
+                    db_connection.execute('INSERT OR IGNORE INTO file_tags '
+                                          'SELECT hashid, ? FROM dbfiles WHERE name GLOB ?',
+                                          (_tag, dest))
 
-            db_connection.commit()
+    db_connection.close()
 
-        db_connection.close()
+#///////////////////////////////////////////////////////////////////////////////
+def move_to_the_trash(files):
+    """
+        move_to_the_trash()
+        ________________________________________________________________________
+
+        Move some files of the target directory into the trash directory and
+        yield their hashids : this generator is to be given to
+        db_write_in_chunks() so that the files are removed from the database
+        as they are moved. With --off, nothing is moved.
+        ________________________________________________________________________
+
+        PARAMETER
+                o files : a list of ((str)hashid, (str)name)
+
+        RETURNED VALUE
+                yield ((str)hashid,) for each moved file
+    """
+    for hashid, name in files:
+        LOGGER.info("   o removing %s from the database and from the target path", name)
+        if not ARGS.off:
+            shutil.move(os.path.join(normpath(ARGS.targetpath), name),
+                        os.path.join(normpath(ARGS.targetpath),
+                                     CST__KATALSYS_SUBDIR, CST__TRASH_SUBSUBDIR, name))
+        yield (hashid,)
 
 #///////////////////////////////////////////////////////////////////////////////
 def normpath(path):
@@ -2479,6 +5209,13 @@ def read_command_line_arguments():
                         help="# Add a tag to some file(s) in combination "
                              "with the --to option. ")
 
+    parser.add_argument('--apply',
+                        type=str,
+                        help="# Add to the target directory the files of a plan written by "
+                             "--select --plan, without selecting nor hashing them again. "
+                             "The files whose source has been modified since they have been "
+                             "selected are discarded.")
+
     parser.add_argument('-cfg', '--configfile',
                         type=str,
                         help="# Set the name of the config file, e.g. config.ini")
@@ -2502,7 +5239,8 @@ def read_command_line_arguments():
     parser.add_argument('--findtag',
                         type=str,
                         help="# Find the files in the target directory with the given tag. "
-                             "The tag is a simple string, not a regex.")
+                             "The tag is a simple string, not a regex : only the files "
+                             "having exactly this tag are found.")
 
     parser.add_argument('--infos',
                         action="store_true",
@@ -2515,6 +5253,12 @@ def read_command_line_arguments():
                         type=str,
                         help="# Create a new target directory")
 
+    parser.add_argument('--nohashcache',
+                        action="store_true",
+                        help="# Neither read nor update the hash cache stored in the target "
+                             "directory : the hashids of the source files are computed "
+                             "from their content.")
+
     parser.add_argument('--off',
                         action="store_true",
                         help="# Don't write anything into the target directory or into "
@@ -2522,6 +5266,12 @@ def read_command_line_arguments():
                              "Use this option to simulate an operation : you get the messages "
                              "but no file is modified on disk, no directory is created.")
 
+    parser.add_argument('--plan',
+                        type=str,
+                        help="# To be used with --select (and maybe --off). Write the "
+                             "selected files, their hashids, target names, tags and "
+                             "fingerprints in a plan file, to be used later with --apply.")
+
     parser.add_argument('--rebase',
                         type=str,
                         help="# Copy the current target directory into a new one : you "
@@ -2531,6 +5281,12 @@ def read_command_line_arguments():
                              "(modify [target]name of the target files), "
                              "then use --rebase with the name of the new target directory")
 
+    parser.add_argument('--rehash',
+                        choices=sorted(CST__HASHERS),
+                        help="# Compute again the hashids of the files stored in the target "
+                             "directory with another hash algorithm and update the "
+                             "database : the files' names aren't modified.")
+
     parser.add_argument('--reset',
                         action="store_true",
                         help="# Delete the database and the files in the target directory")
@@ -2624,6 +5380,85 @@ def read_command_line_arguments():
 
     return parser.parse_args()
 
+#///////////////////////////////////////////////////////////////////////////////
+def plan__read(planname):
+    """
+        plan__read()
+        ________________________________________________________________________
+
+        Read a plan written by plan__write().
+        ________________________________________________________________________
+
+        PARAMETER
+                o planname      : (str) the plan's name
+
+        RETURNED VALUE
+                (header, files) :
+                o header        : a dict, see plan__write()
+                o files         : a list of ((str)hashid, SELECTELEMENT), in the
+                                  order of SELECT.
+
+                Raise a KatalError if the file isn't a plan.
+    """
+    files = []
+
+    with open(planname, encoding="utf-8") as plan:
+        try:
+            header = json.loads(plan.readline())
+            if header.get("katal plan") != CST__PLAN_VERSION:
+                raise ValueError("not a plan or unknown version")
+            for key in ("targetpath", "mode", "hash algorithm", "date"):
+                if key not in header:
+                    raise ValueError("no \"{0}\" in the header".format(key))
+
+            for line in plan:
+                record = json.loads(line)
+                files.append((record["hashid"],
+                              SELECTELEMENT(*record["file"])))
+        except (ValueError, KeyError, TypeError, AttributeError) as exception:
+            raise KatalError("\"{0}\" isn't a valid plan : {1}".format(planname, exception))
+
+    return (header, files)
+
+#///////////////////////////////////////////////////////////////////////////////
+def plan__write(planname):
+    """
+        plan__write()
+        ________________________________________________________________________
+
+        Write SELECT in a plan, to be applied later by --apply (see
+        action__apply()). A plan is a text file, one JSON object by line :
+
+        o the header : {"katal plan": CST__PLAN_VERSION, "targetpath",
+          "mode", "hash algorithm", "date"};
+        o one line for each selected file : {"hashid", "file" (the fields of
+          the SELECTELEMENT, hence the partial hashid, the target name, the
+          tags and the fingerprint of the source file, read when the file has
+          been selected and hashed)}.
+
+        The plan isn't written in the target directory : it may be written
+        with --off.
+        ________________________________________________________________________
+
+        PARAMETER
+                o planname      : (str) the plan's name
+
+        no RETURNED VALUE
+    """
+    with open(planname, "w", encoding="utf-8") as plan:
+        plan.write(json.dumps({"katal plan": CST__PLAN_VERSION,
+                               "targetpath": normpath(ARGS.targetpath),
+                               "mode": CFG_PARAMETERS["target"]["mode"],
+                               "hash algorithm": HASH_ALGORITHM,
+                               "date": datetime.now().strftime(CST__DTIME_FORMAT)})+"\n")
+
+        for hashid, selectedfile in SELECT.items():
+            plan.write(json.dumps({"hashid": hashid,
+                                   "file": list(selectedfile)})+"\n")
+
+    LOGGER.info("  = plan written in \"%s\" : %s file(s); use --apply to add them =",
+                planname, len(SELECT))
+
 #///////////////////////////////////////////////////////////////////////////////
 def possible_paths_to_cfg():
     """
@@ -2696,6 +5531,35 @@ def read_parameters_from_cfgfile(_configfile_name):
         _ = parser["display"]["tag.max length on console"]
         _ = parser["display"]["source filename.max length on console"]
         _ = parser["source"]["path"]
+        # optional values :
+        if parser.getint("source", "scan workers", fallback=1) < 1:
+            raise ValueError("[source]scan workers must be greater than 0.")
+        if parser.getint("source", "hash workers", fallback=1) < 1:
+            raise ValueError("[source]hash workers must be greater than 0.")
+        if parser.getint("source", "hash processes", fallback=0) < 0:
+            raise ValueError("[source]hash processes can't be negative.")
+        if parser.getint("source", "selection memory budget",
+                         fallback=CST__SELECT_MEMORY_BUDGET) < 0:
+            raise ValueError("[source]selection memory budget can't be negative.")
+        if parser.getint("source", "max depth", fallback=0) < 0:
+            raise ValueError("[source]max depth can't be negative.")
+        if parser.getint("source", "hash buffer size",
+                         fallback=CST__HASH_BUFFER_SIZE) < 1:
+            raise ValueError("[source]hash buffer size must be greater than 0.")
+        if parser["target"]["mode"] not in CST__TARGET_MODES:
+            raise ValueError("[target]mode must be one of "
+                             "{0}.".format(", ".join(CST__TARGET_MODES)))
+        if parser.getint("target", "copy workers", fallback=1) < 1:
+            raise ValueError("[target]copy workers must be greater than 0.")
+        # (getboolean() raises a ValueError if the value isn't a boolean)
+        parser.getboolean("target", "hash while copying", fallback=True)
+        if parser.getint("target", "database batch size",
+                         fallback=CST__DATABASE_BATCH_SIZE) < 1:
+            raise ValueError("[target]database batch size must be greater than 0.")
+        if parser.get("target", "hash algorithm",
+                      fallback=CST__HASH_ALGORITHM_DEFAULT) not in CST__HASHERS:
+            raise ValueError("[target]hash algorithm must be one of "
+                             "{0}.".format(", ".join(sorted(CST__HASHERS))))
     except KeyError as exception:
         print("  ! An error occured while reading " "the config file \"{}\".\n"
               "  ! Your configuration file lacks a specific value : \"{}\".\n"
@@ -2725,12 +5589,35 @@ def read_filters():
         read_filters()
         ________________________________________________________________________
 
-        Initialize FILTERS from the configuration file.
+        Initialize FILTERS, FILTERS_EVAL and DIRFILTERS from the configuration
+        file.
+
+        The "size" and "date" fields are read here, once, and stored as
+        FILTERPREDICATE objects : an ill-formed field raises a KatalError
+        before the source path is browsed.
         ________________________________________________________________________
 
         no PARAMETER, no RETURNED VALUE
     """
+    global FILTERS_EVAL
+
     FILTERS.clear()
+    DIRFILTERS.clear()
+
+    # directories which won't be browsed, see thedirhastobebrowsed() :
+    if CFG_PARAMETERS.get("source", "exclude dir", fallback="").strip() != "":
+        DIRFILTERS["exclude dir"] = [pattern.strip() for pattern in
+                                     CFG_PARAMETERS["source"]["exclude dir"].split(";")
+                                     if pattern.strip() != ""]
+    if CFG_PARAMETERS.get("source", "exclude path", fallback="") != "":
+        try:
+            DIRFILTERS["exclude path"] = re.compile(CFG_PARAMETERS["source"]["exclude path"])
+        except re.error as exception:
+            raise KatalError("Can't read the [source]exclude path regex "
+                             "(\"{0}\") : {1}".format(CFG_PARAMETERS["source"]["exclude path"],
+                                                      exception))
+    if CFG_PARAMETERS.has_option("source", "max depth"):
+        DIRFILTERS["max depth"] = CFG_PARAMETERS.getint("source", "max depth")
 
     stop = False
     filter_index = 1
@@ -2752,14 +5639,101 @@ def read_filters():
 
             if CFG_PARAMETERS.has_option("source.filter"+str(filter_index), "size"):
                 FILTERS[filter_index]["size"] = \
-                              CFG_PARAMETERS["source.filter"+str(filter_index)]["size"]
+                   read_filters__size(CFG_PARAMETERS["source.filter"+str(filter_index)]["size"])
 
             if CFG_PARAMETERS.has_option("source.filter"+str(filter_index), "date"):
                 FILTERS[filter_index]["date"] = \
-                              CFG_PARAMETERS["source.filter"+str(filter_index)]["date"]
+                   read_filters__date(CFG_PARAMETERS["source.filter"+str(filter_index)]["date"])
 
         filter_index += 1
 
+    FILTERS_EVAL = compile_filters_eval(CFG_PARAMETERS["source"]["eval"], FILTERS)
+
+#///////////////////////////////////////////////////////////////////////////////
+def read_filters__date(string):
+    """
+        read_filters__date()
+        ________________________________________________________________________
+
+        Function used by read_filters() : read the "date" field of a filter,
+        e.g. ">=2015-09-17 20:01" (see CST__DTIME_FORMAT). The date is read as
+        an UTC date, like the dates of the files in fill_select().
+        ________________________________________________________________________
+
+        PARAMETER
+                o string        : (str) the field to be read
+
+        RETURNED VALUE
+                a FILTERPREDICATE object, its value being a number of seconds
+                since the epoch; raise a KatalError if <string> is ill-formed.
+    """
+    for symbol, _operator in CST__FILTER_OPERATORS:
+        if string.startswith(symbol):
+            try:
+                date = datetime.strptime(string[len(symbol):].strip(), CST__DTIME_FORMAT)
+            except ValueError:
+                break
+            return FILTERPREDICATE(operator=_operator,
+                                   value=calendar.timegm(date.timetuple()),
+                                   string=string)
+
+    raise KatalError("Can't analyse a 'date' field : {0}; expected format is "
+                     "(=|<|>|<=|>=){1}".format(string, CST__DTIME_FORMAT))
+
+#///////////////////////////////////////////////////////////////////////////////
+def read_filters__size(string):
+    """
+        read_filters__size()
+        ________________________________________________________________________
+
+        Function used by read_filters() : read the "size" field of a filter,
+        e.g. ">999", "<=1.5MB" or "=2KiB" (see CST__MULTIPLES).
+
+        The size is stored as an integer number of bytes : since a file's size
+        is an integer, ">1.5" is read as ">1", ">=1.5" as ">=2", "<1.5" as "<2"
+        and "<=1.5" as "<=1". A fractional size being impossible, "=1.5" can't
+        match any file.
+        ________________________________________________________________________
+
+        PARAMETER
+                o string        : (str) the field to be read
+
+        RETURNED VALUE
+                a FILTERPREDICATE object; raise a KatalError if <string> is
+                ill-formed.
+    """
+    number = string.strip()
+
+    multiple = 1
+    for suffix, _multiple in CST__MULTIPLES:
+        if number.endswith(suffix):
+            multiple = _multiple
+            number = number[:-len(suffix)]
+            break
+
+    for symbol, _operator in CST__FILTER_OPERATORS:
+        if number.startswith(symbol):
+            try:
+                # Fraction("1.1")*1000**2 is exactly 1100000, unlike float("1.1")*1000**2 .
+                size = fractions.Fraction(number[len(symbol):].strip())*multiple
+            except ValueError:
+                break
+
+            if _operator in (operator.gt, operator.le):
+                value = math.floor(size)
+            elif _operator in (operator.ge, operator.lt):
+                value = math.ceil(size)
+            elif size.denominator == 1:
+                value = int(size)
+            else:
+                value = -1  # "=" + fractional size : no file has a size of -1 byte.
+
+            return FILTERPREDICATE(operator=_operator, value=value, string=string)
+
+    raise KatalError("Can't analyse {0} in the filter. "
+                     "Available multiples are : {1}".format(string,
+                                                            CST__MULTIPLES))
+
 #///////////////////////////////////////////////////////////////////////////////
 def read_target_db():
     """
@@ -2767,22 +5741,55 @@ def read_target_db():
         ________________________________________________________________________
 
         Read the database stored in the target directory and initialize
-        TARGET_DB.
+        TARGET_DB, TARGET_DB_INDEX and HASH_ALGORITHM.
+
+        If "[target] hash algorithm" is set in the configuration file and
+        differs from the hash algorithm of the database, the latter is used :
+        see the --rehash option. An empty database simply adopts the
+        configured algorithm.
         ________________________________________________________________________
 
         no PARAMETER, no RETURNED VALUE
     """
+    global HASH_ALGORITHM
+
     if not os.path.exists(normpath(get_database_fullname())):
-        create_empty_db(normpath(get_database_fullname()))
+        create_empty_db(normpath(get_database_fullname()),
+                        hash_algorithm=CFG_PARAMETERS.get("target", "hash algorithm",
+                                                          fallback=CST__HASH_ALGORITHM_DEFAULT))
 
     db_connection = sqlite3.connect(get_database_fullname())
-    db_connection.row_factory = sqlite3.Row
-    db_cursor = db_connection.cursor()
 
-    for db_record in db_cursor.execute('SELECT * FROM dbfiles'):
-        TARGET_DB[db_record["hashid"]] = (db_record["partialhashid"],
-                                          db_record["size"],
-                                          db_record["sourcename"])
+    if not ARGS.off:
+        update_db_schema(db_connection)
+
+    # the source names are rebuilt from the directories table (dirid:path), each
+    # directory being read once :
+    directories = {None: ""}
+    if db_has_table(db_connection, "files"):
+        directories.update(db_connection.execute('SELECT dirid, path FROM directories'))
+        sqlorder = ('SELECT hashid, partialhashid, size, dirid, basename '
+                    'FROM files')
+    else:
+        # an ancient database read with --off, see update_db_schema() :
+        sqlorder = ('SELECT hashid, partialhashid, size, NULL, sourcename '
+                    'FROM dbfiles')
+
+    for hashid, partialhashid, size, dirid, basename in db_connection.execute(sqlorder):
+        TARGET_DB[hashid] = (partialhashid, size, directories[dirid] + basename)
+        TARGET_DB_INDEX.setdefault(size, {}).setdefault(partialhashid, []).append(hashid)
+
+    HASH_ALGORITHM = get_db_hash_algorithm(db_connection)
+    cfg_algorithm = CFG_PARAMETERS.get("target", "hash algorithm", fallback=HASH_ALGORITHM)
+    if cfg_algorithm != HASH_ALGORITHM:
+        if len(TARGET_DB) == 0 and not ARGS.off:
+            set_db_hash_algorithm(db_connection, cfg_algorithm)
+            HASH_ALGORITHM = cfg_algorithm
+        else:
+            LOGGER.warning("    ! the database uses the %s hash algorithm, not %s as "
+                           "required by the configuration file : "
+                           "use --rehash %s to convert the database.",
+                           HASH_ALGORITHM, cfg_algorithm, cfg_algorithm, color="red")
 
     db_connection.close()
 
@@ -2807,6 +5814,190 @@ def remove_illegal_characters(_src):
         res = res.replace(char, "_")
     return res
 
+#///////////////////////////////////////////////////////////////////////////////
+def scan_source_path(source_path, workers=1, namefilter=None, dirfilter=None, pruned=None):
+    """
+        scan_source_path()
+        ________________________________________________________________________
+
+        Browse the source path and yield a SRCFILE object for each file stored
+        in it. The directories are read with os.scandir() and each file is
+        stat'ed only once; the source path is normalized once, the names of the
+        files being simply joined to it.
+
+        Unreadable files (e.g. broken symbolic links) are not yielded : a
+        warning is displayed instead.
+
+        If workers is greater than 1, the subdirectories are read in advance by
+        a pool of threads (at most workers*CST__SCAN_PREFETCH directories at
+        the same time), which hides the latency of stat() on network shares or
+        SSD arrays.
+
+        Whatever the number of workers, the files are browsed in the same order
+        as with os.walk() : a directory, then each of its subdirectories
+        (top-down); symbolic links to directories aren't followed.
+
+        If namefilter(filename) is False, the file isn't stat'ed : a SRCFILE
+        object without size, date, ... is yielded (see SRCFILE).
+
+        If dirfilter(dirpath) is False, the subdirectory <dirpath> is pruned :
+        neither its content nor its subdirectories are read.
+        ________________________________________________________________________
+
+        PARAMETERS
+                o source_path   : (str) the source path
+                o workers       : (int) number of threads reading the directories
+                o namefilter    : None or a function f(filename) returning False
+                                  if the file can be rejected from its name only
+                o dirfilter     : None or a function f(dirpath) returning False
+                                  if a subdirectory mustn't be browsed
+                o pruned        : None or a list, extended with the (str) paths
+                                  of the pruned subdirectories
+
+        RETURNED VALUE
+                a generator of SRCFILE objects
+    """
+    if workers <= 1:
+        dirpaths = [normpath(source_path)]  # (stack) the directories to be read.
+
+        while len(dirpaths) > 0:
+            srcfiles, subdirpaths, prunedpaths = scan_source_path__dir(source_path,
+                                                                       dirpaths.pop(),
+                                                                       namefilter, dirfilter)
+            if pruned is not None:
+                pruned.extend(prunedpaths)
+            yield from srcfiles
+
+            # the first subdirectory has to be read first :
+            dirpaths.extend(reversed(subdirpaths))
+        return
+
+    #...........................................................................
+    def prefetch():
+        """
+                Submit to the workers the directories to be read next.
+        """
+        nonlocal inflight
+        for item in reversed(pending):
+            if inflight >= workers*CST__SCAN_PREFETCH:
+                break
+            if item[1] is None:
+                item[1] = executor.submit(scan_source_path__dir, source_path, item[0],
+                                          namefilter, dirfilter)
+                inflight += 1
+
+    pending = [[normpath(source_path), None]]  # (stack) [dirpath, future or None]
+    inflight = 0                               # number of submitted directories
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        while len(pending) > 0:
+            prefetch()
+
+            dirpath, future = pending.pop()
+            if future is None:
+                # all the workers are busy with the directories read in advance :
+                srcfiles, subdirpaths, prunedpaths = scan_source_path__dir(source_path, dirpath,
+                                                                           namefilter, dirfilter)
+            else:
+                srcfiles, subdirpaths, prunedpaths = future.result()
+                inflight -= 1
+            if pruned is not None:
+                pruned.extend(prunedpaths)
+
+            # the first subdirectory has to be read first :
+            pending.extend([subdirpath, None] for subdirpath in reversed(subdirpaths))
+            prefetch()
+
+            yield from srcfiles
+
+#///////////////////////////////////////////////////////////////////////////////
+def scan_source_path__dir(source_path, dirpath, namefilter=None, dirfilter=None):
+    """
+        scan_source_path__dir()
+        ________________________________________________________________________
+
+        Function used by scan_source_path() : read one directory.
+        ________________________________________________________________________
+
+        PARAMETERS
+                o source_path   : (str) the source path, used in the messages
+                o dirpath       : (str) the normalized path of the directory
+                o namefilter    : see scan_source_path()
+                o dirfilter     : see scan_source_path()
+
+        RETURNED VALUE
+                ( (list of SRCFILE)the files, (list of str)the subdirectories to be
+                  browsed, (list of str)the pruned subdirectories )
+    """
+    srcfiles = []
+    subdirpaths = []
+    prunedpaths = []
+
+    try:
+        with os.scandir(dirpath) as entries:
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+
+                if is_dir:
+                    if entry.is_symlink():
+                        pass
+                    elif dirfilter is not None and not dirfilter(entry.path):
+                        prunedpaths.append(entry.path)
+                    else:
+                        subdirpaths.append(entry.path)
+                    continue
+
+                if namefilter is not None and namefilter(entry.name) is False:
+                    srcfiles.append(SRCFILE(dirpath, entry.name, None, None, None, None, None))
+                    continue
+
+                # protection against the FileNotFoundError exception raised
+                # e.g. by broken symbolic links :
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    LOGGER.warning("    ! browsing %s, an error occured : "
+                                   "can't read the file \"%s\"",
+                                   source_path, entry.path, color='red')
+                    continue
+
+                srcfiles.append(SRCFILE(dirpath=dirpath,
+                                        filename=entry.name,
+                                        size=stat.st_size,
+                                        mtime=stat.st_mtime,
+                                        dev=stat.st_dev,
+                                        ino=stat.st_ino or entry.inode(),
+                                        mtime_ns=stat.st_mtime_ns))
+
+    except OSError as exception:
+        LOGGER.warning("    ! browsing %s, an error occured : "
+                       "can't read the directory \"%s\" (%s)",
+                       source_path, dirpath, exception, color='red')
+
+    return srcfiles, subdirpaths, prunedpaths
+
+#///////////////////////////////////////////////////////////////////////////////
+def set_db_hash_algorithm(db_connection, algorithm):
+    """
+        set_db_hash_algorithm()
+        ________________________________________________________________________
+
+        Write in the metadata of a database the hash algorithm it uses.
+        ________________________________________________________________________
+
+        PARAMETERS
+                o db_connection : connection to the database
+                o algorithm     : (str) a key of CST__HASHERS
+
+        no RETURNED VALUE
+    """
+    db_connection.execute(CST__SQL__CREATE_METADATA)
+    db_connection.execute('INSERT OR REPLACE INTO katalmetadata VALUES (?,?)',
+                          ("hash algorithm", algorithm))
+    db_connection.commit()
+
 #///////////////////////////////////////////////////////////////////////////////
 def shortstr(string, max_length):
     """
@@ -2872,37 +6063,26 @@ def show_infos_about_source_path():
     files_number = 0
     files_number_interval = 0   # used to display the intermediate number, see below.
     extensions = dict()  # (str)extension : [number of files, total size]
-    for dirpath, _, fnames in os.walk(normpath(source_path)):
-        for filename in fnames:
-            fullname = os.path.join(normpath(dirpath), filename)
-
-            # ..................................................................
-            # protection against the FileNotFoundError exception.
-            # This exception would be raised on broken symbolic link on the
-            #   "size = os.stat(normpath(fullname)).st_size" line (see below).
-            # ..................................................................
-            if os.path.exists(fullname):
-                size = os.stat(normpath(fullname)).st_size
-                extension = os.path.splitext(normpath(filename))[1]
-
-                if extension in extensions:
-                    extensions[extension][0] += 1
-                    extensions[extension][1] += size
-                else:
-                    extensions[extension] = [1, size]
+    for srcfile in scan_source_path(source_path,
+                                    workers=CFG_PARAMETERS.getint("source", "scan workers",
+                                                                  fallback=1)):
+        size = srcfile.size
+        extension = os.path.splitext(srcfile.filename)[1]
+
+        if extension in extensions:
+            extensions[extension][0] += 1
+            extensions[extension][1] += size
+        else:
+            extensions[extension] = [1, size]
 
-                total_size += size
-                files_number += 1
+        total_size += size
+        files_number += 1
 
-                files_number_interval += 1
-                if files_number_interval == 100000:
-                    LOGGER.info("    ... already %s files read in the source directory, "
-                        "still processing...", files_number_interval)
-                    files_number_interval = 0
-            else:
-                LOGGER.warning("    ! browsing %s, an error occured : "
-                    "can't read the file ", source_path, color='red')
-                LOGGER.warning("    \"%s\"", fullname, color='red')
+        files_number_interval += 1
+        if files_number_interval == 100000:
+            LOGGER.info("    ... already %s files read in the source directory, "
+                "still processing...", files_number_interval)
+            files_number_interval = 0
 
     LOGGER.info("    o files number : %s file(s)", files_number)
     LOGGER.info("    o total size : %s", size_as_str(total_size))
@@ -3079,7 +6259,70 @@ def tagsstr_repr(tagsstr):
         return tagsstr
 
 #///////////////////////////////////////////////////////////////////////////////
-def thefilehastobeadded__db(filename, _size):
+def tagsstr_to_tags(tagsstr):
+    """
+        tagsstr_to_tags()
+        ________________________________________________________________________
+
+        Split a tags' string into its tags : the empty tags (e.g. the one
+        before the first separator of ";sunshine;trees" or the " " string
+        given to --settagsstr to empty the tags) are ignored, as the
+        repeated tags.
+        ________________________________________________________________________
+
+        PARAMETER
+            tagsstr : (str) the tags' string, the tags being separated by
+                      CST__TAG_SEPARATOR
+
+        RETURNED VALUE
+            a list of (str)tags
+    """
+    tags = []
+    for tag in tagsstr.split(CST__TAG_SEPARATOR):
+        tag = tag.strip()
+        if tag != "" and tag not in tags:
+            tags.append(tag)
+    return tags
+
+#///////////////////////////////////////////////////////////////////////////////
+def thedirhastobebrowsed(dirpath, source_path):
+    """
+        thedirhastobebrowsed()
+        ________________________________________________________________________
+
+        Return False if a subdirectory of the source path has to be pruned
+        according to DIRFILTERS, i.e. to the "[source]exclude dir",
+        "[source]exclude path" and "[source]max depth" values.
+        ________________________________________________________________________
+
+        PARAMETERS
+                o dirpath       : (str) the normalized path of the subdirectory
+                o source_path   : (str) the normalized source path
+
+        RETURNED VALUE
+                the expected boolean
+    """
+    if "exclude dir" in DIRFILTERS:
+        dirname = os.path.basename(dirpath)
+        for pattern in DIRFILTERS["exclude dir"]:
+            if fnmatch.fnmatchcase(dirname, pattern):
+                return False
+
+    # e.g. "photos/2015/thumbnails", whatever the OS :
+    relpath = os.path.relpath(dirpath, source_path).replace(os.sep, "/")
+
+    if "exclude path" in DIRFILTERS and DIRFILTERS["exclude path"].search(relpath):
+        return False
+
+    # the files stored in source_path have a depth of 0, the ones stored in
+    # source_path/subdirectory a depth of 1, and so on :
+    if "max depth" in DIRFILTERS and relpath.count("/")+1 > DIRFILTERS["max depth"]:
+        return False
+
+    return True
+
+#///////////////////////////////////////////////////////////////////////////////
+def thefilehastobeadded__db(filename, _size, fingerprint=None, hashids=None):
     """
         thefilehastobeadded__db()
         ________________________________________________________________________
@@ -3090,6 +6333,11 @@ def thefilehastobeadded__db(filename, _size):
         PARAMETERS
                 o filename     : (str) file's name
                 o _size         : (int) file's size, in bytes.
+                o fingerprint  : None or (dev, ino, size, mtime_ns) : if given,
+                                 the hash cache will be consulted before reading
+                                 the file. See get_hashids().
+                o hashids      : None or ((str)partial hashid, (str)hashid) if
+                                 the hashids of the file are already known.
 
         About the underscore before "_size" :
         confer https://www.python.org/dev/peps/pep-0008/#function-and-method-arguments
@@ -3101,48 +6349,19 @@ def thefilehastobeadded__db(filename, _size):
                 either (False, None, None)
                 either (True, partial hashid, hashid)
     """
-    # a list of hashid(s) :
-    res = []
-
-    # (1) how many file(s) in the database have a size equal to _size ?
-    for hashid in TARGET_DB:
-        _, target_size, _ = TARGET_DB[hashid]
-        if target_size == _size:
-            res.append(hashid)
+    # the hashids are required whatever happens : either to be compared with
+    # the hashids stored in the database, either to add the file.
+    if hashids is None:
+        hashids = get_hashids(filename, fingerprint)
+    src_partialhashid, src_hashid = hashids
 
-    if len(res) == 0:
-        return (True,
-                hashfile64(filename=filename,
-                           stop_after=CST__PARTIALHASHID_BYTESNBR),
-                hashfile64(filename=filename))
-
-    # (2) how many file(s) among those in <res> have a partial hashid equal
-    # to the partial hashid of filename ?
-    new_res = []
-    src_partialhashid = hashfile64(filename=filename,
-                                   stop_after=CST__PARTIALHASHID_BYTESNBR)
-    for hashid in res:
-        target_partialhashid, _, _ = TARGET_DB[hashid]
-        if target_partialhashid == src_partialhashid:
-            new_res.append(hashid)
-
-    res = new_res
-    if len(res) == 0:
-        return (True,
-                src_partialhashid,
-                hashfile64(filename=filename))
+    # (1) how many file(s) in the database have a size equal to _size and a
+    # partial hashid equal to the partial hashid of filename ?
+    res = TARGET_DB_INDEX.get(_size, {}).get(src_partialhashid, [])
 
-    # (3) how many file(s) among those in <res> have an hashid equal to the
+    # (2) is there a file among those in <res> whose hashid is equal to the
     # hashid of filename ?
-    new_res = []
-    src_hashid = hashfile64(filename=filename)
-    for hashid in res:
-        target_hashid, _, _ = TARGET_DB[hashid]
-        if target_hashid == src_hashid:
-            new_res.append(hashid)
-
-    res = new_res
-    if len(res) == 0:
+    if src_hashid not in res:
         return (True,
                 src_partialhashid,
                 src_hashid)
@@ -3150,60 +6369,40 @@ def thefilehastobeadded__db(filename, _size):
     if not ARGS.strictcmp:
         return (False, None, None)
 
-    # (4) bit-to-bit comparision :
-    for hashid in res:
-        if not filecmp.cmp(filename, TARGET_DB[hashid][2], shallow=False):
-            return (True,
-                    src_partialhashid,
-                    src_hashid)
+    # (3) bit-to-bit comparision :
+    if not filecmp.cmp(filename, TARGET_DB[src_hashid][2], shallow=False):
+        return (True,
+                src_partialhashid,
+                src_hashid)
 
     return (False, None, None)
 
 #///////////////////////////////////////////////////////////////////////////////
-def thefilehastobeadded__filters(filename, _size, date):
+def thefilehastobeadded__filters(filename, _size=None, date=None):
     """
         thefilehastobeadded__filters()
         ________________________________________________________________________
 
         Return True if a file (filename, _size) can be choosed and added to
-        the target directory, according to the filters (stored in FILTERS).
+        the target directory, according to the filters (stored in FILTERS)
+        and to the "[source]eval" expression compiled in FILTERS_EVAL.
+
+        Called without _size and date, this function only uses the name of the
+        file : scan_source_path() doesn't stat the files rejected this way.
         ________________________________________________________________________
 
         PARAMETERS
                 o filename     : (str) file's name
-                o _size         : (int) file's size, in bytes.
-                o date         : (str) file's date
+                o _size         : (int) file's size, in bytes, or None if unknown
+                o date         : (int) file's date, in seconds since the epoch,
+                                 or None if unknown
 
         RETURNED VALUE
-                a boolean, giving the expected answer
+                True, False or None if the size or the date is required to
+                give an answer.
     """
-    evalstr = CFG_PARAMETERS["source"]["eval"]
-
-    for filter_index in FILTERS:
-        _filter = FILTERS[filter_index]
-
-        evalstr = evalstr.replace("filter"+str(filter_index),
-                                  str(eval_filter_for_a_file(_filter, filename, _size, date)))
-
-    try:
-        # eval() IS a dangerous function : see the note about CST__AUTHORIZED_EVALCHARS.
-        for char in evalstr:
-            if char not in CST__AUTHORIZED_EVALCHARS:
-                raise KatalError("Error in configuration file : "
-                                 "trying to compute the \"{0}\" string; "
-                                 "wrong character '{1}'({2}) "
-                                 "used in the string to be evaluated. "
-                                 "Authorized " "characters are "
-                                 "{3}".format(evalstr,
-                                              char,
-                                              unicodedata.name(char),
-                                              "|"+"|".join(CST__AUTHORIZED_EVALCHARS)))
-        return eval(evalstr)
-
-    except BaseException as exception:
-        raise KatalError("The eval formula in the config file (\"{0}\")"
-                         "contains an error. Python message : \"{1}\"".format(evalstr,
-                                                                              exception))
+    return FILTERS_EVAL(lambda filter_index: eval_filter_for_a_file(FILTERS[filter_index],
+                                                                    filename, _size, date))
 
 #///////////////////////////////////////////////////////////////////////////////
 def thefilehastobeadded__filt_date(_filter, date):
@@ -3217,24 +6416,14 @@ def thefilehastobeadded__filt_date(_filter, date):
 
         PARAMETERS
                 o _filter        : a dict object; see documentation:selection
-                o date         : (str) file's datestamp (object datetime.datetime)
+                o date         : (int) file's date, in seconds since the epoch
 
         RETURNED VALUE
                 the expected boolean
     """
-    # beware ! the order matters (<= before <, >= before >)
-    if _filter["date"].startswith("="):
-        return date == datetime.strptime(_filter["date"][1:], CST__DTIME_FORMAT)
-    elif _filter["date"].startswith(">="):
-        return date >= datetime.strptime(_filter["date"][2:], CST__DTIME_FORMAT)
-    elif _filter["date"].startswith(">"):
-        return date > datetime.strptime(_filter["date"][1:], CST__DTIME_FORMAT)
-    elif _filter["date"].startswith("<="):
-        return date < datetime.strptime(_filter["date"][2:], CST__DTIME_FORMAT)
-    elif _filter["date"].startswith("<"):
-        return date < datetime.strptime(_filter["date"][1:], CST__DTIME_FORMAT)
-    else:
-        raise KatalError("Can't analyse a 'date' field : "+_filter["date"])
+    predicate = _filter["date"]  # a FILTERPREDICATE, see read_filters__date()
+
+    return predicate.operator(date, predicate.value)
 
 #///////////////////////////////////////////////////////////////////////////////
 def thefilehastobeadded__filt_name(_filter, filename):
@@ -3261,7 +6450,7 @@ def thefilehastobeadded__filt_name(_filter, filename):
     """
     # nb : _filter["name"] can either be a case sensitive regex, either
     #      a case insensitive regex. See the read_filters() function.
-    return re.match(_filter["name"], filename) is not None
+    return _filter["name"].match(filename) is not None
 
 #///////////////////////////////////////////////////////////////////////////////
 def thefilehastobeadded__filt_size(_filter, _size):
@@ -3286,42 +6475,55 @@ def thefilehastobeadded__filt_size(_filter, _size):
         RETURNED VALUE
                 the expected boolean
     """
-    res = False
+    predicate = _filter["size"]  # a FILTERPREDICATE, see read_filters__size()
 
-    filter_size = _filter["size"] # a string like ">999" : see documentation:selection
+    return predicate.operator(_size, predicate.value)
 
-    multiple = 1
-    for suffix, _multiple in CST__MULTIPLES:
-        if filter_size.endswith(suffix):
-            multiple = _multiple
-            filter_size = filter_size[:-len(suffix)]
-            break
+#///////////////////////////////////////////////////////////////////////////////
+def update_db_schema(db_connection):
+    """
+        update_db_schema()
+        ________________________________________________________________________
 
-    if multiple == 1 and not filter_size[-1].isdigit():
-        raise KatalError("Can't analyse {0} in the filter. "
-                         "Available multiples are : {1}".format(filter_size,
-                                                                CST__MULTIPLES))
+        Add to a database the elements missing in its schema (e.g. the indexes
+        created by recent versions of Katal). This function may be called
+        on an up-to-date database : in this case, nothing is modified.
 
-    # beware !  the order matters (<= before <, >= before >)
-    if filter_size.startswith(">="):
-        if _size >= float(filter_size[2:])*multiple:
-            res = True
-    elif filter_size.startswith(">"):
-        if _size > float(filter_size[1:])*multiple:
-            res = True
-    elif filter_size.startswith("<="):
-        if _size <= float(filter_size[2:])*multiple:
-            res = True
-    elif filter_size.startswith("<"):
-        if _size < float(filter_size[1:])*multiple:
-            res = True
-    elif filter_size.startswith("="):
-        if _size == float(filter_size[1:])*multiple:
-            res = True
-    else:
-        raise KatalError("Can't analyse {0} in the filter.".format(filter_size))
+        A database without metadata has been created by a version of Katal using
+        only sha256 : its hash algorithm is set to CST__HASH_ALGORITHM_DEFAULT.
 
-    return res
+        A database without the file_tags table has been created by a version of
+        Katal storing the tags only in dbfiles.tagsstr : the file_tags table is
+        created and filled from the tags' strings (see db_fill_file_tags()).
+
+        A database whose dbfiles is a table (and not a view) has been created by
+        a version of Katal storing the complete source name of each file : the
+        source names are moved into the directories table (see
+        db_fill_directories()).
+        ________________________________________________________________________
+
+        PARAMETER
+                o db_connection : connection to the database
+
+        no RETURNED VALUE
+    """
+    if db_has_table(db_connection, "dbfiles"):
+        db_fill_directories(db_connection)
+
+    for sqlorder in CST__SQL__CREATE_DB_INDEXES:
+        db_connection.execute(sqlorder)
+
+    file_tags_is_missing = not db_has_table(db_connection, "file_tags")
+    for sqlorder in CST__SQL__CREATE_FILE_TAGS:
+        db_connection.execute(sqlorder)
+    if file_tags_is_missing:
+        db_fill_file_tags(db_connection)
+
+    db_connection.execute(CST__SQL__CREATE_METADATA)
+    db_connection.execute('INSERT OR IGNORE INTO katalmetadata VALUES (?,?)',
+                          ("hash algorithm", CST__HASH_ALGORITHM_DEFAULT))
+
+    db_connection.commit()
 
 #///////////////////////////////////////////////////////////////////////////////
 def welcome(timestamp_start):
@@ -28,7 +28,10 @@
 # pylint: disable=E1101
 
 from collections import namedtuple
+import filecmp
 import os
+import shutil
+import tempfile
 import unittest
 
 from katal import katal
@@ -36,6 +39,9 @@ katal.ARGS = namedtuple("ARGS", ("configfile", "verbosity", "targetpath",))
 katal.ARGS.verbosity = 'none'
 katal.ARGS.targetpath = "tests"
 katal.ARGS.usentfsprefix = None
+katal.ARGS.nohashcache = False
+katal.ARGS.off = False
+katal.ARGS.strictcmp = False
 
 ################################################################################
 class Tests(unittest.TestCase):
@@ -45,6 +51,507 @@ class Tests(unittest.TestCase):
 	Testing the katal.py script
     """
 
+    #//////////////////////////////////////////////////////////////////////////
+    def test__action__add(self):
+        """
+		Tests.test__action__add()
+
+		Test of the katal.py::action__add() function with several copy
+		workers : the files are added to the database in the order of SELECT.
+        """
+        katal.ARGS.configfile = os.path.join("tests", "cfgfile3.ini")
+        katal.CFG_PARAMETERS = katal.read_parameters_from_cfgfile(katal.ARGS.configfile)
+        katal.CFG_PARAMETERS["source"]["path"] = os.path.join("tests", "data1")
+        katal.CFG_PARAMETERS["target"]["copy workers"] = "3"
+        katal.read_filters()
+
+        targetpath = katal.ARGS.targetpath
+        with tempfile.TemporaryDirectory() as tmpdir:
+            try:
+                katal.ARGS.targetpath = tmpdir
+                os.makedirs(os.path.join(tmpdir, katal.CST__KATALSYS_SUBDIR,
+                                         katal.CST__TASKS_SUBSUBDIR))
+                katal.create_empty_db(katal.get_database_fullname())
+                katal.fill_select()
+
+                self.assertEqual(katal.action__add(), 0)
+
+                db_connection = katal.sqlite3.connect(katal.get_database_fullname())
+                self.assertEqual([row[0] for row in
+                                  db_connection.execute("SELECT hashid FROM dbfiles "
+                                                        "ORDER BY rowid")],
+                                 list(katal.SELECT))
+                db_connection.close()
+                for selectedfile in katal.SELECT.values():
+                    with open(selectedfile.fullname, "rb") as source, \
+                         open(os.path.join(tmpdir, selectedfile.targetname), "rb") as target:
+                        self.assertEqual(source.read(), target.read())
+            finally:
+                katal.ARGS.targetpath = targetpath
+
+    #//////////////////////////////////////////////////////////////////////////
+    def test__action__add__file(self):
+        """
+		Tests.test__action__add__file()
+
+		Test of the katal.py::action__add__file() function with the
+		"hardlink" and "symlink" modes.
+        """
+        with tempfile.TemporaryDirectory() as tmpdir:
+            source_name = os.path.join(tmpdir, "source")
+            with open(source_name, "wb") as source:
+                source.write(b"katal")
+
+            target_name = os.path.join(tmpdir, "hardlink")
+            self.assertEqual(katal.action__add__file(source_name, target_name, "hardlink", 0),
+                             "hardlink")
+            self.assertTrue(os.path.samefile(source_name, target_name))
+
+            target_name = os.path.join(tmpdir, "symlink")
+            self.assertEqual(katal.action__add__file(source_name, target_name, "symlink", 0),
+                             "symlink")
+            self.assertEqual(os.readlink(target_name), source_name)
+
+            selectedfile = katal.SELECTELEMENT(path=tmpdir, filename="source",
+                                               partialhashid="", size=5, epoch=0,
+                                               hashid="", database_index=0,
+                                               targetname="", targettags="")
+            self.assertEqual(katal.get_required_space((selectedfile,), "hardlink",
+                                                      os.stat(tmpdir).st_dev), 0)
+            self.assertEqual(katal.get_required_space((selectedfile,), "copy"), 5)
+
+    #//////////////////////////////////////////////////////////////////////////
+    def test__action__add__hashcopy(self):
+        """
+		Tests.test__action__add__hashcopy()
+
+		Test of the katal.py::action__add() function with files hashed
+		while being copied : the duplicates are discarded after the copy,
+		giving the same database as the one filled with hashed files.
+        """
+        katal.ARGS.configfile = os.path.join("tests", "cfgfile3.ini")
+        katal.CFG_PARAMETERS = katal.read_parameters_from_cfgfile(katal.ARGS.configfile)
+        katal.CFG_PARAMETERS["source"]["path"] = os.path.join("tests", "data1")
+        katal.CFG_PARAMETERS["target"]["copy workers"] = "2"
+        katal.read_filters()
+
+        targetpath = katal.ARGS.targetpath
+        with tempfile.TemporaryDirectory() as tmpdir:
+            try:
+                katal.ARGS.targetpath = tmpdir
+                katal.ARGS.nohashcache = True
+                tasks_path = os.path.join(tmpdir, katal.CST__KATALSYS_SUBDIR,
+                                          katal.CST__TASKS_SUBSUBDIR)
+                os.makedirs(tasks_path)
+                katal.create_empty_db(katal.get_database_fullname())
+                katal.read_target_db()
+
+                katal.fill_select()
+                hashids = set(katal.SELECT)
+
+                katal.fill_select(defer_hashing=True)
+                self.assertGreater(len(katal.SELECT), len(hashids))
+                self.assertTrue(all(hashid.startswith(katal.CST__DEFERRED_HASHID_PREFIX)
+                                    for hashid in katal.SELECT))
+
+                self.assertEqual(katal.action__add(), 0)
+
+                db_connection = katal.sqlite3.connect(katal.get_database_fullname())
+                rows = list(db_connection.execute("SELECT hashid, name FROM dbfiles"))
+                db_connection.close()
+                self.assertEqual(set(row[0] for row in rows), hashids)
+                self.assertEqual(len(rows), len(hashids))
+                self.assertEqual(sorted(os.listdir(tmpdir)),
+                                 sorted([katal.CST__KATALSYS_SUBDIR] +
+                                        [row[1] for row in rows]))
+                self.assertEqual(os.listdir(tasks_path), [])
+            finally:
+                katal.ARGS.targetpath = targetpath
+                katal.ARGS.nohashcache = False
+
+    #//////////////////////////////////////////////////////////////////////////
+    def test__action__add__recover(self):
+        """
+		Tests.test__action__add__recover()
+
+		Test of the katal.py::action__add__recover() function : an add is
+		interrupted after two copies, an orphan (a partial copy) being left
+		in the target directory. The journal is read as if the rows hadn't
+		been written in the database, then as if they had been written
+		without their tags (by a former version of Katal), then as if the
+		rows hadn't been written and the source files had been modified in
+		place, keeping their size : the modified files which haven't been
+		copied are left to the next selection.
+        """
+        katal.ARGS.configfile = os.path.join("tests", "cfgfile3.ini")
+        katal.CFG_PARAMETERS = katal.read_parameters_from_cfgfile(katal.ARGS.configfile)
+        katal.CFG_PARAMETERS["target"]["tags"] = "%%e"
+        katal.read_filters()
+
+        targetpath = katal.ARGS.targetpath
+        action__add__file = katal.action__add__file
+        for crash in ("before the commit", "after the commit", "source modified"):
+            with tempfile.TemporaryDirectory() as tmpdir, \
+                 tempfile.TemporaryDirectory() as sourcepath:
+                try:
+                    sourcepath = os.path.join(sourcepath, "data1")
+                    shutil.copytree(os.path.join("tests", "data1"), sourcepath)
+                    katal.CFG_PARAMETERS["source"]["path"] = sourcepath
+                    katal.ARGS.targetpath = tmpdir
+                    os.makedirs(os.path.join(tmpdir, katal.CST__KATALSYS_SUBDIR,
+                                             katal.CST__TASKS_SUBSUBDIR))
+                    katal.create_empty_db(katal.get_database_fullname())
+                    katal.read_target_db()
+                    katal.fill_select()
+                    select = katal.SELECT
+
+                    # . . . . . . . . . . . . . . . . . . . . . . . . . . . . . .
+                    def interrupted_add__file(source_name, target_name, mode, sourcedate,
+                                              tmpdir=tmpdir):
+                        """
+                                Copy the first two files, interrupt the third copy.
+                        """
+                        if len(os.listdir(tmpdir)) == 3:
+                            with open(target_name, "wb") as target:
+                                target.write(b"partial copy")
+                            raise KeyboardInterrupt
+                        return action__add__file(source_name, target_name, mode, sourcedate)
+
+                    katal.action__add__file = interrupted_add__file
+                    with self.assertRaises(KeyboardInterrupt):
+                        katal.action__add()
+                    katal.action__add__file = action__add__file
+
+                    modified = set()
+                    if crash == "source modified":
+                        for hashid in (next(iter(select)), list(select)[-1]):
+                            with open(select[hashid].fullname, "rb+") as source:
+                                content = bytes(byte ^ 0xff for byte in source.read())
+                                source.seek(0)
+                                source.write(content)
+                            modified.add(hashid)
+
+                    db_connection = katal.sqlite3.connect(katal.get_database_fullname())
+                    if crash != "after the commit":
+                        with open(katal.get_journal_fullname()) as journal:
+                            records = [line for line in journal if '"committed"' not in line]
+                        with open(katal.get_journal_fullname(), "w") as journal:
+                            journal.writelines(records)
+                        with db_connection:
+                            db_connection.execute("DELETE FROM dbfiles")
+                    else:
+                        with db_connection:
+                            db_connection.execute("DELETE FROM file_tags")
+                    db_connection.close()
+
+                    self.assertEqual(katal.action__add__recover(), 0)
+
+                    # the first file, modified after having been copied, is described
+                    # by its target file :
+                    added = set(select) - modified | {next(iter(select))}
+                    self.assertFalse(os.path.exists(katal.get_journal_fullname()))
+                    self.assertEqual(set(katal.TARGET_DB), added)
+                    for hashid in added:
+                        target_name = os.path.join(tmpdir, select[hashid].targetname)
+                        self.assertEqual(katal.get_hashids(target_name)[1], hashid)
+
+                    db_connection = katal.sqlite3.connect(katal.get_database_fullname())
+                    self.assertEqual(set(row[0] for row in
+                                         db_connection.execute("SELECT hashid FROM file_tags")),
+                                     added)
+                    db_connection.close()
+                finally:
+                    katal.ARGS.targetpath = targetpath
+                    katal.action__add__file = action__add__file
+                    katal.TARGET_DB.clear()
+                    katal.TARGET_DB_INDEX.clear()
+
+    #//////////////////////////////////////////////////////////////////////////
+    def test__action__apply(self):
+        """
+		Tests.test__action__apply()
+
+		Test of the katal.py::plan__write() and katal.py::action__apply()
+		functions : the files modified after the plan has been written are
+		discarded, the other ones are added without being hashed again.
+        """
+        katal.ARGS.configfile = os.path.join("tests", "cfgfile3.ini")
+        katal.CFG_PARAMETERS = katal.read_parameters_from_cfgfile(katal.ARGS.configfile)
+        katal.read_filters()
+
+        targetpath = katal.ARGS.targetpath
+        with tempfile.TemporaryDirectory() as tmpdir:
+            try:
+                source_path = os.path.join(tmpdir, "source")
+                shutil.copytree(os.path.join("tests", "data1"), source_path)
+                katal.CFG_PARAMETERS["source"]["path"] = source_path
+
+                katal.ARGS.targetpath = os.path.join(tmpdir, "target")
+                os.makedirs(os.path.join(katal.ARGS.targetpath, katal.CST__KATALSYS_SUBDIR,
+                                         katal.CST__TASKS_SUBSUBDIR))
+                katal.create_empty_db(katal.get_database_fullname())
+                katal.read_target_db()
+                katal.fill_select()
+                select = katal.SELECT
+
+                planname = os.path.join(tmpdir, "plan")
+                katal.plan__write(planname)
+                header, files = katal.plan__read(planname)
+                self.assertEqual(header["targetpath"], katal.normpath(katal.ARGS.targetpath))
+                self.assertEqual(files, list(select.items()))
+                stat = os.stat(files[0][1].fullname)
+                self.assertEqual(files[0][1].fingerprint,
+                                 (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns))
+
+                modified = next(iter(select.values())).fullname
+                os.utime(modified, (0, 0))
+
+                self.assertEqual(katal.action__apply(planname), 0)
+
+                self.assertEqual(set(katal.SELECT), set(select) - {next(iter(select))})
+                db_connection = katal.sqlite3.connect(katal.get_database_fullname())
+                self.assertEqual(set(row[0] for row in
+                                     db_connection.execute("SELECT sourcename FROM dbfiles")),
+                                 set(selectedfile.fullname for selectedfile in select.values()
+                                     if selectedfile.fullname != modified))
+                db_connection.close()
+
+                for content in ("not a plan",
+                                '{{"katal plan": {0}}}\n'.format(katal.CST__PLAN_VERSION)):
+                    with open(planname, "w") as plan:
+                        plan.write(content)
+                    with self.assertRaises(katal.KatalError):
+                        katal.action__apply(planname)
+            finally:
+                katal.ARGS.targetpath = targetpath
+                katal.TARGET_DB.clear()
+                katal.TARGET_DB_INDEX.clear()
+
+    #//////////////////////////////////////////////////////////////////////////
+    def test__action__rmnotags(self):
+        """
+		Tests.test__action__rmnotags()
+
+		Test of the katal.py::action__rmnotags() function on a database
+		created by an ancient version of Katal : only the files without
+		tags are moved to the trash.
+        """
+        targetpath = katal.ARGS.targetpath
+        with tempfile.TemporaryDirectory() as tmpdir:
+            try:
+                katal.ARGS.targetpath = tmpdir
+                os.makedirs(os.path.join(tmpdir, katal.CST__KATALSYS_SUBDIR,
+                                         katal.CST__TRASH_SUBSUBDIR))
+                tags = ("tree", "", "tree;sea", "")
+                for index in range(len(tags)):
+                    with open(os.path.join(tmpdir, "name{0}".format(index)), "w") as target:
+                        target.write("katal")
+
+                db_connection = katal.sqlite3.connect(katal.get_database_fullname())
+                db_connection.execute(katal.CST__SQL__CREATE_DB)
+                db_connection.executemany("INSERT INTO dbfiles VALUES (?,?,?,?,?,?,?)",
+                                          (("hashid{0}".format(index), "p", 5,
+                                            "name{0}".format(index), "/photos/a.jpg", 0, tag)
+                                           for index, tag in enumerate(tags)))
+                db_connection.commit()
+                db_connection.close()
+
+                katal.action__rmnotags()
+
+                db_connection = katal.sqlite3.connect(katal.get_database_fullname())
+                self.assertEqual(sorted(row[0] for row in
+                                        db_connection.execute("SELECT name FROM dbfiles")),
+                                 ["name0", "name2"])
+                db_connection.close()
+                self.assertEqual(sorted(os.listdir(os.path.join(tmpdir,
+                                                                katal.CST__KATALSYS_SUBDIR,
+                                                                katal.CST__TRASH_SUBSUBDIR))),
+                                 ["name1", "name3"])
+            finally:
+                katal.ARGS.targetpath = targetpath
+
+    #//////////////////////////////////////////////////////////////////////////
+    def test__compile_filters_eval(self):
+        """
+		Tests.test__compile_filters_eval()
+
+		Test of the katal.py::compile_filters_eval() function.
+        """
+        filters = {1:True, 2:False, 3:True, 10:False}
+        for evalstr, res in (("filter1 & not(filter2)", True),
+                             ("(filter1 and filter2) or filter3", True),
+                             ("not filter1 | filter2", False),
+                             ("filter1 ^ filter3", False),
+                             ("filter1 & filter10", False),
+                             ("True and not False", True)):
+            self.assertEqual(katal.compile_filters_eval(evalstr, filters)(filters.get), res)
+
+        # three-valued logic : None is an unknown value.
+        filters = {1:True, 2:False, 3:None}
+        for evalstr, res in (("filter2 & filter3", False),
+                             ("filter1 | filter3", True),
+                             ("filter1 & filter3", None),
+                             ("not filter3", None),
+                             ("filter1 ^ filter3", None)):
+            self.assertEqual(katal.compile_filters_eval(evalstr, filters)(filters.get), res)
+
+        for evalstr in ("filter4", "filter1 &", "(filter1", "filter1 filter2",
+                        "filter1 + filter2", "__import__('os')"):
+            with self.assertRaises(katal.KatalError):
+                katal.compile_filters_eval(evalstr, filters)
+
+    #//////////////////////////////////////////////////////////////////////////
+    def test__compute_hashids(self):
+        """
+		Tests.test__compute_hashids()
+
+		Test of the katal.py::compute_hashids() function : the results must
+		be the same as the ones given by katal.py::hashfile64() .
+        """
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, "file")
+            for size in (0, 100, 983039, 983040, 983041, 1000000, 1100000):
+                with open(filename, "wb") as afile:
+                    afile.write(os.urandom(size))
+
+                self.assertEqual(katal.compute_hashids(filename),
+                                 (katal.hashfile64(filename,
+                                                   stop_after=katal.CST__PARTIALHASHID_BYTESNBR),
+                                  katal.hashfile64(filename)))
+
+    #//////////////////////////////////////////////////////////////////////////
+    def test__copy_file(self):
+        """
+		Tests.test__copy_file()
+
+		Test of the katal.py::copy_file() and katal.py::copy_file__backend()
+		functions : each available backend must give the same copy.
+        """
+        with tempfile.TemporaryDirectory() as tmpdir:
+            source_name = os.path.join(tmpdir, "source")
+            with open(source_name, "wb") as source:
+                source.write(os.urandom(3*1024*1024+17))
+
+            target_name = os.path.join(tmpdir, "target")
+            self.assertTrue(katal.copy_file(source_name, target_name) in
+                            katal.CST__COPY_BACKENDS)
+            self.assertTrue(filecmp.cmp(source_name, target_name, shallow=False))
+
+            for backend in katal.CST__COPY_BACKENDS:
+                with open(source_name, "rb") as source, open(target_name, "wb") as target:
+                    done = katal.copy_file__backend(backend, source, target,
+                                                    os.path.getsize(source_name))
+                if done:
+                    self.assertTrue(filecmp.cmp(source_name, target_name, shallow=False))
+
+    #//////////////////////////////////////////////////////////////////////////
+    def test__create_target_name_and_tags(self):
+        """
+		Tests.test__create_target_name_and_tags()
+
+		Test of the katal.py::create_target_name_and_tags() function.
+        """
+        parameters = {"target":{"name of the target files":"%dd__%i.%e",
+                                "tags":"%p;%ff%s"}}
+        self.assertEqual(katal.create_target_name_and_tags(parameters,
+                                                           hashid="hashid",
+                                                           filename_no_extens="a b%i",
+                                                           path="photos",
+                                                           extension="jpg",
+                                                           _size=1000,
+                                                           date="2015-09-17 20:01",
+                                                           database_index=3),
+                         ("2015_09_17_20_01__3.jpg", "photos;a_b%i1000"))
+
+        self.assertEqual(katal.compile_targetstr("%dd__%i.%e"),
+                         ("", "dd", "__", "i", ".", "e", ""))
+
+    #//////////////////////////////////////////////////////////////////////////
+    def test__db_fill_directories(self):
+        """
+		Tests.test__db_fill_directories()
+
+		Test of the katal.py::db_fill_directories() function, called by
+		katal.py::update_db_schema() : the dbfiles view gives the former
+		source names and may be written as the former table.
+        """
+        sourcenames = ["/photos/2015/a.jpg", "/photos/2015/b.jpg", "/photos/c.jpg",
+                       "/d.jpg", "e.jpg", "C:\\photos\\f.jpg", "/photos/été/g.jpg"]
+
+        # a database created by an ancient version of Katal :
+        db_connection = katal.sqlite3.connect(":memory:")
+        db_connection.execute(katal.CST__SQL__CREATE_DB)
+        db_connection.executemany("INSERT INTO dbfiles VALUES (?,?,?,?,?,?,?)",
+                                  (("hashid{0}".format(index), "p", index,
+                                    "name{0}".format(index), sourcename, 0, "tree")
+                                   for index, sourcename in enumerate(sourcenames)))
+        katal.update_db_schema(db_connection)
+
+        self.assertFalse(katal.db_has_table(db_connection, "dbfiles"))
+        self.assertEqual([row[0] for row in
+                          db_connection.execute("SELECT sourcename FROM dbfiles")],
+                         sourcenames)
+        self.assertEqual(db_connection.execute("SELECT COUNT(*) FROM directories").fetchone()[0],
+                         6)
+
+        db_connection.execute("INSERT INTO dbfiles VALUES (?,?,?,?,?,?,?)",
+                              ("hashid7", "p", 7, "name7", "/photos/2015/h.jpg", 0, ""))
+        db_connection.execute("UPDATE dbfiles SET sourcename='/new/a.jpg', tagsstr='' "
+                              "WHERE hashid='hashid0'")
+        db_connection.execute("DELETE FROM dbfiles WHERE hashid='hashid1'")
+        db_connection.execute("INSERT OR IGNORE INTO dbfiles VALUES (?,?,?,?,?,?,?)",
+                              ("hashid7", "p", 7, "name8", "/ignored/i.jpg", 0, ""))
+        self.assertEqual(db_connection.execute("SELECT sourcename, tagsstr FROM dbfiles "
+                                               "WHERE hashid IN ('hashid0', 'hashid7') "
+                                               "ORDER BY hashid").fetchall(),
+                         [("/new/a.jpg", ""), ("/photos/2015/h.jpg", "")])
+        self.assertEqual(db_connection.execute("SELECT COUNT(*) FROM directories").fetchone()[0],
+                         7)
+        self.assertEqual(db_connection.execute("SELECT COUNT(*) FROM file_tags "
+                                               "WHERE hashid='hashid1'").fetchone()[0], 0)
+        db_connection.close()
+
+    #//////////////////////////////////////////////////////////////////////////
+    def test__db_write_in_chunks(self):
+        """
+		Tests.test__db_write_in_chunks()
+
+		Test of the katal.py::db_write_in_chunks() function : the rows
+		yielded before an exception must be written.
+        """
+        def rows():
+            """
+                Yield 7 rows, then raise an exception.
+            """
+            for index in range(7):
+                yield (index,)
+            raise OSError("e.g. a file can't be moved")
+
+        db_connection = katal.sqlite3.connect(":memory:")
+        db_connection.execute("CREATE TABLE numbers (number INTEGER)")
+
+        with self.assertRaises(OSError):
+            katal.db_write_in_chunks(db_connection, "INSERT INTO numbers VALUES (?)",
+                                     rows(), chunk_size=3)
+
+        self.assertEqual(db_connection.execute("SELECT COUNT(*) FROM numbers").fetchone()[0], 7)
+
+        # a chunk refused by the database is rolled back (with its related rows)
+        # and isn't written again :
+        db_connection.execute("CREATE TABLE unique_numbers (number INTEGER UNIQUE)")
+        db_connection.execute("CREATE TABLE doubles (number INTEGER)")
+        with self.assertRaises(katal.KatalError) as context:
+            katal.db_write_in_chunks(db_connection, "INSERT INTO unique_numbers VALUES (?)",
+                                     ((number,) for number in (1, 2, 3, 4, 4)), chunk_size=3,
+                                     related=("INSERT INTO doubles VALUES (?)",
+                                              lambda row: [(row[0]*2,)]))
+        self.assertIsNone(context.exception.__context__.__context__)
+        self.assertEqual(db_connection.execute("SELECT COUNT(*) FROM unique_numbers").fetchone()[0],
+                         3)
+        self.assertEqual(db_connection.execute("SELECT SUM(number) FROM doubles").fetchone()[0],
+                         12)
+        db_connection.close()
+
     #//////////////////////////////////////////////////////////////////////////
     def test__fill_select1(self):
         """
@@ -153,6 +660,328 @@ class Tests(unittest.TestCase):
         hashid = "11TnbVxzyXGjz0LwAjC804And9dqVLWcFUJxApkS12I="
         self.assertTrue(hashid in katal.SELECT)
 
+    #//////////////////////////////////////////////////////////////////////////
+    def test__fill_select6(self):
+        """
+		Tests.test__fill_select6()
+
+		Test of the katal.py::fill_select() function with several hashing
+		workers : the result must be the same as with only one worker.
+        """
+        katal.ARGS.configfile = os.path.join("tests", "cfgfile3.ini")
+        katal.CFG_PARAMETERS = katal.read_parameters_from_cfgfile(katal.ARGS.configfile)
+        katal.SOURCE_PATH = os.path.join("tests", "data1")
+        katal.read_filters()
+        katal.fill_select()
+        select = katal.SELECT
+
+        katal.CFG_PARAMETERS["source"]["hash workers"] = "3"
+        katal.CFG_PARAMETERS["source"]["hash processes"] = "2"
+        katal.fill_select()
+
+        self.assertEqual(list(katal.SELECT.items()), list(select.items()))
+
+    #//////////////////////////////////////////////////////////////////////////
+    def test__fill_select__checks(self):
+        """
+		Tests.test__fill_select__checks()
+
+		Test of the katal.py::fill_select__checks() function : the first file
+		using a target name keeps it. The checks are made on a dict and on
+		a SelectStore spilled into its temporary database.
+        """
+        katal.CFG_PARAMETERS = katal.read_parameters_from_cfgfile(os.path.join("tests",
+                                                                               "cfgfile3.ini"))
+        katal.CFG_PARAMETERS["target"]["mode"] = "copy"
+        for select in ({}, katal.SelectStore(memory_budget=0)):
+            katal.SELECT = select
+            for hashid, targetname in (("hashid1", "a.jpg"), ("hashid2", "b.jpg"),
+                                       ("hashid3", "a.jpg"), ("hashid4", "tests.py")):
+                katal.SELECT[hashid] = katal.SELECTELEMENT(path="", filename=hashid,
+                                                           partialhashid=hashid, size=10,
+                                                           epoch=0, hashid=hashid,
+                                                           database_index=0,
+                                                           targetname=targetname,
+                                                           targettags="")
+            katal.SELECT_SIZE_IN_BYTES = 40
+
+            self.assertEqual(katal.fill_select__checks(_number_of_discarded_files=0), 2)
+            self.assertEqual(list(katal.SELECT), ["hashid1", "hashid2"])
+            self.assertEqual(katal.SELECT_SIZE_IN_BYTES, 20)
+
+    #//////////////////////////////////////////////////////////////////////////
+    def test__hash_algorithm(self):
+        """
+		Tests.test__hash_algorithm()
+
+		Test of the hash algorithms : katal.py::compute_hashids() and the
+		hash algorithm stored in the database.
+        """
+        filename = os.path.join("tests", "data1", "b.2")
+        for algorithm in katal.CST__HASHERS:
+            hashids = katal.compute_hashids(filename, algorithm=algorithm)
+            self.assertEqual(hashids[1], katal.hashfile64(filename, algorithm=algorithm))
+            self.assertEqual(len(hashids[1]), 44)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            db_name = os.path.join(tmpdir, "katal.db")
+            katal.create_empty_db(db_name, hash_algorithm="blake2b")
+            db_connection = katal.sqlite3.connect(db_name)
+            self.assertEqual(katal.get_db_hash_algorithm(db_connection), "blake2b")
+            db_connection.close()
+
+            # a database created by an ancient version of Katal :
+            db_name = os.path.join(tmpdir, "ancient.db")
+            db_connection = katal.sqlite3.connect(db_name)
+            db_connection.execute(katal.CST__SQL__CREATE_DB)
+            katal.update_db_schema(db_connection)
+            self.assertEqual(katal.get_db_hash_algorithm(db_connection), "sha256")
+            db_connection.close()
+
+    #//////////////////////////////////////////////////////////////////////////
+    def test__hashcache(self):
+        """
+                Tests.test__hashcache()
+
+                Test of the katal.py::get_hashids() function and of the hash cache.
+        """
+        targetpath = katal.ARGS.targetpath
+        katal.ARGS.targetpath = tempfile.mkdtemp()
+        try:
+            os.mkdir(os.path.join(katal.ARGS.targetpath, katal.CST__KATALSYS_SUBDIR))
+            srcname = os.path.abspath(os.path.join("tests", "data1", "c.5"))
+            stat = os.stat(srcname)
+            fingerprint = (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+            # hashid of c.5 :
+            hashid = "rc2y98HRxM0xEpm9nouE60nVk4TUq3ec9sr10UEwpnY="
+
+            katal.hashcache__open()
+            self.assertEqual(katal.get_hashids(srcname, fingerprint), (hashid, hashid))
+            katal.hashcache__close()
+
+            # the hashids are now read from the cache, not from the file :
+            katal.hashcache__open()
+            self.assertEqual(katal.hashcache__get(fingerprint), (hashid, hashid))
+            # a modified file isn't found in the cache :
+            self.assertIsNone(katal.hashcache__get(fingerprint[:3] + (0,)))
+            katal.hashcache__close()
+
+            # c.5 and a vanished file haven't been looked up : only the entry of
+            # the vanished file is evicted.
+            vanished = (stat.st_dev, -1, 1, 0)
+            katal.hashcache__open()
+            katal.hashcache__set(vanished, os.path.join(os.path.dirname(srcname), "vanished"),
+                                 (hashid, hashid))
+            katal.hashcache__close()
+            katal.hashcache__open()
+            katal.hashcache__close(evicted_path=os.path.join("tests", "data1"))
+            katal.hashcache__open()
+            self.assertEqual(katal.hashcache__get(fingerprint), (hashid, hashid))
+            self.assertIsNone(katal.hashcache__get(vanished))
+            katal.hashcache__close()
+        finally:
+            shutil.rmtree(katal.ARGS.targetpath)
+            katal.ARGS.targetpath = targetpath
+
+    #//////////////////////////////////////////////////////////////////////////
+    def test__hashfile__read(self):
+        """
+		Tests.test__hashfile__read()
+
+		Test of the katal.py::hashfile__read() function : the memory-mapped
+		files and the files read by readinto() must give the same hashes.
+        """
+        mmap_minsize = katal.CST__HASH_MMAP_MINSIZE
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, "file")
+            with open(filename, "wb") as afile:
+                afile.write(os.urandom(300000))
+
+            try:
+                for cutoff in (None, 0, 1000, 300000, 400000):
+                    hashes = []
+                    for katal.CST__HASH_MMAP_MINSIZE in (0, mmap_minsize):
+                        partialhasher, hasher = katal.hashfile__read(filename,
+                                                                     cutoff=cutoff,
+                                                                     buffer_size=4096)
+                        hashes.append((partialhasher and partialhasher.digest(),
+                                       hasher.digest()))
+                    self.assertEqual(hashes[0], hashes[1])
+            finally:
+                katal.CST__HASH_MMAP_MINSIZE = mmap_minsize
+
+    #//////////////////////////////////////////////////////////////////////////
+    def test__scan_source_path(self):
+        """
+                Tests.test__scan_source_path()
+
+                Test of the katal.py::scan_source_path() function.
+        """
+        srcfiles = list(katal.scan_source_path(os.path.join("tests", "data1")))
+
+        self.assertEqual(sorted(srcfile.filename for srcfile in srcfiles),
+                         ["C.5", "a.0", "a.1", "b.2", "b.3", "c.4", "c.5", "ddddX.6", "ddddd.6"])
+
+        for srcfile in srcfiles:
+            self.assertEqual(srcfile.dirpath, os.path.abspath(os.path.join("tests", "data1")))
+            self.assertEqual(srcfile.size,
+                             os.stat(os.path.join("tests", "data1", srcfile.filename)).st_size)
+
+        # the order of the files doesn't depend on the number of workers :
+        self.assertEqual(list(katal.scan_source_path(".", workers=1)),
+                         list(katal.scan_source_path(".", workers=3)))
+
+        # the files rejected by their name aren't stat'ed :
+        srcfiles = list(katal.scan_source_path(os.path.join("tests", "data1"),
+                                               namefilter=lambda filename: \
+                                                 None if filename.startswith("a") else False))
+        self.assertEqual(sorted(srcfile.filename for srcfile in srcfiles
+                                if srcfile.size is not None), ["a.0", "a.1"])
+        self.assertEqual(len(srcfiles), 9)
+
+        # pruned subdirectories :
+        katal.DIRFILTERS.clear()
+        katal.DIRFILTERS["exclude dir"] = ["data*"]
+        pruned = []
+        srcfiles = list(katal.scan_source_path("tests",
+                                               dirfilter=lambda dirpath: \
+                                                 katal.thedirhastobebrowsed(dirpath,
+                                                                            katal.normpath("tests")),
+                                               pruned=pruned))
+        self.assertTrue(os.path.abspath(os.path.join("tests", "data1")) in pruned)
+        self.assertFalse(any(srcfile.filename == "a.0" for srcfile in srcfiles))
+
+        katal.DIRFILTERS.clear()
+        katal.DIRFILTERS["max depth"] = 0
+        self.assertFalse(katal.thedirhastobebrowsed(os.path.join("/src", "a"), "/src"))
+        katal.DIRFILTERS["max depth"] = 1
+        self.assertTrue(katal.thedirhastobebrowsed(os.path.join("/src", "a"), "/src"))
+        katal.DIRFILTERS["exclude path"] = katal.re.compile("^a/b$")
+        self.assertFalse(katal.thedirhastobebrowsed(os.path.join("/src", "a", "b"), "/src"))
+        katal.DIRFILTERS.clear()
+
+    #//////////////////////////////////////////////////////////////////////////
+    def test__selectelement(self):
+        """
+		Tests.test__selectelement()
+
+		Test of the katal.py::SELECTELEMENT class : the target name and tags
+		are rendered on demand, kept by pin() and by tuple()/SELECTELEMENT(*values).
+        """
+        katal.CFG_PARAMETERS = katal.read_parameters_from_cfgfile(os.path.join("tests",
+                                                                               "cfgfile3.ini"))
+        katal.CFG_PARAMETERS["target"]["name of the target files"] = "%%i__%%s.%%e"
+        katal.CFG_PARAMETERS["target"]["tags"] = "%%dd"
+
+        selectedfile = katal.SELECTELEMENT(path=os.path.join("a", "b"), filename="photo.jpg",
+                                           partialhashid="p", size=10, epoch=1442520060,
+                                           hashid="h", database_index=3)
+        self.assertIs(selectedfile.path, katal.SELECTELEMENT(os.path.join("a", "b"), "x",
+                                                             "p", 1, 0, "h", 0).path)
+        self.assertEqual(selectedfile.fullname, os.path.join("a", "b", "photo.jpg"))
+        self.assertEqual(selectedfile.extension, "jpg")
+        self.assertEqual(selectedfile.date, "2015-09-17 20:01")
+        self.assertEqual(selectedfile.targetname, "3__10.jpg")
+        self.assertEqual(selectedfile.targettags, "2015_09_17_20_01")
+
+        copy = katal.SELECTELEMENT(*selectedfile)
+        self.assertEqual(copy, selectedfile)
+        self.assertEqual(copy.targetname, "3__10.jpg")
+
+        # once pinned, the target name isn't rendered again :
+        selectedfile.pin()
+        katal.CFG_PARAMETERS["target"]["name of the target files"] = "%%h"
+        self.assertEqual(selectedfile.targetname, "3__10.jpg")
+
+    #//////////////////////////////////////////////////////////////////////////
+    def test__selectstore(self):
+        """
+		Tests.test__selectstore()
+
+		Test of the katal.py::SelectStore class : the entries are the same,
+		in the same order, before and after having been spilled into the
+		temporary database.
+        """
+        entries = [("hashid{0}".format(index),
+                    katal.SELECTELEMENT(path="", filename="file{0}".format(index),
+                                        partialhashid="p", size=index, epoch=1442520060,
+                                        hashid="hashid{0}".format(index), database_index=index,
+                                        targetname="target{0}".format(index), targettags=""))
+                   for index in range(2500)]
+
+        select = katal.SelectStore(memory_budget=100000)
+        for hashid, selectedfile in entries:
+            select[hashid] = selectedfile
+        self.assertTrue(select.is_spilled())
+
+        self.assertEqual(len(select), 2500)
+        self.assertEqual(list(select.items()), entries)
+        self.assertEqual(select["hashid1234"], entries[1234][1])
+        self.assertTrue("hashid2499" in select)
+        self.assertFalse("hashid2500" in select)
+
+        del select["hashid0"]
+        select["hashid1"] = katal.SELECTELEMENT(*(tuple(entries[1][1])[:3] + (0,) +
+                                                  tuple(entries[1][1])[4:]))
+        self.assertEqual(len(select), 2499)
+        self.assertEqual(list(select)[:2], ["hashid1", "hashid2"])
+        self.assertEqual(select["hashid1"].size, 0)
+        with self.assertRaises(KeyError):
+            del select["hashid0"]
+
+    #//////////////////////////////////////////////////////////////////////////
+    def test__tagsstr_to_tags(self):
+        """
+		Tests.test__tagsstr_to_tags()
+
+		Test of the katal.py::tagsstr_to_tags() function and of the
+		file_tags table filled by katal.py::update_db_schema() .
+        """
+        self.assertEqual(katal.tagsstr_to_tags(";tree;streets;tree"), ["tree", "streets"])
+        self.assertEqual(katal.tagsstr_to_tags(" "), [])
+
+        # a database created by an ancient version of Katal :
+        db_connection = katal.sqlite3.connect(":memory:")
+        db_connection.execute(katal.CST__SQL__CREATE_DB)
+        db_connection.executemany("INSERT INTO dbfiles VALUES (?,?,?,?,?,?,?)",
+                                  (("hashid1", "p1", 1, "a", "a", 0, "tree;sun"),
+                                   ("hashid2", "p2", 2, "b", "b", 0, ";streets"),
+                                   ("hashid3", "p3", 3, "c", "c", 0, "")))
+        katal.update_db_schema(db_connection)
+
+        self.assertEqual(db_connection.execute("SELECT hashid FROM file_tags "
+                                               "WHERE tag='tree'").fetchall(),
+                         [("hashid1",)])
+        db_connection.execute("DELETE FROM dbfiles WHERE hashid='hashid1'")
+        self.assertEqual(db_connection.execute("SELECT hashid, tag FROM file_tags").fetchall(),
+                         [("hashid2", "streets")])
+        db_connection.close()
+
+    #//////////////////////////////////////////////////////////////////////////
+    def test__thefilehastobeadded__db(self):
+        """
+                Tests.test__thefilehastobeadded__db()
+
+                Test of the katal.py::thefilehastobeadded__db() function.
+        """
+        # hashid of c.5 == c.4 :
+        hashid = "rc2y98HRxM0xEpm9nouE60nVk4TUq3ec9sr10UEwpnY="
+
+        katal.TARGET_DB[hashid] = (hashid, 15, "c.4")
+        katal.TARGET_DB_INDEX[15] = {hashid: [hashid]}
+        try:
+            self.assertEqual(katal.thefilehastobeadded__db(os.path.join("tests", "data1", "c.5"),
+                                                           15),
+                             (False, None, None))
+
+            # hashid of C.5 :
+            self.assertTrue(katal.thefilehastobeadded__db(os.path.join("tests", "data1", "C.5"),
+                                                          43)[0])
+        finally:
+            katal.TARGET_DB.clear()
+            katal.TARGET_DB_INDEX.clear()
+
     #//////////////////////////////////////////////////////////////////////////
     def test__thefilehastob__filt_size(self):
         """
@@ -160,14 +989,44 @@ class Tests(unittest.TestCase):
 
                 Test of the katal.py::thefilehastobeadded__filt_size() function.
         """
-        self.assertTrue(katal.thefilehastobeadded__filt_size(_filter={"size":"=100"},
-                                                             _size=100))
+        _filter = {"size":katal.read_filters__size("=100")}
+        self.assertTrue(katal.thefilehastobeadded__filt_size(_filter, 100))
+
+        _filter = {"size":katal.read_filters__size("=1000")}
+        self.assertTrue(katal.thefilehastobeadded__filt_size(_filter, 1000))
+
+        _filter = {"size":katal.read_filters__size("=1kB")}
+        self.assertTrue(katal.thefilehastobeadded__filt_size(_filter, 1000))
+
+        _filter = {"size":katal.read_filters__size(">1MiB")}
+        self.assertFalse(katal.thefilehastobeadded__filt_size(_filter, 1024))
+
+        _filter = {"size":katal.read_filters__size(">=1.1MB")}
+        self.assertTrue(katal.thefilehastobeadded__filt_size(_filter, 1100000))
+        self.assertFalse(katal.thefilehastobeadded__filt_size(_filter, 1099999))
 
-        self.assertTrue(katal.thefilehastobeadded__filt_size(_filter={"size":"=1000"},
-                                                             _size=1000))
+        _filter = {"size":katal.read_filters__size("<=1.5")}
+        self.assertTrue(katal.thefilehastobeadded__filt_size(_filter, 1))
+        self.assertFalse(katal.thefilehastobeadded__filt_size(_filter, 2))
+
+        with self.assertRaises(katal.KatalError):
+            katal.read_filters__size(">1XB")
+
+    #//////////////////////////////////////////////////////////////////////////
+    def test__thefilehastob__filt_date(self):
+        """
+                Tests.test__thefilehastob__filt_date()
+
+                Test of the katal.py::thefilehastobeadded__filt_date() function.
+        """
+        date = katal.read_filters__date("=2015-09-17 20:01").value
 
-        self.assertTrue(katal.thefilehastobeadded__filt_size(_filter={"size":"=1kB"},
-                                                             _size=1000))
+        _filter = {"date":katal.read_filters__date("<=2015-09-17 20:01")}
+        self.assertTrue(katal.thefilehastobeadded__filt_date(_filter, date))
+        _filter = {"date":katal.read_filters__date("<2015-09-17 20:01")}
+        self.assertFalse(katal.thefilehastobeadded__filt_date(_filter, date))
+        _filter = {"date":katal.read_filters__date(">2015-09-17 20:00")}
+        self.assertTrue(katal.thefilehastobeadded__filt_date(_filter, date))
 
-        self.assertFalse(katal.thefilehastobeadded__filt_size(_filter={"size":">1MiB"},
-                                                              _size=1024))
+        with self.assertRaises(katal.KatalError):
+            katal.read_filters__date("~2015-09-17 20:01")